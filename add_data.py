@@ -2,12 +2,28 @@ import argparse
 from pathlib import Path
 import os
 import pandas as pd
-import requests
+
+from util.channel_mapping import DEFAULT_PATH as CHANNEL_MAPPING_PATH, ChannelMapping, normalize_channel_mapping
+from util.ingest import API_BASE, Ingestor, labeled_posts
+from util.segments import DEFAULT_DIRECTORY, SegmentStore
 
 parser = argparse.ArgumentParser()
 
 parser.add_argument('action_type')
 parser.add_argument("input_path")
+parser.add_argument("--api-base", default=API_BASE, help="Junkipedia API base URL (e.g. a local stand-in for testing)")
+parser.add_argument("--workers", type=int, default=8, help="Concurrent API requests")
+parser.add_argument("--rate", type=float, default=10, help="Maximum API requests per second")
+parser.add_argument("--retries", type=int, default=4, help="Retries of throttled or failed requests")
+parser.add_argument("--batch-size", type=int, default=1,
+                    help="Uids per API query (falls back to 1 if the API does not support multi-uid queries)")
+parser.add_argument("--report-every", type=int, default=500, help="Uids per batch of logged metrics")
+parser.add_argument("--segments", default=str(DEFAULT_DIRECTORY),
+                    help="Directory of the ingested post segments read by the dashboard")
+parser.add_argument("--channel-mapping", default=str(CHANNEL_MAPPING_PATH),
+                    help="Normalized channel -> entity mapping (written by the 'channels' action)")
+parser.add_argument("--checkpoint", help="File recording the fetched posts, so an interrupted run resumes "
+                                         "(default: <input_path>.checkpoint.jsonl)")
 
 args = parser.parse_args()
 
@@ -23,61 +39,21 @@ if not input_path.exists():
     print("The input path does not exist")
     raise SystemExit(1)
 
-# --- Define API Call Function ---
-def get_post(uid):
-    url = f"{API_BASE}/posts"
-    params = {"post_uid": uid}
-    response = requests.get(url, headers=headers, params=params)
-    response.raise_for_status()
-    data = response.json()
-    
-    if "data" in data and len(data["data"]) > 0:
-        attributes = data["data"][0].get("attributes", {})
-        search_data = attributes.get("search_data_fields", {})
-        channel = attributes.get("channel", {})
-        
-        # Extract format: if post_type is a list, grab the first element
-        post_type = search_data.get("post_type")
-        if isinstance(post_type, list):
-            post_format = post_type[0] if post_type else None
-        else:
-            post_format = post_type
-        
-        return {
-            "uid": uid,
-            "url": search_data.get("url"),
-            "junkipedia_url": search_data.get("post_link"),  # renamed field
-            "format": post_format,
-            "platform": search_data.get("platform_name"),
-            "title": search_data.get("post_title"),
-            "content": search_data.get("description"),
-            "media": attributes.get("thumbnail_url") or attributes.get("ad_screenshot"),
-            "published_at": search_data.get("published_at"),
-            "created_at": attributes.get("created_at"),
-            "engagement": search_data.get("engagement"),
-            "channel_name": search_data.get("channel_name") or channel.get("channel_name"),
-            "handle": attributes.get("handle") or channel.get("handle"),
-            "channel_url": channel.get("link"),
-            "profile_image": search_data.get("channel_data", {}).get("channel_profile_image"),
-            "bio": channel.get("bio"),
-            "transcript_text": search_data.get("transcript_text"),
-            "channel_uid": channel.get("channel_uid")
-        }
-    else:
-        return {"uid": uid}
+# --- Setup ---
+# Read the API key from an environment variable.
+API_KEY = os.environ.get("JUNKIPEDIA_KEY", "")
+if not API_KEY:
+    raise ValueError("Please set the JUNKIPEDIA_KEY environment variable.")
+
+ingestor = Ingestor(API_KEY, api_base=args.api_base, workers=args.workers, rate=args.rate, retries=args.retries,
+                    batch_size=args.batch_size, report_every=args.report_every)
 
 # Input is a csv of labeled data that contains uid,post_body_text,primary_product,petrochemical_product,ff_infrastructure_OR_production,green_message,renewable_energy,emissions_reduction,false_solutions,recycling,green,brown,misc
 if action_type == 'labels':
-    # --- Setup ---
-    # Define the API base URL and read the API key from an environment variable.
-    API_BASE = "https://www.junkipedia.org/api/v1"
-    API_KEY = ''  # Make sure to set this in your environment
-    if not API_KEY:
-        raise ValueError("Please set the JUNKIPEDIA_KEY environment variable.")
-
-    headers = {
-        "Authorization": f"Bearer {API_KEY}"
-    }
+    checkpoint_path = Path(args.checkpoint or f"{input_path}.checkpoint.jsonl")
+    # The uids whose posts an earlier run already stored in segments (it kept the checkpoint to retry its failures)
+    stored_path = Path(f"{checkpoint_path}.stored")
+    stored = set(stored_path.read_text().split()) if stored_path.exists() else set()
 
     print("Reading input data from", input_path)
 
@@ -86,16 +62,8 @@ if action_type == 'labels':
     labels_df = pd.read_csv(input_path)
 
     # --- Fetch Data from API ---
-    # Process the entire list of UIDs from the labels file
-    ingested_records = []
-    for uid in labels_df['uid']:
-        try:
-            record = get_post(uid)
-            ingested_records.append(record)
-        except Exception as e:
-            print(f"Error fetching data for UID {uid}: {e}")
-            # Append a record with just the UID if an error occurs
-            ingested_records.append({"uid": uid})
+    # Process the entire list of UIDs from the labels file, concurrently and resuming from the checkpoint
+    ingested_records = ingestor.run(labels_df['uid'], checkpoint_path)
 
     # Convert the list of records to a DataFrame
     ingested_df = pd.DataFrame(ingested_records)
@@ -105,7 +73,31 @@ if action_type == 'labels':
     combined_df = pd.merge(labels_df, ingested_df, on="uid", how="left")
 
     # --- Write Output ---
-    # Write the combined DataFrame to a new CSV file
-    output_path = os.path.join("data", "labels_and_data_test.csv")
-    combined_df.to_csv(output_path, mode='a', header=False, index=False)
-    print(f"Combined data added to {output_path}")
\ No newline at end of file
+    # Store the posts as new segments, which the dashboard merges onto its data (see util/segments.py)
+    posts = labeled_posts(combined_df, ChannelMapping.load(args.channel_mapping))
+    posts = posts[~posts["id"].isin(stored)]
+    if len(posts):
+        for segment in SegmentStore(args.segments).append(posts):
+            print(f"Wrote {segment['rows']} posts of {segment['partition']} to segment {segment['path']}")
+
+    if ingestor.failed:
+        # Keep the checkpoint, so the rerun only fetches the failed posts and only stores the posts not stored yet
+        with open(stored_path, "a") as f:
+            f.write("".join(f"{uid}\n" for uid in posts["id"]))
+        print(f"Kept {checkpoint_path} for the rerun")
+    else:
+        # Every post is stored, so a rerun must not reuse the checkpoint
+        checkpoint_path.unlink(missing_ok=True)
+        stored_path.unlink(missing_ok=True)
+
+# Input is a csv of channels in the format of data/channel_mapping.csv: entity,channel_id,platform,search_data_fields.channel_data.channel_name,channel_uid,handle,link
+if action_type == 'channels':
+    mapping = pd.read_csv(input_path, dtype=str)
+    print(f"Fetching the metadata of {mapping['channel_id'].nunique()} channels")
+    fetched = ingestor.get_channels(mapping["channel_id"].dropna().unique())
+
+    # Deduplicate by channel_uid and write the normalized, dictionary-encoded mapping the dashboard loads
+    channel_mapping = ChannelMapping(normalize_channel_mapping(mapping, fetched))
+    channel_mapping.save(args.channel_mapping)
+    print(f"Wrote {len(channel_mapping.channels)} channels of {len(channel_mapping.entities)} entities "
+          f"to {args.channel_mapping}")
@@ -1,16 +1,13 @@
 import dash
 from dash import dcc, html
-import pandas as pd
 import json
-import requests
+import re
 from flask import Response, request
-from functools import lru_cache
-from bs4 import BeautifulSoup
 
 # Import layouts
 from layouts.sidebars import create_sidebars
 from layouts.content import content_layout
-from layouts.components import green_brown_colors, classification_labels, banner
+from layouts.components import green_brown_colors, classification_labels, banner, post_badges_html, post_size
 
 # Import callbacks
 from callbacks.filters import register_filter_callbacks
@@ -18,7 +15,14 @@ from callbacks.navigation import register_navigation_callbacks
 from callbacks.content import register_content_callbacks
 
 # Import data processing
-from process_data import process_data_csv, process_data_json
+from util.data_cache import load_processed_data
+from util.dataset_holder import DatasetHolder
+from util.segments import SegmentStore
+from util.cache import cache_stats, register_cache
+from util.http_client import UpstreamBusy
+from util.asset_cache import asset_cache_from_env
+from util.junkipedia import JunkipediaProxy
+from util.proxy_cache import proxy_cache_from_env, proxy_policy_from_env
 
 """
     This code sets up the dashboard, combining the layout, callbacks, and data processing.
@@ -29,22 +33,33 @@ from process_data import process_data_csv, process_data_json
 # Load data
 codebook_path = "data/codebook.json"
 data_path = "data/final_greenwashing_dataset_for_dashboard_english_only.csv"
-channel_mapping_path = "data/channel_mapping.csv"
-
-channel_mapping = pd.read_csv(channel_mapping_path)
 
 # Load codebook
 with open(codebook_path, "r") as f:
     codebook = json.load(f)
 
 # Load and preprocess data
+# The channel mapping is normalized by `python add_data.py channels data/channel_mapping.csv` (see
+# util/channel_mapping.py); only the CSV path needs it, the JSON dump carries the parent entity of each post.
 # data = pd.read_csv(data_path)
-# data = process_data_csv(data, channel_mapping)
-
-data = json.load(open("data/dashboard_1.2_sample_english_dimensions_parententities.json"))
-data = process_data_json(data)
+# data = process_data_csv(data, ChannelMapping.load())
+
+# The processed frame is cached on disk (see util/data_cache.py); the JSON dump is only
+# parsed and processed again when it or the processing code changed. Posts ingested since
+# (add_data.py, see util/segments.py) are merged onto it, processing only the new segments.
+data_json_path = "data/dashboard_1.2_sample_english_dimensions_parententities.json"
+dataset = load_processed_data(data_json_path, segments=SegmentStore())
+data = dataset.data
 print(f"Loaded {len(data)} posts")
 
+# The callbacks serve the dataset of the holder, which a background thread replaces (without a restart) when new
+# posts were published, after merging them and preparing the caches off the request path (see
+# util/dataset_holder.py)
+holder = DatasetHolder(
+    dataset, lambda current: load_processed_data(data_json_path, segments=SegmentStore(), current=current)
+)
+register_cache("dataset", holder)
+
 # Initialize Dash app
 app = dash.Dash(
     __name__,
@@ -68,7 +83,6 @@ app = dash.Dash(
 # print_nan_summary(data)
 
 print("Number of fossil fuel posts:", (data['fossil_fuel'] == True).sum())
-print(data['y_pred'].head(n=10))
 
 # Custom CSS - Load from external file
 with open('styles/custom.css', 'r') as f:
@@ -97,88 +111,89 @@ app.index_string = f'''
 </html>
 '''
 
-# Create sidebars with the data
-social_sidebar, analytics_sidebar, about_sidebar = create_sidebars(data)
+# Create sidebars with the data; a page loaded after a dataset swap gets the sidebars (date ranges, companies,
+# platforms) of the new dataset
+holder.register("sidebars", lambda dataset: create_sidebars(dataset.data))
+
+
+def serve_layout():
+    social_sidebar, analytics_sidebar, about_sidebar = holder.current["sidebars"]
+    return html.Div([
+        banner,
+        html.Div([about_sidebar, social_sidebar, analytics_sidebar]),
+        html.Div([content_layout], className="main-content"),
+        dcc.Store(id='current_page', data=0),
+        # Add a hidden div for the scroll-to-top callback
+        html.Div(id='_', style={'display': 'none'}),
+        # Add pagination buttons to the layout but hide them initially
+        # They will be shown/hidden by the content callback as needed
+        html.Button('← Previous', id='prev_page', n_clicks=0, style={'display': 'none'}),
+        html.Button('Next →', id='next_page', n_clicks=0, style={'display': 'none'})
+    ])
+
 
 # App layout
-app.layout = html.Div([
-    banner,
-    html.Div([about_sidebar, social_sidebar, analytics_sidebar]),
-    html.Div([content_layout], className="main-content"),
-    dcc.Store(id='current_page', data=0),
-    # Add a hidden div for the scroll-to-top callback
-    html.Div(id='_', style={'display': 'none'}),
-    # Add pagination buttons to the layout but hide them initially
-    # They will be shown/hidden by the content callback as needed
-    html.Button('← Previous', id='prev_page', n_clicks=0, style={'display': 'none'}),
-    html.Button('Next →', id='next_page', n_clicks=0, style={'display': 'none'})
-])
+app.layout = serve_layout
+
+# Built post embeddings are shared by all workers (see util/proxy_cache.py for the JUNKIPEDIA_CACHE_* settings),
+# and so are the stylesheets and scripts of their head (see util/asset_cache.py)
+junkipedia_assets = asset_cache_from_env('/junkipedia_assets')
+junkipedia = JunkipediaProxy(proxy_cache_from_env(), junkipedia_assets, **proxy_policy_from_env())
+MAX_BATCH_EMBEDS = 50
+MAX_EMBED_COLUMNS = 4
+# The badge rules of custom.css, for the badges under the posts of a /junkipedia_embeds document
+EMBED_BADGE_CSS = "".join(re.findall(r"\.(?:post-footer-2|classification-[\w-]+)\s*\{[^}]*\}", custom_css))
 
 # Register callbacks
-register_filter_callbacks(app, data)
+register_filter_callbacks(app, holder)
 register_navigation_callbacks(app)
-register_content_callbacks(app, data, codebook, green_brown_colors, classification_labels)
-
-@lru_cache(maxsize=128)
-def fetch_junkipedia_post_html(post_id):
-    """
-    Proxy for Junkipedia posts. This function fetches the post from Junkipedia and returns a minimal HTML embedding
-      with the post content. This is used to display the post in an iframe.
-
-    Arguments:
-        post_id (str): The "post_id" of the post to fetch from Junkipedia.
-    
-    Returns:
-        Response: A Flask Response object containing the HTML content of the post.
-    """
-    resp = requests.get(f"https://www.junkipedia.org/posts/{post_id}")
-    if resp.status_code != 200:
-        return None, resp.status_code
-
-    soup = BeautifulSoup(resp.text, 'html.parser')
-
-    # — 1) Grab all the original <head> tags we need —
-    head = soup.head or soup.new_tag('head')
-
-    # insert a <base> so absolute + relative URLs in CSS/JS/images resolve back to the real origin
-    base = soup.new_tag('base', href="https://www.junkipedia.org/")
-    head.insert(0, base)
-
-    # turn every /… link/src into an absolute URL
-    for tag in head.find_all(['link','script']):
-        if tag.has_attr('href') and tag['href'].startswith('/'):
-            tag['href'] = "https://www.junkipedia.org" + tag['href']
-        if tag.has_attr('src') and tag['src'].startswith('/'):
-            tag['src'] = "https://www.junkipedia.org" + tag['src']
-
-    head_html = str(head)
-
-    # — 2) Extract the full posts‐wrapper, then prune to just your one post —
-    outer = soup.find_all('div', {'data-controller':'posts'})[0]
-    for item in outer.select('div.post-item'):
-        if not item.select_one(f"a[href$='/posts/{post_id}']"):
-            item.decompose()
-    body_html = str(outer)
-
-    # — 3) Rebuild a minimal page —
-    html = f"""
-    <!DOCTYPE html>
-    <html>
-      {head_html}
-      <body style="margin:0;padding:0;display:flex;justify-content:center;">
-        {body_html}
-      </body>
-    </html>
-    """
-    return html, 200
+register_content_callbacks(app, holder, codebook, green_brown_colors, classification_labels,
+                           analytics_sidebar=lambda dataset: create_sidebars(dataset.data)[1],
+                           prefetch_embeds=junkipedia.prefetch)
+# Poll for new data every DATASET_RELOAD_INTERVAL seconds, from a thread each worker starts on its first request
+holder.watch()
 
 @app.server.route('/junkipedia_proxy/<post_id>')
 def junkipedia_proxy(post_id):
-    html, status = fetch_junkipedia_post_html(post_id)
+    try:
+        html, status = junkipedia.post_html(post_id, f'//{request.host}')
+    except UpstreamBusy:
+        return Response("…", status=503, headers={'Retry-After': '1'})
     if html is None:
         return Response("…", status=status)
     return Response(html, content_type='text/html')
 
+@app.server.route('/junkipedia_embeds')
+def junkipedia_embeds():
+    """
+    The embeds of the posts of a feed page in one document, for the page's single frame (see create_posts_frame):
+    /junkipedia_embeds?ids=<post_id>,<post_id>,...&columns=<n>. Each post is cut to its box and shown with its
+    classification badges, as looked up in the served dataset (see JunkipediaProxy.batch_html).
+    """
+    post_ids = list(dict.fromkeys(i for i in request.args.get('ids', '').split(',') if i))
+    if not post_ids or len(post_ids) > MAX_BATCH_EMBEDS:
+        return Response(f"Expected 1 to {MAX_BATCH_EMBEDS} post ids", status=400)
+    columns = min(max(request.args.get('columns', 1, type=int), 1), MAX_EMBED_COLUMNS)
+    generation = holder.current
+    positions = generation["content"].post_positions(post_ids)
+    rows = generation.dataset.rows([p for p in positions if p is not None])
+    footers = {str(row['id']): post_badges_html(row) for _, row in rows.iterrows()}
+    sizes = {str(row['id']): post_size(row) for _, row in rows.iterrows()}
+    html = junkipedia.batch_html(post_ids, f'//{request.host}', columns=columns, footers=footers, sizes=sizes,
+                                 style=EMBED_BADGE_CSS)
+    return Response(html, content_type='text/html', headers={'Cache-Control': 'private, max-age=300'})
+
+@app.server.route('/junkipedia_assets/<name>')
+def junkipedia_asset(name):
+    return junkipedia_assets.serve(name)
+
+@app.server.route('/cache_stats')
+def cache_stats_route():
+    """
+    Hit/miss counters and sizes of the caches of this worker (and of the shared proxy cache), for sizing them.
+    """
+    return Response(json.dumps(cache_stats(), indent=2), content_type='application/json')
+
 if __name__ == "__main__":
     app.run(debug=True)
     
\ No newline at end of file
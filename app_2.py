@@ -1,14 +1,35 @@
+from urllib.parse import urlsplit
+
 from flask import Flask, Response, request
 import requests
 
+from util.asset_cache import asset_cache_from_env
+from util.http_client import client, UpstreamBusy
+
 app = Flask(__name__)
 
 JUNKIPEDIA_POST_URL = "https://www.junkipedia.org/posts/434229051"
 
+# Junkipedia's stylesheets and scripts are fetched once and kept on disk (see util/asset_cache.py); other resources
+# (images, other hosts) are passed through
+assets = asset_cache_from_env()
+CACHED_HOST = urlsplit(JUNKIPEDIA_POST_URL).netloc
+CACHED_EXTENSIONS = (".css", ".js")
+
+
+def is_cached_asset(url):
+    parts = urlsplit(url)
+    return parts.scheme == "https" and parts.netloc == CACHED_HOST and parts.path.lower().endswith(CACHED_EXTENSIONS)
+
 @app.route("/")
 def render_full_post():
     # Fetch the entire HTML page
-    response = requests.get(JUNKIPEDIA_POST_URL)
+    try:
+        response = client.get(JUNKIPEDIA_POST_URL)
+    except UpstreamBusy:
+        return "Too many upstream requests", 503, {"Retry-After": "1"}
+    except requests.RequestException as e:
+        return f"Failed to load post: {e}", 502
     if response.status_code == 200:
         # Modify the HTML to ensure relative paths for CSS/JS/images are proxied
         html_content = response.text.replace(
@@ -27,7 +48,20 @@ def proxy_resource():
     if not url:
         return "Missing URL parameter", 400
 
-    proxied_response = requests.get(url)
+    if is_cached_asset(url):
+        name, status = assets.fetch(url)
+        if name is None:
+            headers = {"Retry-After": "1"} if status == 503 else {}
+            return f"Failed to fetch resource. Status code: {status}", status, headers
+        # The URL does not name the content, so browsers revalidate it (by ETag) after the cache's TTL
+        return assets.serve(name, max_age=int(assets.ttl), immutable=False)
+
+    try:
+        proxied_response = client.get(url)
+    except UpstreamBusy:
+        return "Too many upstream requests", 503, {"Retry-After": "1"}
+    except requests.RequestException as e:
+        return f"Failed to fetch resource: {e}", 502
     if proxied_response.status_code == 200:
         return Response(proxied_response.content, content_type=proxied_response.headers.get("Content-Type"))
     else:
@@ -0,0 +1,171 @@
+"""
+Benchmark of the Junkipedia proxy's HTML rewrite (util.junkipedia.rewrite_post_html) against the previous
+BeautifulSoup implementation, on saved Junkipedia post pages.
+
+    python -m benchmarks.proxy_rewrite --fetch 434229051 ...     save post pages to data/fixtures/junkipedia/
+    python -m benchmarks.proxy_rewrite                           run on every page saved there
+    python -m benchmarks.proxy_rewrite path/to/434229051.html    run on the given pages
+
+Each page file is named after the post id it was saved for, and is the page exactly as Junkipedia served it.
+When no page is given or saved, a synthetic page with the layout of a Junkipedia post page is used instead. For
+every page, both outputs are parsed with BeautifulSoup and compared (see normalized_tree), so the benchmark also
+checks that the rewrite keeps the output contract; tests/test_proxy_rewrite.py runs that comparison on every saved
+page.
+"""
+import argparse
+import random
+import statistics
+import time
+from pathlib import Path
+
+from bs4 import BeautifulSoup, NavigableString
+
+from util.http_client import client
+from util.junkipedia import JUNKIPEDIA_ORIGIN, rewrite_post_html
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+FIXTURE_DIR = REPO_ROOT / "data" / "fixtures" / "junkipedia"
+
+
+def rewrite_post_html_soup(page, post_id):
+    """
+    The previous rewrite: build a BeautifulSoup tree of the page, edit it and serialize the parts.
+    """
+    soup = BeautifulSoup(page, 'html.parser')
+
+    head = soup.head or soup.new_tag('head')
+    base = soup.new_tag('base', href=f"{JUNKIPEDIA_ORIGIN}/")
+    head.insert(0, base)
+    for tag in head.find_all(['link', 'script']):
+        if tag.has_attr('href') and tag['href'].startswith('/'):
+            tag['href'] = JUNKIPEDIA_ORIGIN + tag['href']
+        if tag.has_attr('src') and tag['src'].startswith('/'):
+            tag['src'] = JUNKIPEDIA_ORIGIN + tag['src']
+    head_html = str(head)
+
+    outer = soup.find_all('div', {'data-controller': 'posts'})[0]
+    for item in outer.select('div.post-item'):
+        if not item.select_one(f"a[href$='/posts/{post_id}']"):
+            item.decompose()
+    body_html = str(outer)
+
+    return f"""
+    <!DOCTYPE html>
+    <html>
+      {head_html}
+      <body style="margin:0;padding:0;display:flex;justify-content:center;">
+        {body_html}
+      </body>
+    </html>
+    """
+
+
+def normalized_tree(html):
+    """
+    Parse a page into a comparable form: its elements (name and attributes) and non-blank texts (including comments)
+    in document order.
+    BeautifulSoup's serialization depends on how a void tag was written (<meta> or <meta/>), so the strings of two
+    equivalent pages can differ where their trees do not.
+
+    Returns:
+        list: ('tag', name, attributes) and ('text', text) entries.
+    """
+    tree = []
+    for node in BeautifulSoup(html, 'html.parser').descendants:
+        if isinstance(node, NavigableString):
+            if node.strip():
+                tree.append(('text', node.strip()))
+        else:
+            attributes = {name: ' '.join(value) if isinstance(value, list) else value
+                          for name, value in node.attrs.items()}
+            tree.append(('tag', node.name, sorted(attributes.items())))
+    return tree
+
+
+def synthetic_page(post_id, n_items=20, seed=0):
+    """
+    Returns:
+        str: A page shaped like a Junkipedia post page (a long head of stylesheets, scripts and meta tags, and a
+            posts wrapper holding `n_items` post items, one of which links to `post_id`).
+    """
+    rng = random.Random(seed)
+    head = ['<meta charset="utf-8"><title>Post | Junkipedia</title>']
+    for i in range(40):
+        head.append(f'<link rel="stylesheet" href="/assets/application-{i:02d}.css" media="all">')
+        head.append(f'<script src="/assets/controllers/c{i:02d}.js" defer="defer"></script>')
+        head.append(f'<meta property="og:tag{i}" content="value {i} &amp; more">')
+    head.append('<script>window.config = {"template": "<div class=\\"post-item\\"></div>"};</script>')
+    items = []
+    for i in range(n_items):
+        item_id = post_id if i == n_items // 2 else str(rng.randrange(10 ** 8, 10 ** 9))
+        text = " ".join(rng.choice(["climate", "energy", "net-zero", "gas", "wind", "#green", "@brand"])
+                        for _ in range(80))
+        items.append(
+            f'<div class="post-item card" data-id="{item_id}"><div class="post-header"><img src="/avatars/{i}.png" '
+            f'alt="avatar"><a href="/channels/{i}">Channel {i}</a></div><div class="post-body"><p>{text}</p>'
+            f'<br><img src="https://cdn.example.com/{i}.jpg"></div><div class="post-footer">'
+            f'<a href="/posts/{item_id}">Permalink</a> <!-- <a href="/posts/{post_id}"> --></div></div>'
+        )
+    nav = "".join(f'<li><a href="/section/{i}">Section {i}</a></li>' for i in range(100))
+    return (
+        f'<!DOCTYPE html><html lang="en"><head>{"".join(head)}</head><body><nav><ul>{nav}</ul></nav>'
+        f'<main><div class="container" data-controller="posts" data-posts-url-value="/posts.json">'
+        f'{"".join(items)}</div></main><footer>{nav}</footer></body></html>'
+    )
+
+
+def save_fixture(post_id, directory=FIXTURE_DIR):
+    """
+    Save the page of a post, as served by Junkipedia, as a fixture.
+
+    Returns:
+        Path: The saved page.
+    """
+    resp = client.get(f"{JUNKIPEDIA_ORIGIN}/posts/{post_id}")
+    resp.raise_for_status()
+    path = Path(directory) / f"{post_id}.html"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(resp.content)
+    return path
+
+
+def _best(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Junkipedia proxy's HTML rewrite.")
+    parser.add_argument("pages", nargs="*", help=f"Saved post pages, named <post_id>.html (default: {FIXTURE_DIR})")
+    parser.add_argument("--fetch", nargs="+", metavar="POST_ID", help=f"Save the pages of posts to {FIXTURE_DIR}")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed runs per implementation and page")
+    args = parser.parse_args()
+
+    if args.fetch:
+        for post_id in args.fetch:
+            print(f"Saved {save_fixture(post_id)}")
+        return
+
+    paths = args.pages or sorted(FIXTURE_DIR.glob("*.html"))
+    pages = [(Path(path).stem, Path(path).read_text()) for path in paths]
+    if not pages:
+        print(f"No saved pages in {FIXTURE_DIR} (save some with --fetch <post_id>), using a synthetic page")
+        pages = [("434229051", synthetic_page("434229051"))]
+
+    for post_id, page in pages:
+        new, old = rewrite_post_html(page, post_id), rewrite_post_html_soup(page, post_id)
+        same = normalized_tree(new) == normalized_tree(old)
+        new_best, new_median = _best(lambda: rewrite_post_html(page, post_id), args.repeat)
+        old_best, old_median = _best(lambda: rewrite_post_html_soup(page, post_id), args.repeat)
+        print(f"post {post_id} ({len(page) / 1024:.0f} KiB): same output: {same}")
+        print(f"  BeautifulSoup: best {old_best * 1000:8.2f} ms, median {old_median * 1000:8.2f} ms")
+        print(f"  tokenizer:     best {new_best * 1000:8.2f} ms, median {new_median * 1000:8.2f} ms"
+              f"  ({old_median / new_median:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
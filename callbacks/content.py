@@ -1,79 +1,300 @@
-from dash import Input, Output, html, dcc
+import os
+
+from dash import Input, Output, State, html, dcc
+from dash.exceptions import PreventUpdate
 import pandas as pd
-from layouts.components import create_post_component
-from util.functions import url_deduplicate
+from layouts.components import create_posts_frame
 from util.plot_overview import plot_overview
 from util.plot_greenwashing_score import plot_combined_greenwashing_scores
 from util.plot_green_share import plot_green_share
+from util.cache import LRUCache, freeze
+from util.cube import post_weights
+from util.dataset_holder import Generation
+from util.figure_cache import FigureCache
+
+# Memory bound of the filter-result cache (row position arrays, 8 bytes per matching post)
+FILTER_CACHE_BYTES = 64 * 1024 * 1024
+# Memory bound of the cache of analytics cube roll-ups, shared by the Analytics figure callbacks
+ROLLUP_CACHE_BYTES = 16 * 1024 * 1024
+# Memory bound of the Analytics figure cache (figure JSON payloads)
+FIGURE_CACHE_BYTES = 64 * 1024 * 1024
+# Optional directory in which the figure payloads are shared between the workers on a host
+FIGURE_CACHE_DIR = os.environ.get("FIGURE_CACHE_DIR")
+
+# Inputs of the Post Feed
+FEED_INPUTS = [
+    Input('current_page', 'data'),
+    Input('date_range', 'start_date'),
+    Input('date_range', 'end_date'),
+    Input('company_filter', 'value'),
+    Input('entity_filter', 'value'),
+    Input('platform_filter', 'value'),
+    Input('classification_dropdown', 'value'),
+    Input('view_toggle', 'value'),
+    Input('left_view', 'value'),
+    Input('right_view', 'value'),
+    Input('uniqueness_toggle', 'value'),
+    Input('keyword_search', 'value'),
+    Input('social_fossil_subcategories', 'value'),
+    Input('social_green_subcategories', 'value'),
+]
+
+# Inputs of every Analytics figure. The tab is included so the figures are only computed once the Analytics tab
+# is opened, not while it is hidden.
+ANALYTICS_INPUTS = [
+    Input('tabs', 'value'),
+    Input('analytics_date_range', 'start_date'),
+    Input('analytics_date_range', 'end_date'),
+    Input('analytics_company_filter', 'value'),
+    Input('analytics_entity_filter', 'value'),
+    Input('analytics_platform_filter', 'value'),
+    Input('analytics_uniqueness_toggle', 'value'),
+    Input('analytics_fossil_subcategories', 'value'),
+    Input('analytics_green_subcategories', 'value'),
+]
+
+
+def subcategory_flags(fossil_subcategories, green_subcategories, uniqueness):
+    """
+    Translate the subcategory checklists and the uniqueness toggle of a sidebar into the flag columns a post must have.
+
+    Arguments:
+        fossil_subcategories (list): Selected fossil subcategories.
+        green_subcategories (list): Selected green subcategories.
+        uniqueness (str): "unique" or "all".
+
+    Returns:
+        list: The flag columns to filter on.
+    """
+    subcategory_filters = {
+        "primary_product": "primary_product" in fossil_subcategories,
+        "petrochemical_product": "petrochemical_product" in fossil_subcategories,
+        "infrastructure_production": "infrastructure_production" in fossil_subcategories,
+        "other_fossil": "fossil_fuel_other" in fossil_subcategories,
+        "decreasing_emissions": "decreasing_emissions" in green_subcategories,
+        "viable_solutions": "viable_solutions" in green_subcategories,
+        "false_solutions": "false_solutions" in green_subcategories,
+        "recycling_waste_management": "recycling_waste_management" in green_subcategories,
+        "nature_animal_references": "nature_animal_references" in green_subcategories,
+        "generic_environmental_references": "generic_environmental_references" in green_subcategories,
+        "other_green": "green_other" in green_subcategories
+    }
+    flags = [subcategory for subcategory, is_active in subcategory_filters.items() if is_active]
+    # "unique" keeps only the first post of each near-duplicate cluster (precomputed in process_data_json)
+    if uniqueness == "unique":
+        flags.append("is_cluster_representative")
+    return flags
+
+
+def initial_values(layout, inputs):
+    """
+    Look up the initial values of callback inputs in a layout (e.g. the default filters of a sidebar).
+
+    Arguments:
+        layout (Component): A Dash component tree.
+        inputs (list): Dash Input objects.
+
+    Returns:
+        list: The value of each input's property in `layout` (None if not found).
+    """
+    components = {getattr(c, "id", None): c for c in layout._traverse()}
+    components[getattr(layout, "id", None)] = layout
+    return [getattr(components.get(i.component_id), i.component_property, None) for i in inputs]
+
+
+class ContentCaches:
+    """
+    The caches of the content callbacks for one dataset. A new set is built for every dataset the holder swaps in
+    (see util/dataset_holder.py), so results of the previous dataset are never served for the new one; the old set
+    is dropped once the requests still using it finish. Registering a new set replaces the old one in cache_stats.
+    """
+
+    def __init__(self, dataset):
+        """
+        Arguments:
+            dataset (Dataset): The dataset the cached results are computed from.
+        """
+        self.filter_results = LRUCache("filter_results", FILTER_CACHE_BYTES)
+        self.rollups = LRUCache("analytics_rollups", ROLLUP_CACHE_BYTES)
+        self.figures = FigureCache("analytics_figures", FIGURE_CACHE_BYTES, FIGURE_CACHE_DIR, dataset.version)
+        self.post_ids = dataset.data['id'].to_numpy() if 'id' in dataset.data.columns else None
+        self._post_positions = None
+
+    def post_positions(self, post_ids):
+        """
+        Look posts up by id (e.g. the posts of a /junkipedia_embeds document).
+
+        Arguments:
+            post_ids (list): The post ids.
+
+        Returns:
+            list: The row position of each post, or None for ids that are not in the dataset.
+        """
+        if self._post_positions is None:
+            ids = self.post_ids if self.post_ids is not None else []
+            self._post_positions = {str(post_id): i for i, post_id in enumerate(ids)}
+        return [self._post_positions.get(str(post_id)) for post_id in post_ids]
 
-def register_content_callbacks(app, data, codebook, green_brown_colors, classification_labels):
+
+def register_content_callbacks(app, holder, codebook, green_brown_colors, classification_labels,
+                               analytics_sidebar=None, prefetch_embeds=None):
     """
     Register callbacks for the content section of the dashboard.
-    This function handles the content rendering of different tabs (Social Media, Analytics, About)
-    and applies the necessary filters based on user input.
+    Each tab has its own container (see layouts/content.py). The Post Feed, the Analytics post count, each
+    Analytics figure and the About section are rendered by separate callbacks that only listen to the inputs they
+    use, so a slow figure does not hold up the others and Post Feed inputs never trigger analytics work.
+    Each callback reads the current generation of `holder` once and serves the whole request from its dataset and
+    caches, so a dataset swapped in meanwhile only affects later requests.
 
     Arguments:
         app: The Dash app instance.
-        data: The DataFrame containing the social media data.
+        holder: The DatasetHolder of the Dataset containing the social media data and its filter index.
         codebook: The codebook for the data.
         green_brown_colors: Dictionary mapping classification labels to colors.
         classification_labels: Dictionary mapping classification labels to their display names.
+        analytics_sidebar: Optional callable taking a Dataset and returning its Analytics sidebar; if given, the
+            figures for its default filters are built for every dataset before it is served.
+        prefetch_embeds: Optional callable taking post ids, called with the ids of the current and the next feed
+            page so their embeds are fetched concurrently, and before the user turns the page
+            (e.g. JunkipediaProxy.prefetch).
 
     Returns:
         None
     """
+
+    def prefetch_pages(caches, *positions):
+        """
+        Hand the post ids at `positions` (the current page and the next page of each side) to `prefetch_embeds`.
+        The current page's posts come first, so the proxy fetches the uncached ones concurrently while the browser
+        is still loading the feed, and the /junkipedia_embeds documents of its frames join those fetches.
+        """
+        if prefetch_embeds is None or caches.post_ids is None:
+            return
+        ids = [caches.post_ids[p] for rows in positions for p in rows]
+        prefetch_embeds([post_id for post_id in ids if not pd.isna(post_id)])
+
+    def filter_rows(dataset, keyword_search, companies, entities, platforms, classifications, flags, start_date,
+                    end_date):
+        """
+        Resolve the filter state into the ascending row positions of the matching posts.
+        """
+        rows = None
+
+        # Apply keyword search through the inverted index
+        if keyword_search:
+            rows = dataset.search_index.search(keyword_search)
+
+        # Apply date, company, entity, platform, classification and subcategory filters through the index
+        rows = dataset.index.select(
+            companies=companies,
+            channels=entities,
+            platforms=platforms,
+            classifications=classifications,
+            flags=flags,
+            start_date=start_date,
+            end_date=end_date,
+            rows=rows
+        )
+        rows.setflags(write=False)
+        return rows
+
+    def analytics_state(tab_name, start_date, end_date, companies, entities, platforms, uniqueness,
+                        fossil_subcategories, green_subcategories):
+        """
+        Normalize the Analytics sidebar filters into a hashable state (companies, channels, platforms, flags,
+        start date, end date) that keys the roll-up and figure caches.
+
+        Raises:
+            PreventUpdate: If the Analytics tab is not open.
+        """
+        if tab_name != "analytics":
+            raise PreventUpdate
+        flags = subcategory_flags(fossil_subcategories, green_subcategories, uniqueness)
+        return (freeze(companies), freeze(entities), freeze(platforms), freeze(flags), start_date, end_date)
+
+    def analytics_summary(generation, state):
+        """
+        Roll the analytics cube up for a normalized Analytics filter state (one row per company/year/label/flags
+        combination). The figure callbacks fire together on the same filters, so the roll-up is cached.
+        """
+        companies, entities, platforms, flags, start_date, end_date = state
+        return generation["content"].rollups.get_or_compute(state, lambda: generation.dataset.cube.rollup(
+            companies=companies,
+            channels=entities,
+            platforms=platforms,
+            flags=flags,
+            start_date=start_date,
+            end_date=end_date
+        ))
+
+    # Figure name -> function building the figure from a roll-up
+    figure_builders = {
+        "overview": lambda summary: plot_overview(summary, codebook, green_brown_colors),
+        "greenwashing_scores": plot_combined_greenwashing_scores,
+        "green_share": plot_green_share,
+    }
+
+    def analytics_figure(generation, name, state):
+        """
+        Returns:
+            dict: Figure `name` for a normalized Analytics filter state, from the figure cache when possible.
+        """
+        return generation["content"].figures.figure(
+            (name,) + state, lambda: figure_builders[name](analytics_summary(generation, state))
+        )
+
+    def prepare(dataset):
+        """
+        Build the caches for a dataset before it is served, and the figures for the default Analytics filters in
+        them, so the first visit of the tab is served from the cache.
+
+        Returns:
+            ContentCaches: The caches of `dataset`.
+        """
+        caches = ContentCaches(dataset)
+        if analytics_sidebar is not None:
+            generation = Generation(dataset, {"content": caches})
+            default_filters = ["analytics"] + initial_values(analytics_sidebar(dataset), ANALYTICS_INPUTS[1:])
+            for name in figure_builders:
+                try:
+                    analytics_figure(generation, name, analytics_state(*default_filters))
+                except Exception as e:
+                    print(f"Could not warm the '{name}' figure: {e!r}")
+        return caches
+
+    holder.register("content", prepare)
+
     @app.callback(
-        Output("content", "children"),
-        [
-            Input("tabs", "value"),
-            Input('current_page', 'data'),
-
-            # Social-media filters
-            Input('date_range', 'start_date'),
-            Input('date_range', 'end_date'),
-            Input('company_filter', 'value'),
-            Input('entity_filter', 'value'),
-            Input('platform_filter', 'value'),
-            Input('classification_dropdown', 'value'),
-            Input('view_toggle', 'value'),
-            Input('left_view', 'value'),
-            Input('right_view', 'value'),
-            Input('uniqueness_toggle', 'value'),
-            Input('keyword_search', 'value'),
-            Input('social_fossil_subcategories', 'value'),
-            Input('social_green_subcategories', 'value'),
-
-            # Analytics filters
-            Input('analytics_date_range', 'start_date'),
-            Input('analytics_date_range', 'end_date'),
-            Input('analytics_company_filter', 'value'),
-            Input('analytics_entity_filter', 'value'),
-            Input('analytics_platform_filter', 'value'),
-            Input('analytics_uniqueness_toggle', 'value'),
-            Input('analytics_fossil_subcategories', 'value'),
-            Input('analytics_green_subcategories', 'value'),
-        ]
+        [Output("feed_content", "style"), Output("analytics_content", "style"), Output("about_content", "style")],
+        Input("tabs", "value")
     )
-    def render_tab(
-        tab_name,
-        current_page,
+    def toggle_tab_content(tab_name):
+        """
+        Show the container of the selected tab and hide the others; their contents are kept.
+
+        Arguments:
+            tab_name (str): The name of the selected tab.
 
-        # social inputs
+        Returns:
+            feed_style (dict): CSS style for the Post Feed container.
+            analytics_style (dict): CSS style for the Analytics container.
+            about_style (dict): CSS style for the About container.
+        """
+        return tuple(
+            {"display": "block" if tab_name == name else "none"} for name in ("social_media", "analytics", "about")
+        )
+
+    @app.callback(Output("feed_content", "children"), FEED_INPUTS)
+    def render_feed(
+        current_page,
         sm_start, sm_end, sm_companies, sm_entities, sm_platforms, sm_classifs,
         view_toggle, left_view, right_view, sm_uniqueness, keyword_search,
-        sm_fossil_subcategories, sm_green_subcategories,
-
-        # analytics inputs
-        an_start, an_end, an_companies, an_entities, an_platforms, an_uniqueness,
-        an_fossil_subcategories, an_green_subcategories
+        sm_fossil_subcategories, sm_green_subcategories
     ):
         """
-        Render the content of the selected tab based on user inputs and filters.
-        This function filters the data based on the selected criteria and generates the appropriate content.
-        It handles the rendering of social media posts, analytics plots, and the about section.
+        Render the Post Feed (all posts or the comparison view) for the current page and filters.
 
         Arguments:
-            tab_name (str): The name of the selected tab.
             current_page (int): The current page number for pagination.
             sm_start (str): Start date for social media filtering.
             sm_end (str): End date for social media filtering.
@@ -89,457 +310,313 @@ def register_content_callbacks(app, data, codebook, green_brown_colors, classifi
             sm_fossil_subcategories (list): Selected fossil subcategories for social media filtering.
             sm_green_subcategories (list): Selected green subcategories for social media filtering.
 
-            an_start (str): Start date for analytics filtering.
-            an_end (str): End date for analytics filtering.
-            an_companies (list): List of selected companies for analytics filtering.
-            an_entities (list): List of selected entities for analytics filtering.
-            an_platforms (list): List of selected platforms for analytics filtering.
-            an_uniqueness (str): Uniqueness filter for analytics posts.
-            an_fossil_subcategories (list): Selected fossil subcategories for analytics filtering.
-            an_green_subcategories (list): Selected green subcategories for analytics filtering.
-
         Returns:
-            html.Div: The content to be displayed in the selected tab.
+            html.Div: The posts of the current page.
         """
-        filtered_data = data.copy()
-        print(len(filtered_data))
-        
-        if tab_name == "social_media":
-            start_date, end_date = sm_start, sm_end
-            companies, entities, platforms, classifications = (
-                sm_companies, sm_entities, sm_platforms, sm_classifs
-            )
-            uniqueness = sm_uniqueness
-            
-            # Social subcategory filters
-            subcategory_filters = {
-                "primary_product": "primary_product" in sm_fossil_subcategories,
-                "petrochemical_product": "petrochemical_product" in sm_fossil_subcategories,
-                "infrastructure_production": "infrastructure_production" in sm_fossil_subcategories,
-                "other_fossil": "fossil_fuel_other" in sm_fossil_subcategories,
-                "decreasing_emissions": "decreasing_emissions" in sm_green_subcategories,
-                "viable_solutions": "viable_solutions" in sm_green_subcategories,
-                "false_solutions": "false_solutions" in sm_green_subcategories,
-                "recycling_waste_management": "recycling_waste_management" in sm_green_subcategories,
-                "nature_animal_references": "nature_animal_references" in sm_green_subcategories,
-                "generic_environmental_references": "generic_environmental_references" in sm_green_subcategories,
-                "other_green": "green_other" in sm_green_subcategories
-            }
-        else:  # analytics
-            start_date, end_date = an_start, an_end
-            companies, entities, platforms = an_companies, an_entities, an_platforms
-            uniqueness = an_uniqueness
-            keyword_search = None
-            
-            # Analytics subcategory filters
-            subcategory_filters = {
-                "primary_product": "primary_product" in an_fossil_subcategories,
-                "petrochemical_product": "petrochemical_product" in an_fossil_subcategories,
-                "infrastructure_production": "infrastructure_production" in an_fossil_subcategories,
-                "other_fossil": "fossil_fuel_other" in an_fossil_subcategories,
-                "decreasing_emissions": "decreasing_emissions" in an_green_subcategories,
-                "viable_solutions": "viable_solutions" in an_green_subcategories,
-                "false_solutions": "false_solutions" in an_green_subcategories,
-                "recycling_waste_management": "recycling_waste_management" in an_green_subcategories,
-                "nature_animal_references": "nature_animal_references" in an_green_subcategories,
-                "generic_environmental_references": "generic_environmental_references" in an_green_subcategories,
-                "other_green": "green_other" in an_green_subcategories
-            }
-        
-        # Apply uniqueness filter
-        if uniqueness == "unique":
-            filtered_data = url_deduplicate(filtered_data, 'complete_post_text')
-        
-        # Apply keyword search
-        if keyword_search:
-            keyword_lower = keyword_search.lower()
-            filtered_data = filtered_data[
-                filtered_data['attributes.search_data_fields.post_title'].str.lower().str.contains(keyword_lower, na=False) |
-                filtered_data['attributes.complete_post_text'].str.lower().str.contains(keyword_lower, na=False)
-            ]
-        
-        #Apply date filter
-        if start_date and end_date:
-            filtered_data = filtered_data[
-                (filtered_data['attributes.published_at'] >= start_date) & 
-                (filtered_data['attributes.published_at'] <= end_date)
-            ]
-        
-        #Apply company filter
-        if companies:
-            filtered_data = filtered_data[filtered_data['company'].isin(companies)]
-        
-        #Apply entity filter
-        if entities:
-            filtered_data = filtered_data[filtered_data['attributes.search_data_fields.channel_data.channel_name'].isin(entities)]
-        
-        # Apply platform filter
-        if platforms:
-            filtered_data = filtered_data[filtered_data['attributes.search_data_fields.platform_name'].isin(platforms)]
-        
-        # Apply subcategory filters
-        for subcategory, is_active in subcategory_filters.items():
-            if is_active:
-                filtered_data = filtered_data[filtered_data[subcategory] == 1]
-        
-        if tab_name == "social_media":
-            if classifications:
-                filtered_data = filtered_data[filtered_data['green_brown'].isin(classifications)]
+        generation = holder.current
+        dataset, caches = generation.dataset, generation["content"]
+        flags = subcategory_flags(sm_fossil_subcategories, sm_green_subcategories, sm_uniqueness)
 
+        # The filtered rows only depend on the filter state, so page turns and view toggles reuse them
+        filter_state = (
+            keyword_search or None, freeze(sm_companies), freeze(sm_entities), freeze(sm_platforms),
+            freeze(sm_classifs), freeze(flags), sm_start, sm_end
+        )
+        rows = caches.filter_results.get_or_compute(filter_state, lambda: filter_rows(dataset, *filter_state))
+        posts_per_page = 10
+        
+        if view_toggle == "all_posts":
             posts_per_page = 10
+            # All Posts View
+            start = current_page * posts_per_page
+            end = start + posts_per_page
             
-            if view_toggle == "all_posts":
-                posts_per_page = 10
-                # All Posts View
-                start = current_page * posts_per_page
-                end = start + posts_per_page
-                
-                # Pass the view_toggle to create_post_component
-                posts = [create_post_component(row) for _, row in filtered_data.iloc[start:end].iterrows()]
-            
-                # Update pagination buttons visibility instead of recreating them
-                pagination_buttons = html.Div([
-                    html.Button(
-                        '← Previous',
-                        id='prev_page',
-                        n_clicks=0,
-                        disabled=current_page == 0,
-                        className="pagination-button"
-                    ),
-                    html.Button(
-                        'Next →',
-                        id='next_page',
-                        n_clicks=0,
-                        disabled=end >= len(filtered_data),
-                        className="pagination-button"
-                    )
-                ], style={
-                    "text-align": "center",
-                    "margin-top": "32px",
-                    "padding-bottom": "32px",
-                    "display": "block"  # Make sure buttons are visible
-                })
-                
-                post_count = html.Div([
-                    "Showing ",
-                    html.Strong(f"{len(filtered_data)}"),
-                    " posts"
-                ], className="post-count")
-
-                # Get every other item starting with the first item
-                posts_first_half = posts[::2]
-
-                # Get every other item starting with the second item
-                posts_second_half = posts[1::2]
-                
-                return html.Div([
-                    post_count,
-                    html.Div([
-                        html.Div([
-                            html.Div(posts_first_half, className="posts-grid")
-                        ], style={"width": "48%", "display": "inline-block"}),
-                        html.Div([
-                            html.Div(posts_second_half, className="posts-grid")
-                        ], style={"width": "48%", "display": "inline-block", "margin-left": "4%"})
-                    ]),
-                    pagination_buttons
-                ])
-            
-            elif view_toggle == "compare_posts":
-                # Comparison View with pagination
-                left_data = filtered_data[filtered_data['green_brown'] == left_view]
-                right_data = filtered_data[filtered_data['green_brown'] == right_view]
-                
-                # Apply pagination to both sides
-                start = current_page * posts_per_page
-                end = start + posts_per_page
-                
-                # Pass the view_toggle to create_post_component
-                left_posts = [create_post_component(row) for _, row in left_data.iloc[start:end].iterrows()]
-                right_posts = [create_post_component(row) for _, row in right_data.iloc[start:end].iterrows()]
-                
-                max_posts = max(len(left_data), len(right_data))
-                
-                # Update pagination buttons visibility instead of recreating them
-                pagination_buttons = html.Div([
-                    html.Button(
-                        '← Previous',
-                        id='prev_page',
-                        n_clicks=0,
-                        disabled=current_page == 0,
-                        className="pagination-button"
-                    ),
-                    html.Button(
-                        'Next →',
-                        id='next_page',
-                        n_clicks=0,
-                        disabled=end >= max_posts,
-                        className="pagination-button"
-                    )
-                ], style={
-                    "text-align": "center",
-                    "margin-top": "32px",
-                    "padding-bottom": "32px",
-                    "display": "block"  # Make sure buttons are visible
-                })
-                
-                post_counts = html.Div([
-                    "Showing ",
-                    f" {len(left_data)+len(right_data)} posts"
-                ], className="post-count")
-                
-                return html.Div([
-                    post_counts,
-                    html.Div([
-                        html.Div([
-                            html.H3(f"{classification_labels[left_view]} Posts", className="comparison-title"),
-                            html.Div(left_posts, className="posts-grid")
-                        ], style={"width": "48%", "display": "inline-block"}),
-                        html.Div([
-                            html.H3(f"{classification_labels[right_view]} Posts", className="comparison-title"),
-                            html.Div(right_posts, className="posts-grid")
-                        ], style={"width": "48%", "display": "inline-block", "margin-left": "4%"})
-                    ]),
-                    pagination_buttons
-                ])
+            # The page's posts are shown in one frame, from a single document holding all their embeds
+            posts = create_posts_frame(dataset.rows(rows[start:end]), columns=2)
+            prefetch_pages(caches, rows[start:end], rows[end:end + posts_per_page])
         
-        elif tab_name == "analytics":
-            # Generate overview plots using the Plotly-based functions
-            overview_fig = plot_overview(filtered_data, codebook, green_brown_colors)
-            raw_greenwashing_fig = plot_combined_greenwashing_scores(filtered_data)
-            green_share_fig = plot_green_share(filtered_data)
+            # Update pagination buttons visibility instead of recreating them
+            pagination_buttons = html.Div([
+                html.Button(
+                    '← Previous',
+                    id='prev_page',
+                    n_clicks=0,
+                    disabled=current_page == 0,
+                    className="pagination-button"
+                ),
+                html.Button(
+                    'Next →',
+                    id='next_page',
+                    n_clicks=0,
+                    disabled=end >= len(rows),
+                    className="pagination-button"
+                )
+            ], style={
+                "text-align": "center",
+                "margin-top": "32px",
+                "padding-bottom": "32px",
+                "display": "block"  # Make sure buttons are visible
+            })
             
             post_count = html.Div([
-                "Analysis based on ",
-                html.Strong(f"{len(filtered_data)}"),
+                "Showing ",
+                html.Strong(f"{len(rows)}"),
                 " posts"
             ], className="post-count")
-            
-            # Add hidden pagination buttons for analytics tab to ensure they're always in the DOM
-            hidden_pagination = html.Div([
-                html.Button('← Previous', id='prev_page', n_clicks=0, className="pagination-button"),
-                html.Button('Next →', id='next_page', n_clicks=0, className="pagination-button")
-            ], style={"display": "none"})
-            
+
             return html.Div([
                 post_count,
-                # Overview Section
-                html.Div([
-                    html.H2("Post Classification Overview", className="analytics-header"),
-                    html.P(
-                        "This section shows the distribution of social media posts across categories and sub-categories.",
-                        className="analytics-description"
-                    ),
-                    html.P([
-                            html.Strong("Total Proportions (left) "),
-                            "Stacked bar chart showing the fraction of posts labelled by CLAIMS as Only Green, Only Fossil, Green+Fossil, or Miscellaneous."
-                    ], className="analytics-description"),
-                    html.P([
-                            html.Strong("All Green Posts (middle): "),
-                            "Bar chart showing the number of posts by Green subcategory, as labelled by CLAIMS: Emissions Reduction, False Solutions, Other Green, Recycling/Waste Management, and Low-Carbon Technologies. Posts assigned both Fossil Fuel and Green labels by CLAIMS indicate efforts to greenwash messaging about fossil fuels, and are therefore included in this bar chart."
-                    ], className="analytics-description"),
-                    html.P([
-                            html.Strong("All Fossil Posts (right): "),
-                            "Bar chart showing the number of posts by Fossil Fuel subcategory, as labelled by CLAIMS: Primary Product, Petrochemical Product, Other Fossil Fuel, and Infrastructure & Production."
-                    ], className="analytics-description"),
-                    
-                    
-                    html.Div(
-                        dcc.Graph(
-                            figure=overview_fig,
-                            config={'displayModeBar': False},
-                            style={"height": "600px"}
-                        )
-                    )
-                ], className="analytics-section"),
-                
-                # Greenwashing Score Section
-                html.Div([
-                    html.H2("Greenwashing score: % Green posts / % Green CAPEX", className="analytics-header"),
-                    html.P(
-                        "CDO has pioneered the first quantitative social media Greenwashing Score, which compares the prevalence of a company’s green messaging to its actual climate mitigation investments. The Greenwashing Score is defined as % Green posts divided by % Green CAPEX (capital expenditures), with values greater than 1 indicating greenwashing at the company-level, which we term macro-scale greenwashing. The line graphs show the Greenwashing Score over time for each company.",
-                        className="analytics-description"
-                    ),
-                    html.Div(
-                        dcc.Graph(
-                            figure=raw_greenwashing_fig,
-                            config={'displayModeBar': False},
-                            style={"height": "600px"}
-                        )
-                    )
-                ], className="analytics-section"),
-
-                # Green Share Section
-                html.Div([
-                    html.H2("Green Share of Climate Relevant posts", className="analytics-header"),
-                    html.P(
-                        "Line graph showing the fraction of climate-relevant social media posts that contain Green messaging. We here define Green messaging as any post labelled by CLAIMS as Only Green or Green+Fossil. We define climate-relevant posts as all posts except Miscellaneous ones.",
-                        className="analytics-description"
-                    ),
-                    html.Div(
-                        dcc.Graph(
-                            figure=green_share_fig,
-                            config={'displayModeBar': False},
-                            style={"height": "600px"}
-                        )
-                    )
-                ], className="analytics-section"),
-                
-                # Add hidden pagination buttons
-                hidden_pagination
-
-            ], className="analytics-container")
+                html.Div(posts),
+                pagination_buttons
+            ])
+        
+        elif view_toggle == "compare_posts":
+            # Comparison View with pagination
+            left_rows = rows[dataset.index.value_mask('green_brown', [left_view], rows)]
+            right_rows = rows[dataset.index.value_mask('green_brown', [right_view], rows)]
+            
+            # Apply pagination to both sides
+            start = current_page * posts_per_page
+            end = start + posts_per_page
+            
+            # One frame per side, each holding the embeds of that side's page of posts
+            left_posts = create_posts_frame(dataset.rows(left_rows[start:end]))
+            right_posts = create_posts_frame(dataset.rows(right_rows[start:end]))
+            prefetch_pages(caches, left_rows[start:end], right_rows[start:end],
+                           left_rows[end:end + posts_per_page], right_rows[end:end + posts_per_page])
             
-        elif tab_name == "about":
-            # Calculate dynamic values for the About section
-            total_posts = len(data)
-            platforms = ", ".join(sorted(data['attributes.search_data_fields.platform_name'].unique()))
+            max_posts = max(len(left_rows), len(right_rows))
             
-            # Add hidden pagination buttons for about tab to ensure they're always in the DOM
-            hidden_pagination = html.Div([
-                html.Button('← Previous', id='prev_page', n_clicks=0, className="pagination-button"),
-                html.Button('Next →', id='next_page', n_clicks=0, className="pagination-button")
-            ], style={"display": "none"})
+            # Update pagination buttons visibility instead of recreating them
+            pagination_buttons = html.Div([
+                html.Button(
+                    '← Previous',
+                    id='prev_page',
+                    n_clicks=0,
+                    disabled=current_page == 0,
+                    className="pagination-button"
+                ),
+                html.Button(
+                    'Next →',
+                    id='next_page',
+                    n_clicks=0,
+                    disabled=end >= max_posts,
+                    className="pagination-button"
+                )
+            ], style={
+                "text-align": "center",
+                "margin-top": "32px",
+                "padding-bottom": "32px",
+                "display": "block"  # Make sure buttons are visible
+            })
+            
+            post_counts = html.Div([
+                "Showing ",
+                f" {len(left_rows)+len(right_rows)} posts"
+            ], className="post-count")
             
             return html.Div([
-                # About Section
+                post_counts,
                 html.Div([
-                    html.P([
-                        html.Strong("What is CLAIMS?")
-                    ], style={"font-size": "20px", "margin-bottom": "8px"}),
-                    html.P([
-                        "CLAIMS (Climate Language and Influence Monitoring System) is a tool of the Climate Discourse Observatory that automatically detects greenwashing in oil companies' social media posts. Search by keywords, topic, company, or platform to see data visualizations and summary statistics (Analytics), or explore the raw labelled posts yourself (Post Feed)."
-                    ], style={"font-size": "14px", "margin-bottom": "16px"}),
-                    html.P([
-                        html.Strong("How does CLAIMS work?")
-                    ], style={"font-size": "20px", "margin-bottom": "8px"}),
-                    
-                    html.P([
-                        html.Strong("Model")
-                    ], style={"font-size": "14px", "margin-bottom": "8px"}),
-                    html.P([
-                        "By fine-tuning the ChatGPT-4o Large Language Model from OpenAI, CLAIMS reliably classifies text in social media posts from fossil fuel producers according to the typology of \"green\" and \"fossil fuel\" messaging shown below. Human coders have validated the accuracy of CLAIMS, which achieves F1 predictive performance scores of 80%+."
-                    ], style={"font-size": "14px", "margin-bottom": "8px"}),
-                    html.P([
-                        f"For this pilot study, ChatGPT coded {total_posts} organic posts and paid ads from BP, ExxonMobil, Shell, and the American Petroleum Institute on Facebook, Instagram, X (Twitter), and YouTube."
-                    ], style={"font-size": "14px", "margin-bottom": "16px"}),
-                    
-                    html.P([
-                        html.Strong("Typology")
-                    ], style={"font-size": "14px", "margin-bottom": "8px"}),
-                    
-                    html.P([
-                        "The typology contains five \"green\" categories and four \"fossil fuel\" categories. Multiple labels can apply to the same post."
-                    ], style={"font-size": "14px", "margin-bottom": "8px"}),
-                    # Placeholder for a diagram - you can add an image here
                     html.Div([
-                        html.Img(
-                            src="/assets/codebook_diagram.png",  # Replace with actual image path
-                            style={
-                                "max-width": "50%",
-                                "height": "20%",
-                                "margin": "20px auto",
-                                "display": "block"
-                            }
-                        )
-                    ], style={"text-align": "center", "margin": "30px 0"}),
+                        html.H3(f"{classification_labels[left_view]} Posts", className="comparison-title"),
+                        html.Div(left_posts)
+                    ], style={"width": "48%", "display": "inline-block"}),
+                    html.Div([
+                        html.H3(f"{classification_labels[right_view]} Posts", className="comparison-title"),
+                        html.Div(right_posts)
+                    ], style={"width": "48%", "display": "inline-block", "margin-left": "4%"})
+                ]),
+                pagination_buttons
+            ])
+
+    @app.callback(Output("analytics_post_count", "children"), ANALYTICS_INPUTS)
+    def render_analytics_post_count(*analytics_filters):
+        """
+        Returns:
+            list: The "Analysis based on N posts" line for the Analytics sidebar filters.
+        """
+        summary = analytics_summary(holder.current, analytics_state(*analytics_filters))
+        return ["Analysis based on ", html.Strong(f"{post_weights(summary).sum()}"), " posts"]
+
+    @app.callback(Output("overview_graph", "figure"), ANALYTICS_INPUTS)
+    def render_overview(*analytics_filters):
+        """
+        Returns:
+            dict: The classification overview for the Analytics sidebar filters.
+        """
+        return analytics_figure(holder.current, "overview", analytics_state(*analytics_filters))
+
+    @app.callback(Output("greenwashing_graph", "figure"), ANALYTICS_INPUTS)
+    def render_greenwashing_scores(*analytics_filters):
+        """
+        Returns:
+            dict: The greenwashing scores for the Analytics sidebar filters.
+        """
+        return analytics_figure(holder.current, "greenwashing_scores", analytics_state(*analytics_filters))
+
+    @app.callback(Output("green_share_graph", "figure"), ANALYTICS_INPUTS)
+    def render_green_share(*analytics_filters):
+        """
+        Returns:
+            dict: The green share of climate relevant posts for the Analytics sidebar filters.
+        """
+        return analytics_figure(holder.current, "green_share", analytics_state(*analytics_filters))
+
+    @app.callback(Output("about_content", "children"), Input("tabs", "value"), State("about_content", "children"))
+    def render_about(tab_name, about_content):
+        """
+        Render the About section the first time the About tab is opened.
+
+        Arguments:
+            tab_name (str): The name of the selected tab.
+            about_content: The current content of the About container (None until it is first rendered).
+
+        Returns:
+            html.Div: The About section.
+        """
+        if tab_name != "about" or about_content is not None:
+            raise PreventUpdate
+
+        # Calculate dynamic values for the About section
+        total_posts = len(holder.dataset.data)
+
+        return html.Div([
+            # About Section
+            html.Div([
+                html.P([
+                    html.Strong("What is CLAIMS?")
+                ], style={"font-size": "20px", "margin-bottom": "8px"}),
+                html.P([
+                    "CLAIMS (Climate Language and Influence Monitoring System) is a tool of the Climate Discourse Observatory that automatically detects greenwashing in oil companies' social media posts. Search by keywords, topic, company, or platform to see data visualizations and summary statistics (Analytics), or explore the raw labelled posts yourself (Post Feed)."
+                ], style={"font-size": "14px", "margin-bottom": "16px"}),
+                html.P([
+                    html.Strong("How does CLAIMS work?")
+                ], style={"font-size": "20px", "margin-bottom": "8px"}),
                 
-                    html.P([
-                        html.Strong("Glossary")
-                    ], style={"font-size": "14px", "margin-bottom": "16px"}),
-
-                    html.Ul([
-                        html.Li([
-                    
-                    html.P([
-                        html.Strong("Green posts", style={"font-size": "14px"}),
-                        ": If CLAIMS assigns at least one Green label to a post, the post is coded as Green."
-                    ], style={"font-size": "14px", "margin-bottom": "8px"}),
-                    
-                    html.Ul([
-                        html.Li([
-                            html.Strong("Decreasing Emissions"),
-                            ": Positive or neutral references to greenhouse gas emissions reduction."
-                        ]),
-                        html.Li([
-                            html.Strong("Renewables & Low-Carbon Technologies"),
-                            ": Positive or neutral references to renewable energy and/or other low-carbon technology solutions, such as solar, wind, or hydropower."
-                        ]),
-                        html.Li([
-                            html.Strong("False Solutions"),
-                            ": Positive or neutral references to fossil-fuel-adjacent \'false solutions\' to climate change, such as carbon capture, hydrogen, or \"clean\" methane."
-                        ]),
-                        html.Li([
-                            html.Strong("Recycling & Waste Management"),
-                            ": Positive or neutral references to recycling and waste management efforts."
-                        ]),
-                        html.Li([
-                            html.Strong("Other Green"),
-                            ": Other green messaging, such as nature and generic environmental references."
-                        ])
-                    ], style={"font-size": "14px", "margin-bottom": "16px", "padding-left": "30px"})
-                        ]),
+                html.P([
+                    html.Strong("Model")
+                ], style={"font-size": "14px", "margin-bottom": "8px"}),
+                html.P([
+                    "By fine-tuning the ChatGPT-4o Large Language Model from OpenAI, CLAIMS reliably classifies text in social media posts from fossil fuel producers according to the typology of \"green\" and \"fossil fuel\" messaging shown below. Human coders have validated the accuracy of CLAIMS, which achieves F1 predictive performance scores of 80%+."
+                ], style={"font-size": "14px", "margin-bottom": "8px"}),
+                html.P([
+                    f"For this pilot study, ChatGPT coded {total_posts} organic posts and paid ads from BP, ExxonMobil, Shell, and the American Petroleum Institute on Facebook, Instagram, X (Twitter), and YouTube."
+                ], style={"font-size": "14px", "margin-bottom": "16px"}),
+                
+                html.P([
+                    html.Strong("Typology")
+                ], style={"font-size": "14px", "margin-bottom": "8px"}),
+                
+                html.P([
+                    "The typology contains five \"green\" categories and four \"fossil fuel\" categories. Multiple labels can apply to the same post."
+                ], style={"font-size": "14px", "margin-bottom": "8px"}),
+                # Placeholder for a diagram - you can add an image here
+                html.Div([
+                    html.Img(
+                        src="/assets/codebook_diagram.png",  # Replace with actual image path
+                        style={
+                            "max-width": "50%",
+                            "height": "20%",
+                            "margin": "20px auto",
+                            "display": "block"
+                        }
+                    )
+                ], style={"text-align": "center", "margin": "30px 0"}),
+            
+                html.P([
+                    html.Strong("Glossary")
+                ], style={"font-size": "14px", "margin-bottom": "16px"}),
 
+                html.Ul([
                     html.Li([
-                    
-                    html.P([
-                        html.Strong("Fossil Fuel posts"),
-                        ": If CLAIMS assigns at least one Fossil Fuel label to a post and no green labels, the post is coded as Fossil Fuel."
-                    ], style={"font-size": "14px", "margin-bottom": "8px"}),
-                    
-                    html.Ul([
-                        html.Li([
-                            html.Strong("Primary Product"),
-                            ": References to one or more fossil fuel primary products, such as coal, oil, or methane."
-                        ]),
-                        html.Li([
-                            html.Strong("Petrochemical Product"),
-                            ": References to one or more petrochemical products, such as gasoline or lubricants."
-                        ]),
-                        html.Li([
-                            html.Strong("Infrastructure & Production"),
-                            ": References to fossil fuel production, operations, and/or infrastructure, such as pipelines, oil fields, or refineries."
-                        ]),
-                        html.Li([
-                            html.Strong("Other Fossil Fuel"),
-                            ": Other fossil fuel related messaging not captured by the labels above."
-                        ])
-                    ], style={"font-size": "14px", "margin-bottom": "16px", "padding-left": "30px"})
-
+                
+                html.P([
+                    html.Strong("Green posts", style={"font-size": "14px"}),
+                    ": If CLAIMS assigns at least one Green label to a post, the post is coded as Green."
+                ], style={"font-size": "14px", "margin-bottom": "8px"}),
+                
+                html.Ul([
+                    html.Li([
+                        html.Strong("Decreasing Emissions"),
+                        ": Positive or neutral references to greenhouse gas emissions reduction."
+                    ]),
+                    html.Li([
+                        html.Strong("Renewables & Low-Carbon Technologies"),
+                        ": Positive or neutral references to renewable energy and/or other low-carbon technology solutions, such as solar, wind, or hydropower."
+                    ]),
+                    html.Li([
+                        html.Strong("False Solutions"),
+                        ": Positive or neutral references to fossil-fuel-adjacent \'false solutions\' to climate change, such as carbon capture, hydrogen, or \"clean\" methane."
                     ]),
-
                     html.Li([
-                    
-                    html.P([
-                        html.Strong("Miscellaneous posts"),
-                        ": Posts not assigned any Green or Fossil Fuel labels by CLAIMS are not relevant to climate change and are coded as Miscellaneous."
-                    ], style={"font-size": "14px", "margin-bottom": "16px"}) ]),
+                        html.Strong("Recycling & Waste Management"),
+                        ": Positive or neutral references to recycling and waste management efforts."
+                    ]),
+                    html.Li([
+                        html.Strong("Other Green"),
+                        ": Other green messaging, such as nature and generic environmental references."
+                    ])
+                ], style={"font-size": "14px", "margin-bottom": "16px", "padding-left": "30px"})
+                    ]),
 
+                html.Li([
+                
+                html.P([
+                    html.Strong("Fossil Fuel posts"),
+                    ": If CLAIMS assigns at least one Fossil Fuel label to a post and no green labels, the post is coded as Fossil Fuel."
+                ], style={"font-size": "14px", "margin-bottom": "8px"}),
+                
+                html.Ul([
                     html.Li([
-                    
-                    html.P([
-                        html.Strong("Micro-scale greenwashing"),
-                        ": Micro-scale greenwashing is greenwashing at the level of an individual social media post. This reflects the fact that posts assigned both Fossil Fuel and Green labels by CLAIMS indicate efforts to greenwash messaging about fossil fuels."
-                    ], style={"font-size": "14px", "margin-bottom": "16px"}) ]),
+                        html.Strong("Primary Product"),
+                        ": References to one or more fossil fuel primary products, such as coal, oil, or methane."
+                    ]),
                     html.Li([
-                    
-                    html.P([
-                        html.Strong("Macro-scale greenwashing/Greenwashing Score"),
-                        ": Macro-scale greenwashing is greenwashing at the company-level. To measure macro-scale greenwashing, CDO has pioneered the first quantitative social media Greenwashing Score, which compares the prevalence of a company's green messaging to its actual climate mitigation investments. To calculate the Greenwashing Score, we first calculate the prevalence of green posts (% Green posts) among all climate-relevant posts (those labeled as Green or Fossil Fuel by CLAIMS). Next, we determine the company's spending on low-carbon technologies as a fraction of its total capital expenditures (% Green CAPEX). The Greenwashing Score is defined as % Green posts divided by % Green CAPEX, with values greater than 1 indicating macro-scale greenwashing."
-                    ], style={"font-size": "14px", "margin-bottom": "32px"}) ])
+                        html.Strong("Petrochemical Product"),
+                        ": References to one or more petrochemical products, such as gasoline or lubricants."
                     ]),
-                    
-                    html.P([
-                        html.Strong("What is the Climate Discourse Observatory?")
-                    ], style={"font-size": "14px", "font-size": "20px", "margin-bottom": "16px"}),
-                    
-                    html.P([
-                        "CDO is a research initiative based at the Climate Accountability Lab at the University of Miami, directed by Dr. Geoffrey Supran in collaboration with the Algorithmic Transparency Institute (ATI), a project of the National Conference on Citizenship."
-                    ], style={"font-size": "14px", "margin-bottom": "16px"}),
-
-                ], className="analytics-section"),
+                    html.Li([
+                        html.Strong("Infrastructure & Production"),
+                        ": References to fossil fuel production, operations, and/or infrastructure, such as pipelines, oil fields, or refineries."
+                    ]),
+                    html.Li([
+                        html.Strong("Other Fossil Fuel"),
+                        ": Other fossil fuel related messaging not captured by the labels above."
+                    ])
+                ], style={"font-size": "14px", "margin-bottom": "16px", "padding-left": "30px"})
+
+                ]),
+
+                html.Li([
                 
-                # Add hidden pagination buttons
-                hidden_pagination
+                html.P([
+                    html.Strong("Miscellaneous posts"),
+                    ": Posts not assigned any Green or Fossil Fuel labels by CLAIMS are not relevant to climate change and are coded as Miscellaneous."
+                ], style={"font-size": "14px", "margin-bottom": "16px"}) ]),
+
+                html.Li([
                 
-            ], className="analytics-container")
+                html.P([
+                    html.Strong("Micro-scale greenwashing"),
+                    ": Micro-scale greenwashing is greenwashing at the level of an individual social media post. This reflects the fact that posts assigned both Fossil Fuel and Green labels by CLAIMS indicate efforts to greenwash messaging about fossil fuels."
+                ], style={"font-size": "14px", "margin-bottom": "16px"}) ]),
+                html.Li([
+                
+                html.P([
+                    html.Strong("Macro-scale greenwashing/Greenwashing Score"),
+                    ": Macro-scale greenwashing is greenwashing at the company-level. To measure macro-scale greenwashing, CDO has pioneered the first quantitative social media Greenwashing Score, which compares the prevalence of a company's green messaging to its actual climate mitigation investments. To calculate the Greenwashing Score, we first calculate the prevalence of green posts (% Green posts) among all climate-relevant posts (those labeled as Green or Fossil Fuel by CLAIMS). Next, we determine the company's spending on low-carbon technologies as a fraction of its total capital expenditures (% Green CAPEX). The Greenwashing Score is defined as % Green posts divided by % Green CAPEX, with values greater than 1 indicating macro-scale greenwashing."
+                ], style={"font-size": "14px", "margin-bottom": "32px"}) ])
+                ]),
+                
+                html.P([
+                    html.Strong("What is the Climate Discourse Observatory?")
+                ], style={"font-size": "14px", "font-size": "20px", "margin-bottom": "16px"}),
+                
+                html.P([
+                    "CDO is a research initiative based at the Climate Accountability Lab at the University of Miami, directed by Dr. Geoffrey Supran in collaboration with the Algorithmic Transparency Institute (ATI), a project of the National Conference on Citizenship."
+                ], style={"font-size": "14px", "margin-bottom": "16px"}),
+
+            ], className="analytics-section"),
+            
+        ], className="analytics-container")
@@ -1,13 +1,14 @@
 from dash import Input, Output, State, ALL, callback_context
 import dash
 
-def register_filter_callbacks(app, data):
+def register_filter_callbacks(app, holder):
     """
     Register callbacks for filtering and resetting filters in the dashboard.
 
     Arguments:
         app (dash.Dash): The Dash app instance.
-        data (pd.DataFrame): The dataframe containing the data to be filtered.
+        holder (DatasetHolder): Holder of the dataset containing the data to be filtered; each callback reads the
+            current dataset once, so a dataset swapped in while it runs does not change its result.
     
     Returns:
         None
@@ -29,6 +30,7 @@ def register_filter_callbacks(app, data):
         if not selected_companies:
             return [], []
         
+        data = holder.dataset.data
         channels = []
         for company in selected_companies:
             company_channels = data[data['company'] == company]['attributes.search_data_fields.channel_data.channel_name'].unique()
@@ -56,6 +58,7 @@ def register_filter_callbacks(app, data):
         if not selected_companies:
             return [], []
         
+        data = holder.dataset.data
         channels = []
         for company in selected_companies:
             company_channels = data[data['company'] == company]['attributes.search_data_fields.channel_data.channel_name'].unique()
@@ -160,6 +163,7 @@ def register_filter_callbacks(app, data):
         if n_clicks is None:
             return dash.no_update
         
+        data = holder.dataset.data
         
         companies = sorted(data['company'].unique())
         print(companies)
@@ -210,6 +214,7 @@ def register_filter_callbacks(app, data):
         if n_clicks is None:
             return dash.no_update
         
+        data = holder.dataset.data
         companies = sorted(data['company'].unique())
         platforms = sorted(data['attributes.search_data_fields.platform_name'].unique())
         
@@ -26,28 +26,16 @@ def register_navigation_callbacks(app):
          Input('uniqueness_toggle', 'value'),
          Input('keyword_search', 'value'),
          Input('social_fossil_subcategories', 'value'),
-         Input('social_green_subcategories', 'value'),
-         # Analytics filters
-         Input('analytics_date_range', 'start_date'),
-         Input('analytics_date_range', 'end_date'),
-         Input('analytics_company_filter', 'value'),
-         Input('analytics_entity_filter', 'value'),
-         Input('analytics_platform_filter', 'value'),
-         Input('analytics_uniqueness_toggle', 'value'),
-         Input('analytics_fossil_subcategories', 'value'),
-         Input('analytics_green_subcategories', 'value'),
-         # Tab change
-         Input('tabs', 'value')],
-        [State('current_page', 'data')]
+         Input('social_green_subcategories', 'value')],
+        # Analytics filters and tab changes do not touch the Post Feed, which keeps its page
+        [State('tabs', 'value'),
+         State('current_page', 'data')]
     )
     def update_page(prev_clicks, next_clicks, 
                    # Filter states
                    sm_start, sm_end, sm_companies, sm_entities, sm_platforms, sm_classifs,
                    view_toggle, left_view, right_view, sm_uniqueness, keyword_search,
                    sm_fossil_subcategories, sm_green_subcategories,
-                   # Analytics filters
-                   an_start, an_end, an_companies, an_entities, an_platforms, an_uniqueness,
-                   an_fossil_subcategories, an_green_subcategories,
                    # Tab
                    active_tab,
                    # Current page state
@@ -71,14 +59,6 @@ def register_navigation_callbacks(app):
             keyword_search (str): Keyword search value.
             sm_fossil_subcategories (list): Selected fossil subcategories for social media filter.
             sm_green_subcategories (list): Selected green subcategories for social media filter.
-            an_start (str): Start date for analytics filter.
-            an_end (str): End date for analytics filter.
-            an_companies (list): Selected companies for analytics filter.
-            an_entities (list): Selected entities for analytics filter.
-            an_platforms (list): Selected platforms for analytics filter.
-            an_uniqueness (str): Uniqueness toggle state for analytics.
-            an_fossil_subcategories (list): Selected fossil subcategories for analytics filter.
-            an_green_subcategories (list): Selected green subcategories for analytics filter.
             active_tab (str): The currently active tab in the dashboard.
             current_page (int): The current page number.
         
@@ -92,7 +72,7 @@ def register_navigation_callbacks(app):
         # Get the ID of the component that triggered the callback
         triggered_id = ctx.triggered[0]['prop_id'].split('.')[0]
         
-        # If tab changed or any filter changed, reset to page 0
+        # If any filter changed, reset to page 0
         if triggered_id != 'prev_page' and triggered_id != 'next_page':
             return 0
         
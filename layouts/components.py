@@ -1,3 +1,6 @@
+from html import escape
+from urllib.parse import quote
+
 import pandas as pd
 from dash import html, dcc
 
@@ -57,6 +60,90 @@ banner = html.Div([
     "height": "auto"
 })
 
+# Classification columns shown as badges under a post
+BADGE_COLUMNS = [
+    "primary_product", "petrochemical_product", "infrastructure_production", "fossil_fuel_other",
+    "decreasing_emissions", "viable_solutions", "false_solutions", "recycling_waste_management",
+    "nature_animal_references", "generic_environmental_references", "green_other"
+]
+
+# Size of a post's embedding when the data does not give one, and the height of its badge row
+DEFAULT_POST_SIZE = (600, 800)
+BADGE_ROW_HEIGHT = 48
+
+
+def post_badges(row):
+    """
+    The classification badges of a post.
+
+    Arguments:
+        row (pd.Series): The row of data in the dataframe representing an invidual post.
+    Returns:
+        list: (text, class name, title) of each badge.
+    """
+    fossil = ["primary_product", "petrochemical_product", "infrastructure_production"]
+    return [
+        (
+            column.replace("_", " ").title(),  # Display column name as badge text
+            "classification-badge classification-brown" if column in fossil + ["other_fossil"]
+            else "classification-badge classification-green",
+            row['ff_categories_explanation'] if column in fossil else row['green_categories_explanation']
+        )
+        for column in BADGE_COLUMNS
+        if row[column] == 1  # Only include badges for columns with a value of 1
+    ]
+
+
+def post_badges_html(row):
+    """
+    The classification badges of a post as HTML, for the batch embedding document (see create_posts_frame).
+    """
+    badges = "".join(
+        f'<span class="{class_name}" title="{escape(str(title))}">{escape(text)}</span>'
+        for text, class_name, title in post_badges(row)
+    )
+    return f'<div class="post-footer-2">{badges}</div>'
+
+
+def post_size(row):
+    """
+    Returns:
+        tuple: The width and height in pixels of a post's embedding.
+    """
+    size = []
+    for column, default in zip(["computed_width", "computed_height"], DEFAULT_POST_SIZE):
+        try:
+            size.append(int(float(str(row.get(column, default)).removesuffix("px"))))
+        except ValueError:
+            size.append(default)
+    return tuple(size)
+
+
+def create_posts_frame(rows, columns=1):
+    """
+    Create one iframe showing the Junkipedia embeddings of several posts (e.g. a page of the feed) with their
+    classification badges, from a single /junkipedia_embeds document instead of one /junkipedia_proxy iframe per
+    post. The frame starts at the height of its posts' embeddings and then fits itself to its document.
+
+    Arguments:
+        rows (pd.DataFrame): The posts, in display order.
+        columns (int): The number of columns the posts are laid out in.
+    Returns:
+        html.Iframe: The frame, or None if there are no posts.
+    """
+    if rows.empty:
+        return None
+    heights = [post_size(row)[1] + BADGE_ROW_HEIGHT for _, row in rows.iterrows()]
+    height = sum(max(heights[i:i + columns]) for i in range(0, len(heights), columns))
+    ids = ",".join(quote(str(post_id), safe="") for post_id in rows['id'])
+    return html.Iframe(
+        src=f"/junkipedia_embeds?ids={ids}&columns={columns}",
+        style={"width": "100%", "height": f"{height}px", "border": "0", "display": "block"},
+        # Add all necessary permissions to the sandbox
+        sandbox="allow-scripts allow-same-origin allow-popups allow-forms allow-downloads"
+    )
+
+
 def create_post_component(row):
     """
     Create a post component for the dashboard.
@@ -127,19 +214,7 @@ def create_post_component(row):
         # }),
         
         html.Div([
-            *[
-                html.Span(
-                    column.replace("_", " ").title(),  # Display column name as badge text
-                    className=f"classification-badge classification-brown" if column in ["primary_product", "petrochemical_product", "infrastructure_production","other_fossil"]
-                    else f"classification-badge classification-green",
-                    title=row['ff_categories_explanation'] if column in ["primary_product", "petrochemical_product", "infrastructure_production"] else row['green_categories_explanation']
-                )
-                for column in [
-                    "primary_product", "petrochemical_product", "infrastructure_production", "fossil_fuel_other",
-                    "decreasing_emissions", "viable_solutions", "false_solutions", "recycling_waste_management", "nature_animal_references", "generic_environmental_references", "green_other"
-                ]
-                if row[column] == 1  # Only include badges for columns with a value of 1
-            ]
+            html.Span(text, className=class_name, title=title) for text, class_name, title in post_badges(row)
         ], className="post-footer-2")
     ], className="social-post", style={
         "padding": "0",  # Remove padding to make container match iframe size
@@ -1,6 +1,74 @@
 from dash import html, dcc
 
-# Defines content layout, organizing the three tabs
+# Static part of the Analytics tab; the post count and the three figures are filled in by their own callbacks
+# (see callbacks/content.py)
+analytics_layout = html.Div([
+    html.Div(id='analytics_post_count', className="post-count"),
+    # Overview Section
+    html.Div([
+        html.H2("Post Classification Overview", className="analytics-header"),
+        html.P(
+            "This section shows the distribution of social media posts across categories and sub-categories.",
+            className="analytics-description"
+        ),
+        html.P([
+                html.Strong("Total Proportions (left) "),
+                "Stacked bar chart showing the fraction of posts labelled by CLAIMS as Only Green, Only Fossil, Green+Fossil, or Miscellaneous."
+        ], className="analytics-description"),
+        html.P([
+                html.Strong("All Green Posts (middle): "),
+                "Bar chart showing the number of posts by Green subcategory, as labelled by CLAIMS: Emissions Reduction, False Solutions, Other Green, Recycling/Waste Management, and Low-Carbon Technologies. Posts assigned both Fossil Fuel and Green labels by CLAIMS indicate efforts to greenwash messaging about fossil fuels, and are therefore included in this bar chart."
+        ], className="analytics-description"),
+        html.P([
+                html.Strong("All Fossil Posts (right): "),
+                "Bar chart showing the number of posts by Fossil Fuel subcategory, as labelled by CLAIMS: Primary Product, Petrochemical Product, Other Fossil Fuel, and Infrastructure & Production."
+        ], className="analytics-description"),
+        
+        
+        html.Div(
+            dcc.Graph(
+                id='overview_graph',
+                config={'displayModeBar': False},
+                style={"height": "600px"}
+            )
+        )
+    ], className="analytics-section"),
+    
+    # Greenwashing Score Section
+    html.Div([
+        html.H2("Greenwashing score: % Green posts / % Green CAPEX", className="analytics-header"),
+        html.P(
+            "CDO has pioneered the first quantitative social media Greenwashing Score, which compares the prevalence of a company’s green messaging to its actual climate mitigation investments. The Greenwashing Score is defined as % Green posts divided by % Green CAPEX (capital expenditures), with values greater than 1 indicating greenwashing at the company-level, which we term macro-scale greenwashing. The line graphs show the Greenwashing Score over time for each company.",
+            className="analytics-description"
+        ),
+        html.Div(
+            dcc.Graph(
+                id='greenwashing_graph',
+                config={'displayModeBar': False},
+                style={"height": "600px"}
+            )
+        )
+    ], className="analytics-section"),
+
+    # Green Share Section
+    html.Div([
+        html.H2("Green Share of Climate Relevant posts", className="analytics-header"),
+        html.P(
+            "Line graph showing the fraction of climate-relevant social media posts that contain Green messaging. We here define Green messaging as any post labelled by CLAIMS as Only Green or Green+Fossil. We define climate-relevant posts as all posts except Miscellaneous ones.",
+            className="analytics-description"
+        ),
+        html.Div(
+            dcc.Graph(
+                id='green_share_graph',
+                config={'displayModeBar': False},
+                style={"height": "600px"}
+            )
+        )
+    ], className="analytics-section"),
+], className="analytics-container")
+
+# Defines content layout, organizing the three tabs. Each tab has its own container, which is shown or hidden
+# when the tab changes instead of being rebuilt.
 content_layout = html.Div([
     dcc.Tabs(
         id="tabs",
@@ -11,5 +79,7 @@ content_layout = html.Div([
             dcc.Tab(label="About", value="about", style={"padding": "12px 24px", "font-weight": "500"})
         ], style={"margin-bottom": "24px"}
     ),
-    html.Div(id='content')
+    html.Div(id='feed_content'),
+    html.Div(analytics_layout, id='analytics_content', style={"display": "none"}),
+    html.Div(id='about_content', style={"display": "none"})
 ])
@@ -1,16 +1,88 @@
 import pandas as pd
+import numpy as np
 import ast
+from util.functions import GREEN_BROWN_LABELS, duplicate_groups, label_green_brown, text_hashes
+from util.near_duplicates import minhash_signatures, near_duplicate_clusters
+
+
+def decode_y_pred(y_pred, n_fields):
+    """
+    Decode the "y_pred" column (the LLM classification flags, e.g. "[0, 1, 0, ...]") into a flag matrix.
+
+    A column of 13 binary flags has at most 2**13 distinct well-formed values, however many posts there are.
+    The column is therefore dictionary-encoded with pd.factorize, each distinct value is parsed once, and the
+    flag matrix is gathered from the small decoded table with one array lookup. Values that are not bracketed
+    (e.g. missing predictions) decode to all zeros, as do bracketed values that cannot be parsed; values with the
+    wrong number of flags are padded/truncated. The last two cases are counted as malformed.
+
+    Arguments:
+        y_pred (pd.Series): The raw "y_pred" values (strings or lists).
+        n_fields (int): The number of flags per post.
+
+    Returns:
+        flags (np.ndarray): uint8 matrix of shape (len(y_pred), n_fields).
+        n_malformed (int): Number of rows with a malformed bracketed value.
+    """
+    codes, uniques = pd.factorize(y_pred.astype(str))
+    table = np.zeros((len(uniques), n_fields), dtype=np.uint8)
+    malformed = np.zeros(len(uniques), dtype=bool)
+    for i, value in enumerate(uniques):
+        if not value.startswith("["):
+            continue
+        try:
+            values = [int(v) != 0 for v in ast.literal_eval(value)]
+        except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+            malformed[i] = True
+            continue
+        if len(values) != n_fields:
+            malformed[i] = True
+            values = (values + [0] * n_fields)[:n_fields]
+        table[i] = values
+    return table[codes], int(malformed[codes].sum())
+
+
+# Low-cardinality string columns stored as pandas categoricals
+CATEGORY_COLUMNS = [
+    "company",
+    "attributes.search_data_fields.channel_data.channel_name",
+    "attributes.search_data_fields.platform_name",
+    "green_brown",
+]
+
+
+def compact_data(data, flag_columns):
+    """
+    Shrink the in-memory footprint of the processed frame.
+        - classification flags become bool (1 byte instead of int64)
+        - company, channel, platform and label strings become categoricals
+        - the raw "y_pred" string is dropped once it has been expanded into the flag columns
+
+    Arguments:
+        data (pd.DataFrame): The processed frame.
+        flag_columns (list): The 0/1 classification columns.
+
+    Returns:
+        pd.DataFrame: The compacted frame.
+    """
+    data = data.drop(columns=["y_pred"], errors="ignore")
+    data[flag_columns] = data[flag_columns].astype(bool)
+    for col in CATEGORY_COLUMNS:
+        if col in data.columns:
+            data[col] = data[col].astype("category")
+    return data
+
+
 def process_data_csv(data, channel_mapping):
     """
     Process the raw data for the dashboard.
 
     Arguments:
         data (pd.dataframe): contains all posts and their metadata
-        channel_mapping (pd.dataframe): contains the mapping of channels to companies
+        channel_mapping (ChannelMapping): the mapping of channels to companies (util/channel_mapping.py)
 
     Returns:
         data (pd.dataframe:) same dataframe after the following processing steps:
-            - Merging with the channel mapping dataframe to attach a company name to each post
+            - Looking up the channel of each post in the channel mapping to attach a company name
             - Processing the "y_pred" column, which is the classification result from the LLM, into invidual boolean fields 
             and adding a "misc" field and "other_green"/"other_fossil" field if the post is classified as green but none of the other green/fossil fuel categories are true.
             We end up with the following fields for classification fo the post (all boolean):
@@ -40,13 +112,9 @@ def process_data_csv(data, channel_mapping):
 
 
 
-    # Remove duplicates in channel_mapping to avoid Cartesian product during merge
-    channel_mapping = channel_mapping.drop_duplicates(subset=['attributes.search_data_fields.channel_data.channel_name'])
-    # Merge with channel mapping to get company information
-    data = data.merge(
-        channel_mapping[['attributes.search_data_fields.channel_data.channel_name', 'entity']],
-        on='attributes.search_data_fields.channel_data.channel_name', how='left'
-    ).rename(columns={'entity': 'company'})
+    # Look up the company of each post's channel (a hash lookup in the normalized mapping, no merge)
+    data = data.copy()
+    data['company'] = channel_mapping.entities_by_name(data['attributes.search_data_fields.channel_data.channel_name'])
 
     # Split the "y_pred" column into individual binary fields
     fields = [
@@ -78,30 +146,7 @@ def process_data_csv(data, channel_mapping):
     )
 
 
-    def get_final_green_ff_label(post):
-        """
-        Arguments: 
-        post: Receives a row of the dataframe containing all posts as a representation of a single post
-
-        Returns:
-        final label of the post based off the LLM classification. Looks at column 'green' and 'fossil_fuel' which both contain boolean values
-        "green" for green posts
-        "brown" for fossil fuel posts
-        "green_brown" for posts that are both green and fossil fuel
-        "misc" for posts that are neither green nor fossil fuel
-
-        """
-        if post['green'] and post['fossil_fuel']:
-            return "green_brown"
-        elif post['green']:
-            return "green"
-        elif post['fossil_fuel']:
-            return "brown"
-        else:
-            return "misc"
-    
-    #df['label'] = df.apply(lambda row: label_post_green_brown(row['green'], row['fossil_fuel']), axis=1)
-    data["green_brown"] = data.apply(get_final_green_ff_label, axis=1)
+    data["green_brown"] = label_green_brown(data["green"], data["fossil_fuel"])
     data["year"] = data['published_at'].dt.year
 
     data["attributes.search_data_fields.platform_name"] = data["attributes.search_data_fields.platform_name"].replace("InstagramDirect", "Instagram")
@@ -113,6 +158,117 @@ def process_data_csv(data, channel_mapping):
 
 
 
+# Columns of the source data (the JSON dump, or util.segments) used by the dashboard
+SOURCE_COLUMNS = [
+    'id',
+    'y_pred',
+    'attributes.published_at',
+    'attributes.complete_post_text',
+    'attributes.search_data_fields.channel_data.channel_name',
+    'attributes.search_data_fields.platform_name',
+    'attributes.engagement_fields.likes_count',
+    'attributes.engagement_fields.comments_count',
+    'attributes.search_data_fields.published_at',
+    'computed_width',
+    'computed_height',
+    "green_label_explanation",
+    "green_categories_explanation",
+    "ff_label_explanation",
+    "ff_categories_explanation",
+    "parent_entity"
+]
+
+# The binary classification columns expanded from "y_pred", in order (new schema)
+FLAG_FIELDS = [
+    "fossil_fuel",
+    "primary_product",
+    "petrochemical_product",
+    "infrastructure_production",
+    "fossil_fuel_other",
+    "green",
+    "decreasing_emissions",
+    "viable_solutions",
+    "false_solutions",
+    "recycling_waste_management",
+    "nature_animal_references",
+    "generic_environmental_references",
+    "green_other",
+]
+
+
+def process_posts(data):
+    """
+    The steps of process_data_json that look at one post at a time (everything but deduplication, sorting and
+    duplicate grouping), so they can be applied to a batch of new posts on its own (see merge_posts).
+
+    Arguments:
+        data (pd.DataFrame): Posts with the SOURCE_COLUMNS, 'parent_entity' renamed to 'company'.
+
+    Returns:
+        pd.DataFrame: The processed and compacted posts.
+    """
+    # 2) Expand y_pred (new schema) into binary columns
+    fields = FLAG_FIELDS
+
+    # # Ensure y_pred exists (empty string for missing)
+    # if "y_pred" not in data.columns:
+    #     data["y_pred"] = ""
+
+    # y_split = data["y_pred"].str.strip("[]").astype(str).str.split(",", expand=True)
+    # print(y_split.head())
+
+    # # Pad y_split to the correct number of columns
+    # for i in range(len(fields)):
+    #     if i not in y_split.columns:
+    #         y_split[i] = pd.NA
+
+    # # Assign and coerce to integers (0/1), treating invalid/missing as 0
+    # for i, field in enumerate(fields):
+    #     data[field] = pd.to_numeric(y_split[i], errors="coerce").fillna(0).astype(int)
+
+    flags, n_malformed = decode_y_pred(data["y_pred"], len(fields))
+    data[fields] = pd.DataFrame(flags.astype(int), index=data.index, columns=fields)
+    if n_malformed:
+        print(f"y_pred: {n_malformed} malformed rows could not be fully decoded")
+
+    # 3) Derived flags
+    # misc: 1 if none of the categories are set to 1
+    data["misc"] = (data[fields].sum(axis=1) == 0).astype(int)
+
+    # 4) Date handling
+    # published_at to datetime and extract year
+    if "attributes.published_at" in data.columns:
+        data["attributes.published_at"] = pd.to_datetime(data["attributes.published_at"], unit="ms", errors="coerce", utc=False)
+        data["year"] = data["attributes.published_at"].dt.year
+    else:
+        data["year"] = pd.NA
+
+    # 6) Engagement = likes + comments (from engagement_fields.*)
+    like_col = "attributes.engagement_fields.likes_count"
+    comment_col = "attributes.engagement_fields.comments_count"
+    # If these columns are missing, create them to avoid KeyErrors
+    if like_col not in data.columns:
+        data[like_col] = 0
+    if comment_col not in data.columns:
+        data[comment_col] = 0
+
+    data["engagement"] = (
+        pd.to_numeric(data[like_col], errors="coerce").fillna(0).astype(int)
+        + pd.to_numeric(data[comment_col], errors="coerce").fillna(0).astype(int)
+    )
+
+    # 7) Final label from green / fossil
+    data["green_brown"] = label_green_brown(data["green"], data["fossil_fuel"])
+
+    # 8) Platform normalization
+    platform_col = "attributes.search_data_fields.platform_name"
+    if platform_col in data.columns:
+        data[platform_col] = data[platform_col].replace("InstagramDirect", "Instagram")
+
+    # 11) Compact memory layout
+    return compact_data(data, fields + ["misc"])
+
+
 def process_data_json(data_json: dict) -> pd.DataFrame:
     """
     Process the raw data for the dashboard from a column-oriented JSON input.
@@ -155,6 +311,9 @@ def process_data_json(data_json: dict) -> pd.DataFrame:
         - normalized 'attributes.search_data_fields.platform_name'
         - deduplicated by 'attributes.complete_post_text'
         - sorted by 'attributes.published_at' desc
+        - 'text_hash', 'dup_group_id', 'dup_group_size' and 'is_unique_representative' from duplicate_groups
+        - 'near_dup_cluster_id', 'near_dup_cluster_size' and 'is_cluster_representative' from near_duplicate_clusters
+        - compacted with compact_data (boolean flags, categorical low-cardinality strings, no raw 'y_pred')
     """
 
     #  Build a DataFrame from column-oriented JSON
@@ -173,118 +332,85 @@ def process_data_json(data_json: dict) -> pd.DataFrame:
     data = pd.DataFrame(cols)
 
     #get rid of most of the columns we don't need
-    keep_columns = [
-        'id',
-        'y_pred',
-        'attributes.published_at',
-        'attributes.complete_post_text',
-        'attributes.search_data_fields.channel_data.channel_name',
-        'attributes.search_data_fields.platform_name',
-        'attributes.engagement_fields.likes_count',
-        'attributes.engagement_fields.comments_count',
-        'attributes.search_data_fields.published_at',
-        'computed_width',
-        'computed_height',
-        "green_label_explanation",
-        "green_categories_explanation",
-        "ff_label_explanation",
-        "ff_categories_explanation",
-        "parent_entity"
-    ]
-    data = data[keep_columns].copy()
+    data = data[SOURCE_COLUMNS].copy()
 
     data = data.rename(columns={
         'parent_entity': 'company'
     })
-    # 2) Expand y_pred (new schema) into binary columns
-    fields = [
-        "fossil_fuel",
-        "primary_product",
-        "petrochemical_product",
-        "infrastructure_production",
-        "fossil_fuel_other",
-        "green",
-        "decreasing_emissions",
-        "viable_solutions",
-        "false_solutions",
-        "recycling_waste_management",
-        "nature_animal_references",
-        "generic_environmental_references",
-        "green_other",
-    ]
-
-    # # Ensure y_pred exists (empty string for missing)
-    # if "y_pred" not in data.columns:
-    #     data["y_pred"] = ""
-
-    # y_split = data["y_pred"].str.strip("[]").astype(str).str.split(",", expand=True)
-    # print(y_split.head())
-
-    # # Pad y_split to the correct number of columns
-    # for i in range(len(fields)):
-    #     if i not in y_split.columns:
-    #         y_split[i] = pd.NA
-
-    # # Assign and coerce to integers (0/1), treating invalid/missing as 0
-    # for i, field in enumerate(fields):
-    #     data[field] = pd.to_numeric(y_split[i], errors="coerce").fillna(0).astype(int)
-
-    data[fields] = data["y_pred"].apply(lambda x: pd.Series(ast.literal_eval(str(x))) if str(x).startswith("[") else pd.Series([0]*len(fields)))
-
-    # 3) Derived flags
-    # misc: 1 if none of the categories are set to 1
-    data["misc"] = (data[fields].sum(axis=1) == 0).astype(int)
-
-    # 4) Date handling
-    # published_at to datetime and extract year
-    if "attributes.published_at" in data.columns:
-        data["attributes.published_at"] = pd.to_datetime(data["attributes.published_at"], unit="ms", errors="coerce", utc=False)
-        data["year"] = data["attributes.published_at"].dt.year
-    else:
-        data["year"] = pd.NA
+    # 2)-4), 6)-8) and 11): per-post steps
+    data = process_posts(data)
 
     # 5) Drop duplicates by text
     if "attributes.complete_post_text" in data.columns:
         data = data.drop_duplicates(subset=["attributes.complete_post_text"]).copy()
 
-    # 6) Engagement = likes + comments (from engagement_fields.*)
-    like_col = "attributes.engagement_fields.likes_count"
-    comment_col = "attributes.engagement_fields.comments_count"
-    # If these columns are missing, create them to avoid KeyErrors
-    if like_col not in data.columns:
-        data[like_col] = 0
-    if comment_col not in data.columns:
-        data[comment_col] = 0
-
-    data["engagement"] = (
-        pd.to_numeric(data[like_col], errors="coerce").fillna(0).astype(int)
-        + pd.to_numeric(data[comment_col], errors="coerce").fillna(0).astype(int)
-    )
-
-    # 7) Final label from green / fossil
-    def get_final_green_ff_label(post):
-        g = bool(post.get("green", 0))
-        f = bool(post.get("fossil_fuel", 0))
-        if g and f:
-            return "green_brown"
-        elif g:
-            return "green"
-        elif f:
-            return "brown"
-        else:
-            return "misc"
-
-    data["green_brown"] = data.apply(get_final_green_ff_label, axis=1)
-
-    # 8) Platform normalization
-    platform_col = "attributes.search_data_fields.platform_name"
-    if platform_col in data.columns:
-        data[platform_col] = data[platform_col].replace("InstagramDirect", "Instagram")
-
     # 9) Sort by published_at desc when available
     data["attributes.published_at"] = pd.to_datetime(data["attributes.published_at"], errors="coerce")
     if "attributes.published_at" in data.columns:
         data = data.sort_values(by="attributes.published_at", ascending=False)
 
+    # 10) Duplicate groups by URL-normalized text, and near-duplicate (campaign) clusters of those groups, which
+    #     back the "Unique Messages" toggle; computed after sorting so the newest post of each is its representative
+    if "attributes.complete_post_text" in data.columns:
+        groups = duplicate_groups(data["attributes.complete_post_text"])
+        data[groups.columns] = groups
+        clusters = near_duplicate_clusters(data["attributes.complete_post_text"], groups["dup_group_id"].to_numpy())
+        data[clusters.columns] = clusters
 
     return data
+
+
+def merge_posts(data, posts, signatures=None):
+    """
+    Upsert new posts into a processed frame.
+    Only the new posts go through the per-post steps (process_posts) and are hashed and shingled; the steps over
+    all posts (deduplication by text, sorting, duplicate groups and near-duplicate clusters) are vectorized passes
+    over the hashes and MinHash signatures. A post whose id is already in `data` replaces it, a new post whose text
+    is already in `data` is dropped (as the later duplicate), and within `posts` the last row of an id wins.
+
+    Arguments:
+        data (pd.DataFrame): A frame returned by process_data_json or merge_posts (the TEXT_COLUMNS may be split off).
+        posts (pd.DataFrame): The new posts with the SOURCE_COLUMNS (e.g. read from util.segments).
+        signatures (tuple): minhash_signatures of the texts of `data`, computed if None.
+
+    Returns:
+        data (pd.DataFrame): The merged frame, with the columns of `data`.
+        signatures (tuple): minhash_signatures of the texts of the merged frame.
+        positions (np.ndarray): The row position in the merged frame of each row of `data` (-1 if it was replaced).
+    """
+    text_col = "attributes.complete_post_text"
+    if signatures is None:
+        signatures = minhash_signatures(data[text_col])
+
+    new = process_posts(posts.reindex(columns=SOURCE_COLUMNS).rename(columns={'parent_entity': 'company'}))
+    new = new[~new["id"].duplicated(keep="last")]
+    kept = ~data["id"].isin(new["id"]).to_numpy()
+    new = new[~new[text_col].isin(data.loc[kept, text_col]) & ~new[text_col].duplicated()]
+    new["attributes.published_at"] = pd.to_datetime(new["attributes.published_at"], errors="coerce")
+    new["text_hash"] = text_hashes(new[text_col])
+    new_signatures = minhash_signatures(new[text_col])
+
+    # Row of `data` (or len(data) + row of `new`) that each merged row comes from
+    kept_rows = np.flatnonzero(kept)
+    merged = pd.concat([data.iloc[kept_rows], new.reindex(columns=data.columns)])
+    merged.index = np.concatenate([kept_rows, len(data) + np.arange(len(new))])
+    merged = merged.sort_values(by="attributes.published_at", ascending=False, kind="stable")
+    origin = merged.index.to_numpy()
+    merged = merged.reset_index(drop=True)
+    for col in CATEGORY_COLUMNS:
+        if col in merged.columns:
+            merged[col] = merged[col].astype("category")
+    merged["green_brown"] = merged["green_brown"].astype(pd.CategoricalDtype(GREEN_BROWN_LABELS))
+
+    all_signatures = np.concatenate([signatures[0], new_signatures[0]])[origin]
+    has_shingles = np.concatenate([signatures[1], new_signatures[1]])[origin]
+    groups = duplicate_groups(merged[text_col], merged["text_hash"].to_numpy())
+    merged[groups.columns] = groups
+    clusters = near_duplicate_clusters(merged[text_col], groups["dup_group_id"].to_numpy(),
+                                       signatures=(all_signatures, has_shingles))
+    merged[clusters.columns] = clusters
+
+    positions = np.full(len(data), -1, dtype=np.int64)
+    from_data = origin < len(data)
+    positions[origin[from_data]] = np.flatnonzero(from_data)
+    return merged, (all_signatures, has_shingles), positions
@@ -0,0 +1,21 @@
+import pytest
+
+from standin_api import StandinAPI
+
+
+@pytest.fixture
+def standin_api():
+    """
+    Start stand-ins of the Junkipedia API (see tests/standin_api.py): call with StandinAPI's options, e.g.
+    standin_api(throttle_every=5). They are shut down after the test.
+    """
+    apis = []
+
+    def start(**options):
+        api = StandinAPI(**options)
+        apis.append(api)
+        return api
+
+    yield start
+    for api in apis:
+        api.close()
@@ -0,0 +1,124 @@
+"""
+Local stand-in for the Junkipedia API, used by the tests of the ingestion (tests/test_ingest.py) and of the
+upstream HTTP client (tests/test_http_client.py) through the `standin_api` fixture (tests/conftest.py).
+
+    python -m tests.standin_api --serve 8765     serve it, e.g. for
+                                                 python add_data.py labels <csv> --api-base http://127.0.0.1:8765
+
+The stand-in answers /posts?post_uid=<uid>[,<uid>...] and /channels/<channel_id> with made-up posts and channels.
+It throttles every `throttle_every`-th request with 429 and a Retry-After header, and fails the uids in
+`failing_uids` with 500, so retries, the rate limit and checkpoint resumption can be exercised without the real API.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class StandinAPI:
+    """
+    The stand-in server, run on a daemon thread (see the module docstring).
+    """
+
+    def __init__(self, port=0, throttle_every=0, retry_after=0.2, failing_uids=(), delay=0.0):
+        """
+        Arguments:
+            port (int): Port to listen on (0 for any free port).
+            throttle_every (int): Answer every n-th request with 429 (0 to never throttle).
+            retry_after (float): Retry-After of the throttled responses, in seconds.
+            failing_uids (iterable): Uids answered with 500.
+            delay (float): Seconds every response is delayed by.
+        """
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.failing_uids = set(failing_uids)
+        self.delay = delay
+        self.requests = []  # (time.monotonic(), path) of every request
+        self._lock = threading.Lock()
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                status, headers, payload = api.respond(self.path)
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                for name, value in {"Content-Type": "application/json", **headers}.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def respond(self, path):
+        """
+        Returns:
+            status (int), headers (dict), payload (dict): The response to a GET of `path`.
+        """
+        with self._lock:
+            self.requests.append((time.monotonic(), path))
+            count = len(self.requests)
+        time.sleep(self.delay)
+        if self.throttle_every and count % self.throttle_every == 0:
+            return 429, {"Retry-After": str(self.retry_after)}, {}
+        parts = urlsplit(path)
+        if parts.path.startswith("/channels/"):
+            channel_id = parts.path.rsplit("/", 1)[1]
+            return 200, {}, {"data": {"id": channel_id, "attributes": {
+                "channel_uid": f"uid-{channel_id}", "channel_name": f"Channel {channel_id}",
+                "platform_name": "Facebook", "handle": f"channel{channel_id}",
+                "link": f"https://example.org/channels/{channel_id}",
+            }}}
+        uids = parse_qs(parts.query).get("post_uid", [""])[0].split(",")
+        if self.failing_uids.intersection(uids):
+            return 500, {}, {}
+        return 200, {}, {"data": [self._post(uid) for uid in uids if uid]}
+
+    def _post(self, uid):
+        return {"id": uid, "attributes": {
+            "post_uid": uid,
+            "published_at": "2024-05-01T12:00:00Z",
+            "search_data_fields": {"url": f"https://example.org/posts/{uid}", "post_type": ["status"],
+                                   "channel_data": {"channel_name": "Channel 1"}, "platform_name": "Facebook"},
+            "channel": {"channel_uid": "uid-1"},
+        }}
+
+    def max_rate(self, window=1.0):
+        """
+        Returns:
+            int: The most requests received within any `window` seconds.
+        """
+        times = [t for t, _ in self.requests]
+        return max((sum(1 for t in times if start <= t < start + window) for start in times), default=0)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Junkipedia API.")
+    parser.add_argument("--serve", type=int, metavar="PORT", required=True, help="Port to serve the stand-in on")
+    parser.add_argument("--throttle-every", type=int, default=0, help="Answer every n-th request with 429")
+    args = parser.parse_args()
+
+    api = StandinAPI(args.serve, throttle_every=args.throttle_every)
+    print(f"Serving the stand-in API on {api.url} (Ctrl-C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        api.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""
+The batch document of /junkipedia_embeds (util.junkipedia.batch_post_html), built from the embedding pages of the
+saved post pages in data/fixtures/junkipedia/.
+"""
+import re
+
+from benchmarks.proxy_rewrite import FIXTURE_DIR
+from util.junkipedia import batch_post_html, rewrite_post_html
+
+PAGES = [(path.stem, rewrite_post_html(path.read_text(), path.stem)) for path in sorted(FIXTURE_DIR.glob("*.html"))]
+
+
+def test_one_head_and_a_section_per_post_in_order():
+    document = batch_post_html(PAGES + [("404", None)], columns=2)
+    assert document.count("<head") == 1
+    assert re.findall(r'<section class="post-block" id="post-([^"]+)"', document) == [i for i, _ in PAGES] + ["404"]
+    assert "grid-template-columns:repeat(2," in document
+    for post_id, _ in PAGES:
+        assert f"/posts/{post_id}" in document
+
+
+def test_footers_and_boxes():
+    post_id = PAGES[0][0]
+    document = batch_post_html(PAGES, footers={post_id: '<div class="badges">B</div>'}, sizes={post_id: (500, 700)},
+                               style=".badges{color:red}")
+    section = document[document.index(f'id="post-{post_id}"'):]
+    section = section[:section.index("</section>")]
+    assert 'style="width:500px;height:700px;"' in section
+    assert section.endswith('<div class="badges">B</div>')
+    assert ".badges{color:red}" in document
@@ -0,0 +1,28 @@
+"""
+The normalized channel -> entity mapping (util/channel_mapping.py): a channel name of several channels maps to the
+entity of its first row in the CSV, also after a round trip through the Parquet file.
+"""
+import pandas as pd
+
+from util.channel_mapping import ChannelMapping, normalize_channel_mapping
+
+CSV = pd.DataFrame({
+    "entity": ["Shell", "BP", "Exxon"],
+    "channel_id": ["1", "2", "3"],
+    "platform": ["Twitter", "Facebook", "Twitter"],
+    "search_data_fields.channel_data.channel_name": ["Energy News", "Energy News", "Exxon"],
+    "channel_uid": ["900", "100", "500"],
+})
+
+
+def test_repeated_name_maps_to_first_row():
+    mapping = ChannelMapping(normalize_channel_mapping(CSV))
+    assert mapping.channels["channel_uid"].tolist() == ["100", "500", "900"]
+    assert list(mapping.entities_by_name(["Energy News", "Exxon"])) == ["Shell", "Exxon"]
+    assert list(mapping.entities_by_uid(["100", "900"])) == ["BP", "Shell"]
+
+
+def test_saved_mapping_keeps_csv_order(tmp_path):
+    ChannelMapping(normalize_channel_mapping(CSV)).save(tmp_path / "channel_mapping.parquet")
+    mapping = ChannelMapping.load(tmp_path / "channel_mapping.parquet")
+    assert list(mapping.entities_by_name(["Energy News"])) == ["Shell"]
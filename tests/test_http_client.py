@@ -0,0 +1,43 @@
+"""
+The upstream HTTP client (util/http_client.py) against the stand-in API: retries of throttled requests, Retry-After
+and the cap on the requests in flight.
+"""
+import threading
+import time
+
+import pytest
+
+from util.http_client import HTTPClient, UpstreamBusy
+
+
+def test_throttled_request_is_retried_after_retry_after(standin_api):
+    # urllib3 only accepts whole seconds (or a date) in Retry-After
+    api = standin_api(throttle_every=2, retry_after=1)
+    client = HTTPClient(retries=2, backoff=0.01)
+    client.get(f"{api.url}/posts?post_uid=1")
+    started = time.monotonic()
+    response = client.get(f"{api.url}/posts?post_uid=2")
+    assert response.status_code == 200
+    assert len(api.requests) == 3
+    assert time.monotonic() - started >= 1
+
+
+def test_server_errors_are_retried_then_returned(standin_api):
+    api = standin_api(failing_uids={"1"})
+    client = HTTPClient(retries=2, backoff=0.01)
+    response = client.get(f"{api.url}/posts?post_uid=1")
+    assert response.status_code == 500
+    assert len(api.requests) == 3
+
+
+def test_busy_when_all_slots_are_taken(standin_api):
+    api = standin_api(delay=0.5)
+    client = HTTPClient(max_concurrency=1, queue_timeout=0.1)
+    slow = threading.Thread(target=client.get, args=(f"{api.url}/posts?post_uid=1",))
+    slow.start()
+    time.sleep(0.1)
+    try:
+        with pytest.raises(UpstreamBusy):
+            client.get(f"{api.url}/posts?post_uid=2")
+    finally:
+        slow.join()
@@ -0,0 +1,85 @@
+"""
+The ingestion (util/ingest.py) against the stand-in API: retries and Retry-After, the token bucket's rate limit,
+reporting of the failed uids, checkpoint resumption and multi-uid queries, and the conversion of the labeled posts.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from process_data import FLAG_FIELDS
+from util.channel_mapping import ChannelMapping
+from util.ingest import Ingestor, labeled_posts
+
+
+def fetched(records):
+    return sum(1 for record in records if "url" in record)
+
+
+def test_throttled_requests_are_retried(standin_api, tmp_path):
+    api = standin_api(throttle_every=5, retry_after=0.2)
+    ingestor = Ingestor("key", api.url, workers=4, rate=100, retries=3, backoff=0.05)
+    records = ingestor.run(range(40), tmp_path / "checkpoint.jsonl")
+    assert fetched(records) == 40
+    assert ingestor.failed == []
+    assert len(api.requests) > 40
+
+
+def test_retry_after_is_honoured(standin_api, tmp_path):
+    api = standin_api(throttle_every=2, retry_after=0.5)
+    ingestor = Ingestor("key", api.url, workers=1, rate=100, retries=1, backoff=0.01)
+    ingestor.run(range(2), tmp_path / "checkpoint.jsonl")
+    (throttled, _), (retried, _) = api.requests[1:3]
+    assert retried - throttled >= 0.5
+
+
+def test_rate_is_capped(standin_api, tmp_path):
+    api = standin_api()
+    ingestor = Ingestor("key", api.url, workers=4, rate=20)
+    ingestor.run(range(60), tmp_path / "checkpoint.jsonl")
+    # Any second may see the rate plus the `workers` tokens saved up in the bucket (and one more for the jitter of
+    # the arrival times)
+    assert api.max_rate() <= 20 + 4 + 1
+
+
+def test_failed_uids_are_reported_and_resumed(standin_api, tmp_path):
+    api = standin_api(failing_uids={"3", "7"})
+    ingestor = Ingestor("key", api.url, workers=4, rate=100, retries=1, backoff=0.01)
+    checkpoint = tmp_path / "checkpoint.jsonl"
+    ingestor.run(range(10), checkpoint)
+    assert sorted(ingestor.failed) == ["3", "7"]
+
+    api.failing_uids.clear()
+    before = len(api.requests)
+    records = ingestor.run(range(10), checkpoint)
+    assert sorted(path for _, path in api.requests[before:]) == ["/posts?post_uid=3", "/posts?post_uid=7"]
+    assert fetched(records) == 10
+    assert ingestor.failed == []
+
+
+def test_multi_uid_queries(standin_api, tmp_path):
+    api = standin_api()
+    ingestor = Ingestor("key", api.url, workers=2, rate=100, batch_size=10)
+    records = ingestor.run(range(50), tmp_path / "checkpoint.jsonl")
+    assert len(api.requests) == 5
+    assert fetched(records) == 50
+
+
+def test_labeled_posts():
+    mapping = ChannelMapping(pd.DataFrame({
+        "channel_uid": ["123", "456"], "channel_id": ["1", "2"], "platform": "Twitter", "channel_name": ["a", "b"],
+        "handle": None, "link": None, "entity": pd.Categorical(["Shell", "BP"]),
+    }))
+    labels = pd.DataFrame({"uid": [1, 2, 3], "brown": [1, 0, 0], "green_message": [0, 1, 0], "green": [0, 1, 1],
+                           "renewable_energy": [0, 1, 0], "nature_animal_references": [0, 0, 1]})
+    records = pd.DataFrame({"uid": [1, 2, 3], "url": "u", "published_at": "2024-01-01", "content": "text",
+                            "channel_name": "a", "platform": "Twitter", "likes_count": 1, "comments_count": 2,
+                            "channel_uid": [123, np.nan, 456]})
+    posts = labeled_posts(labels.merge(records, on="uid", how="left"), mapping)
+    # The uids are floats after the merge, and a missing one maps to no entity
+    assert posts["parent_entity"].isna().tolist() == [False, True, False]
+    assert posts["parent_entity"].dropna().tolist() == ["Shell", "BP"]
+    flags = [dict(zip(FLAG_FIELDS, json.loads(y_pred))) for y_pred in posts["y_pred"]]
+    assert [name for name, flag in flags[0].items() if flag] == ["fossil_fuel", "fossil_fuel_other"]
+    assert [name for name, flag in flags[1].items() if flag] == ["green", "viable_solutions"]
+    assert [name for name, flag in flags[2].items() if flag] == ["green", "nature_animal_references"]
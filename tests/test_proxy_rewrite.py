@@ -0,0 +1,37 @@
+"""
+The Junkipedia proxy's HTML rewrite (util.junkipedia.rewrite_post_html) must produce the same page as the
+BeautifulSoup implementation it replaced (benchmarks/proxy_rewrite.py), on every post page saved in
+data/fixtures/junkipedia/ and on the benchmark's synthetic page.
+"""
+import re
+
+import pytest
+
+from benchmarks.proxy_rewrite import FIXTURE_DIR, normalized_tree, rewrite_post_html_soup, synthetic_page
+from util.junkipedia import rewrite_post_html
+
+PAGES = [(path.stem, path.read_text()) for path in sorted(FIXTURE_DIR.glob("*.html"))]
+PAGES.append(("434229051", synthetic_page("434229051")))
+IDS = [path.name for path in sorted(FIXTURE_DIR.glob("*.html"))] + ["synthetic"]
+
+
+def test_fixture_pages_saved():
+    assert list(FIXTURE_DIR.glob("*.html")), f"No post pages saved in {FIXTURE_DIR}"
+
+
+@pytest.mark.parametrize("post_id,page", PAGES, ids=IDS)
+def test_rewrite_matches_soup(post_id, page):
+    assert normalized_tree(rewrite_post_html(page, post_id)) == normalized_tree(rewrite_post_html_soup(page, post_id))
+
+
+@pytest.mark.parametrize("post_id,page", PAGES, ids=IDS)
+def test_rewrite_keeps_only_the_post(post_id, page):
+    hrefs = [dict(entry[2]).get("href", "") for entry in normalized_tree(rewrite_post_html(page, post_id))
+             if entry[:2] == ("tag", "a")]
+    permalinks = [href for href in hrefs if re.search(r"/posts/\d+$", href)]
+    assert permalinks and all(href.endswith(f"/posts/{post_id}") for href in permalinks)
+
+
+def test_page_without_posts_wrapper():
+    with pytest.raises(ValueError):
+        rewrite_post_html("<html><head></head><body><p>Not found</p></body></html>", "1")
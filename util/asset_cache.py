@@ -0,0 +1,212 @@
+"""
+Content-addressed cache of the static assets (CSS and JavaScript) that proxied Junkipedia pages load.
+Every proxied post page has the same Junkipedia head, so instead of each iframe loading the stylesheets and scripts
+from Junkipedia, each asset is fetched once per host, stored on local disk under the SHA-256 of its content and
+served from our origin with an ETag and an immutable, year-long Cache-Control (a changed asset gets a new name).
+Browsers then load the shared assets once instead of once per iframe.
+
+The directory (JUNKIPEDIA_ASSET_DIR, default data/cache/junkipedia_assets) is shared by the workers on a host:
+    blobs/<sha256><ext>   the asset contents
+    urls/<sha256 of url>  the blob name and fetch time of each upstream URL
+URLs are fetched again after JUNKIPEDIA_ASSET_TTL seconds (default 86400), in case an unversioned asset changed.
+"""
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urljoin
+
+import requests
+from flask import abort, send_file
+
+from util.cache import register_cache
+from util.http_client import UpstreamBusy, client
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_DIRECTORY = REPO_ROOT / "data" / "cache" / "junkipedia_assets"
+DEFAULT_TTL = 24 * 60 * 60
+# Browsers may keep a content-addressed asset for a year without revalidating it
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+_EXTENSIONS = {"text/css": ".css", "text/javascript": ".js", "application/javascript": ".js"}
+_BLOB_NAME = re.compile(r"[0-9a-f]{64}(\.[a-z0-9]+)?")
+# url(...) and @import "..." references of a stylesheet
+_CSS_REFERENCE = re.compile(r"""url\(\s*(['"]?)([^'")\s]+)\1\s*\)|@import\s+(['"])([^'"]+)\3""")
+
+
+def _absolute_css_references(css, url):
+    """
+    Resolve the relative url()/@import references of a stylesheet against its upstream URL, so they keep pointing
+    at the upstream once the stylesheet is served from our origin.
+    """
+    def absolute(match):
+        if match.group(2) is not None:
+            quote, reference = match.group(1), match.group(2)
+            if reference.startswith(("data:", "#")):
+                return match.group(0)
+            return f"url({quote}{urljoin(url, reference)}{quote})"
+        quote = match.group(3)
+        return f"@import {quote}{urljoin(url, match.group(4))}{quote}"
+    return _CSS_REFERENCE.sub(absolute, css)
+
+
+class AssetCache:
+    """
+    Fetches upstream assets into a content-addressed directory and serves them (see the module docstring).
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, route="/junkipedia_assets", ttl=DEFAULT_TTL):
+        """
+        Arguments:
+            directory (str or Path): Directory shared by the workers.
+            route (str): Path prefix under which the app serves the blobs (see `serve`).
+            ttl (float): Seconds after which an upstream URL is fetched again.
+        """
+        self.directory = Path(directory)
+        self.route = route.rstrip("/")
+        self.ttl = ttl
+        (self.directory / "blobs").mkdir(parents=True, exist_ok=True)
+        (self.directory / "urls").mkdir(parents=True, exist_ok=True)
+        self._urls = {}  # url -> (blob name, fetched_at), read from / written to urls/
+        self._lock = threading.Lock()
+        self.fetches = 0
+        self.failures = 0
+        self.served = 0
+        self.not_modified = 0
+        register_cache("junkipedia_assets", self)
+
+    def _write(self, path, data):
+        tmp_path = Path(f"{path}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def _url_path(self, url):
+        return self.directory / "urls" / hashlib.sha256(url.encode()).hexdigest()
+
+    def _lookup(self, url):
+        with self._lock:
+            known = self._urls.get(url)
+        if known is None:
+            try:
+                record = json.loads(self._url_path(url).read_text())
+                known = (record["blob"], record["fetched_at"])
+            except (OSError, ValueError, KeyError):
+                return None
+            with self._lock:
+                self._urls[url] = known
+        name, fetched_at = known
+        if time.time() - fetched_at > self.ttl or not (self.directory / "blobs" / name).exists():
+            return None
+        return name
+
+    def blob(self, url):
+        """
+        Get the blob of an upstream asset, fetching and storing it if it is not known (or due for a refresh).
+
+        Arguments:
+            url (str): Absolute URL of the asset.
+
+        Returns:
+            str: The blob name (content hash and extension), or None if the asset could not be fetched.
+        """
+        return self.fetch(url)[0]
+
+    def fetch(self, url):
+        """
+        Like `blob`, but also report why an asset could not be fetched, so callers can pass the failure on instead
+        of fetching the URL again.
+
+        Returns:
+            name (str): The blob name, or None if the asset could not be fetched.
+            status (int): 200, the upstream status of a failed fetch, 502 if the upstream could not be reached or
+                503 if too many upstream requests are in flight.
+        """
+        name = self._lookup(url)
+        if name is not None:
+            return name, 200
+        self.fetches += 1
+        try:
+            response = client.get(url)
+            status = response.status_code
+        except (requests.RequestException, UpstreamBusy) as e:
+            print(f"Could not fetch asset {url}: {e!r}")
+            response, status = None, 503 if isinstance(e, UpstreamBusy) else 502
+        if status != 200:
+            self.failures += 1
+            return None, status
+
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        content = response.content
+        if content_type == "text/css":
+            content = _absolute_css_references(response.text, url).encode()
+        extension = _EXTENSIONS.get(content_type) or mimetypes.guess_extension(content_type) or ""
+        name = hashlib.sha256(content).hexdigest() + extension
+        blob_path = self.directory / "blobs" / name
+        if not blob_path.exists():
+            self._write(blob_path, content)
+        fetched_at = time.time()
+        self._write(self._url_path(url), json.dumps({"url": url, "blob": name, "fetched_at": fetched_at}).encode())
+        with self._lock:
+            self._urls[url] = (name, fetched_at)
+        return name, 200
+
+    def local_url(self, url, origin=""):
+        """
+        Returns:
+            str: The URL under which the app serves the asset at `url` (prefixed with `origin`), or None if it
+                could not be fetched.
+        """
+        name = self.blob(url)
+        return None if name is None else f"{origin}{self.route}/{name}"
+
+    def serve(self, name, max_age=IMMUTABLE_MAX_AGE, immutable=True):
+        """
+        Flask response for a blob, with its content hash as ETag (answering If-None-Match with 304).
+
+        Arguments:
+            name (str): The blob name.
+            max_age (int): Seconds browsers may cache the response.
+            immutable (bool): Mark the response immutable (only for URLs that name the content).
+
+        Returns:
+            flask.Response: The response.
+        """
+        path = self.directory / "blobs" / name
+        if not _BLOB_NAME.fullmatch(name) or not path.exists():
+            abort(404)
+        response = send_file(path, mimetype=mimetypes.guess_type(name)[0] or "application/octet-stream",
+                             etag=name.split(".")[0], max_age=max_age, conditional=True)
+        response.cache_control.public = True
+        response.cache_control.immutable = immutable
+        if response.status_code == 304:
+            self.not_modified += 1
+        else:
+            self.served += 1
+        return response
+
+    def stats(self):
+        """
+        Returns:
+            dict: Fetch and serve counters of this process and the number of stored blobs.
+        """
+        return {
+            "directory": str(self.directory),
+            "blobs": sum(1 for _ in (self.directory / "blobs").iterdir()),
+            "fetches": self.fetches,
+            "failures": self.failures,
+            "served": self.served,
+            "not_modified": self.not_modified,
+        }
+
+
+def asset_cache_from_env(route="/junkipedia_assets"):
+    """
+    Returns:
+        AssetCache: An asset cache in JUNKIPEDIA_ASSET_DIR with JUNKIPEDIA_ASSET_TTL, served under `route`.
+    """
+    return AssetCache(os.environ.get("JUNKIPEDIA_ASSET_DIR", DEFAULT_DIRECTORY), route,
+                      float(os.environ.get("JUNKIPEDIA_ASSET_TTL", DEFAULT_TTL)))
@@ -0,0 +1,145 @@
+"""
+Bounded in-process caches for callback results.
+Every cache is registered by name so their hit/miss counters can be inspected at runtime (see `cache_stats` and
+the /cache_stats route in app.py) when sizing them.
+"""
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# name -> cache (LRUCache or anything else with stats()), for cache_stats
+_REGISTRY = {}
+
+
+def freeze(value):
+    """
+    Turn a callback input into a hashable, order-insensitive cache key component.
+    Lists become sorted tuples, and None and empty selections (which both mean "no filter") become ().
+
+    Arguments:
+        value: A callback input value (None, str, number or list).
+
+    Returns:
+        A hashable equivalent of `value`.
+    """
+    if value is None:
+        return ()
+    if isinstance(value, (list, tuple, set)):
+        return tuple(sorted(value, key=str))
+    return value
+
+
+def sizeof(value):
+    """
+    Approximate memory footprint of a cached value in bytes (array buffers, bytes and strings by length).
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if isinstance(value, (list, tuple)):
+        return sum(sizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache bounded by the total size of its values.
+    Entries are evicted oldest-use first once the sum of `sizeof(value)` exceeds `max_bytes`; a value larger than
+    `max_bytes` on its own is not cached at all.
+    """
+
+    def __init__(self, name, max_bytes):
+        self.name = name
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        register_cache(name, self)
+
+    def get(self, key):
+        """
+        Returns:
+            The cached value for `key` (marking it as most recently used), or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """
+        Store `value` under `key`, evicting least recently used entries until the cache fits in `max_bytes`.
+        """
+        size = sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached value for `key`, computing and storing it with `compute()` on a miss.
+        """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """
+        Drop all entries (the counters are kept).
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Returns:
+            dict: Entry count, size, bound and hit/miss/eviction counters of the cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+def register_cache(name, cache):
+    """
+    Include `cache` (any object with a `stats()` method) in cache_stats under `name`.
+    """
+    _REGISTRY[name] = cache
+
+
+def cache_stats():
+    """
+    Returns:
+        dict: The stats of every registered cache, by name.
+    """
+    return {name: cache.stats() for name, cache in _REGISTRY.items()}
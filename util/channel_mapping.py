@@ -0,0 +1,157 @@
+"""
+Normalized channel -> entity (company) mapping.
+data/channel_mapping.csv is maintained by hand: it repeats channel names across platforms, carries empty
+spreadsheet columns and has to be deduplicated before every merge. `python add_data.py channels <csv>` builds a
+normalized mapping from it once: the metadata of every channel is fetched from the Junkipedia API, the channels
+are deduplicated by channel_uid and written to data/channel_mapping.parquet, one row per channel sorted by
+channel_uid, with the entity dictionary-encoded (a categorical). The position of each channel's first row in the CSV
+is kept, so a channel name of several channels maps to the entity of its first row in the CSV, as the lookup by
+name did before the mapping was normalized.
+Loading that file builds hash indexes on the channel uids and names, so the posts' channels are mapped to entities
+by looking up each distinct channel once and gathering the entity codes, instead of a pandas merge.
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_PATH = REPO_ROOT / "data" / "channel_mapping.parquet"
+CSV_PATH = REPO_ROOT / "data" / "channel_mapping.csv"
+
+# Columns of the normalized mapping, and the columns of the hand-maintained CSV they are read from
+CHANNEL_COLUMNS = ["channel_uid", "channel_id", "platform", "channel_name", "handle", "link", "entity", "csv_order"]
+CSV_COLUMNS = {"search_data_fields.channel_data.channel_name": "channel_name"}
+
+
+def parse_channel(channel_id, channel):
+    """
+    Flatten a channel of the API's response into the columns of the mapping.
+
+    Arguments:
+        channel_id (str): The Junkipedia channel id.
+        channel (dict): The response's "data".
+
+    Returns:
+        dict: The channel's metadata (None values where the API has none).
+    """
+    attributes = channel.get("attributes", {})
+    return {
+        "channel_id": str(channel_id),
+        "channel_uid": attributes.get("channel_uid"),
+        "platform": attributes.get("platform_name") or attributes.get("platform"),
+        "channel_name": attributes.get("channel_name"),
+        "handle": attributes.get("handle"),
+        "link": attributes.get("link"),
+    }
+
+
+def normalize_channel_mapping(mapping, fetched=None):
+    """
+    Normalize a channel -> entity table such as data/channel_mapping.csv.
+
+    Arguments:
+        mapping (pd.DataFrame): One row per channel and entity, with 'entity', 'channel_id' and 'channel_uid'.
+        fetched (dict): Channel metadata from the API by channel id (see parse_channel); it replaces the values of
+            `mapping` where the API has one.
+
+    Returns:
+        pd.DataFrame: The CHANNEL_COLUMNS, one row per channel_uid, sorted by channel_uid, entity as categorical
+            and csv_order the position of the channel's first row in `mapping`.
+    """
+    channels = mapping.rename(columns=CSV_COLUMNS).reindex(columns=CHANNEL_COLUMNS[:-1]).astype(object)
+    channels = channels.apply(lambda col: col.map(lambda v: str(v).strip() if pd.notna(v) else None))
+    channels["csv_order"] = np.arange(len(channels))
+    if fetched:
+        api = pd.DataFrame(list(fetched.values())).set_index("channel_id").reindex(channels["channel_id"])
+        for col in api.columns:
+            channels[col] = api[col].where(api[col].notna(), channels[col].to_numpy()).to_numpy()
+
+    rows = channels[channels["channel_uid"].notna() & channels["entity"].notna()]
+    conflicting = rows.groupby("channel_uid")["entity"].nunique()
+    if (conflicting > 1).any():
+        print(f"{(conflicting > 1).sum()} channels are mapped to several entities; keeping the first of each")
+    channels = rows.drop_duplicates(subset="channel_uid").sort_values("channel_uid").reset_index(drop=True)
+    channels["entity"] = channels["entity"].astype("category")
+    # A name's first row in the CSV is dropped when its channel_uid repeats an earlier row of another name
+    first_rows = rows[rows["channel_name"].notna()].drop_duplicates(subset="channel_name")
+    first_rows = first_rows.set_index("channel_name")["entity"]
+    kept = channels.sort_values("csv_order").drop_duplicates(subset="channel_name").set_index("channel_name")
+    changed = first_rows.index[first_rows != kept["entity"].astype(object).reindex(first_rows.index)].tolist()
+    if changed:
+        print(f"{len(changed)} channel names no longer map to the entity of their first row in the CSV, whose "
+              f"channel_uid repeats an earlier row: {', '.join(changed)}")
+    return channels
+
+
+class ChannelMapping:
+    """
+    Lookups from channels to entities over a normalized mapping (see the module docstring).
+    """
+
+    def __init__(self, channels):
+        """
+        Arguments:
+            channels (pd.DataFrame): As returned by normalize_channel_mapping.
+        """
+        self.channels = channels
+        self.entities = channels["entity"].cat.categories
+        self._codes = channels["entity"].cat.codes.to_numpy()
+        self._uids = pd.Index(channels["channel_uid"])
+        # A channel name of several channels maps to the entity of the first one in the CSV (mappings saved before
+        # csv_order was kept fall back to the channel_uid order)
+        order = np.arange(len(channels))
+        if "csv_order" in channels:
+            order = np.argsort(channels["csv_order"].to_numpy(), kind="stable")
+        first = order[~channels["channel_name"].iloc[order].duplicated().to_numpy()]
+        self._names = pd.Index(channels["channel_name"].iloc[first])
+        self._name_codes = self._codes[first]
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH, csv_path=CSV_PATH):
+        """
+        Load the normalized mapping, or normalize the hand-maintained CSV if it has not been built.
+
+        Returns:
+            ChannelMapping: The mapping.
+        """
+        if Path(path).exists():
+            channels = pd.read_parquet(path)
+            channels["entity"] = channels["entity"].astype("category")
+            return cls(channels)
+        print(f"{path} not found, normalizing {csv_path} (build it with: python add_data.py channels {csv_path})")
+        return cls(normalize_channel_mapping(pd.read_csv(csv_path, dtype=str)))
+
+    def save(self, path=DEFAULT_PATH):
+        """
+        Write the mapping to a Parquet file (the entity column dictionary-encoded).
+        """
+        tmp_path = Path(f"{path}.tmp")
+        self.channels.to_parquet(tmp_path, index=False)
+        tmp_path.replace(path)
+
+    def _lookup(self, index, codes, keys):
+        keys = pd.Series(keys)
+        if isinstance(keys.dtype, pd.CategoricalDtype):
+            # Look up each distinct channel once and gather by the keys' codes
+            positions = index.get_indexer(keys.cat.categories.astype(str))
+            found = np.append(np.where(positions >= 0, codes[positions], -1), -1)
+            entity_codes = found[keys.cat.codes.to_numpy()]
+        else:
+            positions = index.get_indexer(keys.astype(str))
+            entity_codes = np.where(positions >= 0, codes[positions], -1)
+        return pd.Categorical.from_codes(entity_codes, categories=self.entities)
+
+    def entities_by_uid(self, channel_uids):
+        """
+        Returns:
+            pd.Categorical: The entity of each channel uid (NaN if the channel is not mapped).
+        """
+        return self._lookup(self._uids, self._codes, channel_uids)
+
+    def entities_by_name(self, channel_names):
+        """
+        Returns:
+            pd.Categorical: The entity of each channel name (NaN if the channel is not mapped).
+        """
+        return self._lookup(self._names, self._name_codes, channel_names)
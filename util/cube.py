@@ -0,0 +1,213 @@
+"""
+Pre-aggregated post counts (an OLAP cube) for the Analytics tab.
+The Analytics figures only need post counts per company, year, final label and classification flags, so instead of
+regrouping the filtered posts on every render, the posts are counted once per load by (company, channel, platform,
+month, green_brown, flags) and the Analytics callback rolls those cells up for the selected filters.
+"""
+import numpy as np
+import pandas as pd
+
+from util.filter_index import DATE_COLUMN
+
+# Weight column of rolled-up frames: the number of posts each row stands for
+WEIGHT_COLUMN = "n_posts"
+
+# Month code of posts without a publication date
+NO_MONTH = np.iinfo(np.int32).min
+
+# Dimensions a cell is keyed by, besides its month and flags
+_DIMENSIONS = ["company", "channel", "platform", "green_brown"]
+
+
+def post_weights(df):
+    """
+    The number of posts each row of `df` stands for: WEIGHT_COLUMN for frames rolled up from the cube, 1 for
+    frames of individual posts. The Analytics plots count posts by summing these weights instead of counting rows,
+    so they give the same figures for a roll-up as for the posts it was rolled up from.
+
+    Arguments:
+        df (pd.DataFrame): Posts, or a frame returned by AnalyticsCube.rollup.
+
+    Returns:
+        pd.Series: The weight of each row.
+    """
+    if WEIGHT_COLUMN in df.columns:
+        return df[WEIGHT_COLUMN]
+    return pd.Series(1, index=df.index, dtype="int64")
+
+
+def company_year_counts(df):
+    """
+    Count the climate-relevant posts (labelled other than 'misc') of `df` per company and year, weighted by
+    post_weights.
+
+    Arguments:
+        df (pd.DataFrame): Posts, or a frame returned by AnalyticsCube.rollup, with columns 'company', 'year',
+            'green_brown', 'green' and 'fossil_fuel'.
+
+    Returns:
+        pd.DataFrame: Columns 'company', 'year', 'total_posts', 'green_posts' and 'brown_posts'.
+    """
+    weights = post_weights(df)
+    df = df.assign(
+        weight=weights,
+        green_weight=df["green"].astype(int) * weights,
+        brown_weight=df["fossil_fuel"].astype(int) * weights
+    )
+    return (
+        df[df["green_brown"] != "misc"]
+        .groupby(["company", "year"], observed=True)
+        .agg(
+            total_posts=("weight", "sum"),
+            green_posts=("green_weight", "sum"),
+            brown_posts=("brown_weight", "sum")
+        )
+        .reset_index()
+    )
+
+
+def _month_of(timestamp):
+    """
+    Returns:
+        int: The month code (months since 1970-01) of a nanosecond timestamp.
+    """
+    return int(np.datetime64(timestamp, "ns").astype("datetime64[M]").astype(np.int64))
+
+
+def _month_start(month):
+    """
+    Returns:
+        int: The nanosecond timestamp of the first instant of a month code.
+    """
+    return int(np.datetime64(int(month), "M").astype("datetime64[ns]").astype(np.int64))
+
+
+class AnalyticsCube:
+    """
+    Sparse cube of post counts: one cell per occupied combination of company, channel, platform, publication
+    month, final label and set of classification flags (as a bitmask), stored as parallel NumPy arrays.
+
+    Company, channel, platform and label filters become lookup-table gathers over the cells, the flag filters a
+    bitmask test, and a date range selects whole months from the cells. The posts of the (at most two) partially
+    covered months at the ends of the range are counted directly through the filter index, as the cube cannot
+    split a month.
+    """
+
+    def __init__(self, data, index):
+        """
+        Arguments:
+            data (pd.DataFrame): The processed post table.
+            index (FilterIndex): The filter index of `data`.
+        """
+        self._index = index
+        self.flag_columns = index.flag_columns
+        self._bit = {column: i for i, column in enumerate(self.flag_columns)}
+        if len(self.flag_columns) > 63:
+            raise ValueError("AnalyticsCube supports at most 63 flag columns")
+        self._year_dtype = data["year"].dtype if "year" in data.columns else np.dtype("float64")
+        dates = data[DATE_COLUMN].to_numpy(dtype="datetime64[ns]")
+        self._months = np.where(np.isnat(dates), NO_MONTH, dates.astype("datetime64[M]").astype(np.int64))
+        self._months = self._months.astype(np.int32)
+
+        cells = self._count(self._encode(np.arange(len(data))))
+        self._cells = {col: cells[col].to_numpy() for col in cells.columns}
+        self.size = len(cells)
+
+    def _encode(self, positions):
+        """
+        Returns:
+            pd.DataFrame: The cell coordinates of the posts at `positions`.
+        """
+        bits = np.zeros(len(positions), dtype=np.uint64)
+        for i, column in enumerate(self.flag_columns):
+            bits |= self._index.flag(column, positions).astype(np.uint64) << np.uint64(i)
+        coordinates = {name: self._index.codes(name)[positions] for name in _DIMENSIONS}
+        coordinates["month"] = self._months[positions]
+        coordinates["bits"] = bits
+        return pd.DataFrame(coordinates)
+
+    @staticmethod
+    def _count(coordinates, weights=None):
+        """
+        Returns:
+            pd.DataFrame: One row per distinct coordinate combination, with its WEIGHT_COLUMN summed.
+        """
+        coordinates = coordinates.assign(**{WEIGHT_COLUMN: 1 if weights is None else weights})
+        keys = [c for c in coordinates.columns if c != WEIGHT_COLUMN]
+        return coordinates.groupby(keys, sort=False, as_index=False, dropna=False)[WEIGHT_COLUMN].sum()
+
+    def rollup(self, companies=None, channels=None, platforms=None, classifications=None, flags=(),
+               start_date=None, end_date=None):
+        """
+        Count the posts matching a combination of filters by company, year, final label and flags.
+        Takes the same filters as FilterIndex.select, with the same semantics.
+
+        Arguments:
+            companies (list): Selected companies.
+            channels (list): Selected channels.
+            platforms (list): Selected platforms.
+            classifications (list): Selected 'green_brown' labels.
+            flags (iterable): Classification columns that must be set.
+            start_date (str): Start of the publication date range.
+            end_date (str): End of the publication date range.
+
+        Returns:
+            pd.DataFrame: Columns 'company', 'year', 'green_brown', one bool column per flag column and
+                WEIGHT_COLUMN. Each row stands for WEIGHT_COLUMN posts with those values; see post_weights.
+        """
+        selections = {"company": companies, "channel": channels, "platform": platforms, "green_brown": classifications}
+        required = np.uint64(0)
+        for column in flags:
+            required |= np.uint64(1) << np.uint64(self._bit[column])
+
+        keep = (self._cells["bits"] & required) == required
+        for name, values in selections.items():
+            if values:
+                keep &= self._index.value_lookup(name, values)[self._cells[name]]
+
+        partial = []
+        if start_date and end_date:
+            start, end = pd.Timestamp(start_date).value, pd.Timestamp(end_date).value
+            first_full = _month_of(start) + (0 if _month_start(_month_of(start)) == start else 1)
+            last_full = _month_of(end + 1) - 1
+            if first_full <= last_full:
+                keep &= (self._cells["month"] >= first_full) & (self._cells["month"] <= last_full)
+                windows = [(start, _month_start(first_full) - 1), (_month_start(last_full + 1), end)]
+            else:
+                keep[:] = False
+                windows = [(start, end)]
+            for window_start, window_end in windows:
+                window = self._index.date_window(pd.Timestamp(window_start), pd.Timestamp(window_end))
+                rows = self._index.select(companies, channels, platforms, classifications, flags=flags,
+                                          rows=np.arange(window.start, window.stop))
+                if len(rows):
+                    partial.append(self._count(self._encode(rows)))
+
+        cells = pd.DataFrame({col: values[keep] for col, values in self._cells.items()})
+        cells = pd.concat([cells] + partial, ignore_index=True) if partial else cells
+        return self._summarize(cells)
+
+    def _summarize(self, cells):
+        """
+        Roll cells up to (company, year, green_brown, flags) and decode them into labelled columns.
+        """
+        months = cells["month"].to_numpy()
+        years = np.where(months == NO_MONTH, np.nan, months // 12 + 1970)
+        cells = self._count(
+            pd.DataFrame({"company": cells["company"], "year": years, "green_brown": cells["green_brown"],
+                          "bits": cells["bits"]}),
+            cells[WEIGHT_COLUMN].to_numpy(),
+        )
+
+        summary = pd.DataFrame({
+            "company": pd.Categorical.from_codes(cells["company"], self._index.categories("company")),
+            "year": cells["year"],
+            "green_brown": pd.Categorical.from_codes(cells["green_brown"], self._index.categories("green_brown")),
+        })
+        if not summary["year"].isna().any():
+            summary["year"] = summary["year"].astype(self._year_dtype)
+        bits = cells["bits"].to_numpy(dtype=np.uint64)
+        for i, column in enumerate(self.flag_columns):
+            summary[column] = (bits >> np.uint64(i)) & np.uint64(1) == 1
+        summary[WEIGHT_COLUMN] = cells[WEIGHT_COLUMN].to_numpy(dtype=np.int64)
+        return summary
@@ -0,0 +1,462 @@
+"""
+On-disk cache of the processed dataset.
+Parsing the column-oriented JSON dump and running process_data_json dominates cold start, so the processed
+frame is written once to a Parquet file and every later process start reads it back directly.
+A cache file is only valid for the exact source file and processing code that produced it.
+The long explanation columns are split off into a SQLite text store (util/text_store.py) next to the Parquet file,
+and the keyword search index (util/search_index.py) is stored alongside both.
+
+Posts ingested after the dump are stored as segments (util/segments.py). They are merged onto the processed dump
+incrementally: only the posts of segments not merged yet are processed, and the result is stored as a snapshot
+named after the dump's key and the merged segments, so the next start reads it directly. The MinHash signatures of
+a snapshot's posts are stored with it, so merging never shingles the posts already merged. Each snapshot also has
+its own text store of the merged segments' posts, which is read before the dump's.
+
+Build the cache ahead of time (e.g. in the deploy step) with:
+    python -m util.data_cache data/<dump>.json [--segments data/segments]
+"""
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from process_data import merge_posts, process_data_json
+from util.dataset import Dataset
+from util.near_duplicates import minhash_signatures
+from util.search_index import SearchIndex
+from util.segments import SegmentStore
+from util.text_store import TEXT_COLUMNS, TextStore, copy_text_store, upsert_texts, write_text_store
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_CACHE_DIR = REPO_ROOT / "data" / "cache"
+
+# Source files whose code determines the contents of the processed frame.
+# Any edit to one of these invalidates every existing cache file.
+PROCESSING_SOURCES = [
+    "process_data.py",
+    "util/functions.py",
+    "util/near_duplicates.py",
+    "util/text_store.py",
+    "util/search_index.py",
+]
+
+
+def _hash_file(path, chunk_size=1 << 20):
+    """
+    Compute the sha256 hex digest of a file, reading it in chunks.
+
+    Arguments:
+        path (str or Path): The file to hash.
+        chunk_size (int): Number of bytes read per chunk.
+
+    Returns:
+        str: The hex digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def code_fingerprint():
+    """
+    Fingerprint of the processing code, used as the "version" of process_data.py in the cache key.
+
+    Returns:
+        str: The hex digest over the contents of all PROCESSING_SOURCES.
+    """
+    digest = hashlib.sha256()
+    for name in PROCESSING_SOURCES:
+        digest.update(name.encode())
+        digest.update(_hash_file(REPO_ROOT / name).encode())
+    return digest.hexdigest()
+
+
+def source_fingerprint(source_path, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Hash of the source JSON file.
+    Hashing a large dump on every start would defeat the point of the cache, so the digest is memoized in
+    `sources.json` next to the cache files together with the file size and modification time. The file is
+    only re-hashed when either of them changed.
+
+    Arguments:
+        source_path (str or Path): Path to the column-oriented JSON dump.
+        cache_dir (str or Path): Directory holding the cache files.
+
+    Returns:
+        str: The hex digest of the source file.
+    """
+    source_path = Path(source_path).resolve()
+    stat = source_path.stat()
+    memo_path = Path(cache_dir) / "sources.json"
+    try:
+        with open(memo_path, "r") as f:
+            memo = json.load(f)
+    except (OSError, ValueError):
+        memo = {}
+
+    entry = memo.get(str(source_path))
+    if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        return entry["sha256"]
+
+    digest = _hash_file(source_path)
+    memo[str(source_path)] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    _write_atomic(memo_path, json.dumps(memo, indent=2).encode())
+    return digest
+
+
+def cache_key(source_path, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Key identifying the processed frame for a source file and the current processing code.
+
+    Arguments:
+        source_path (str or Path): Path to the column-oriented JSON dump.
+        cache_dir (str or Path): Directory holding the cache files.
+
+    Returns:
+        str: A short hex key.
+    """
+    digest = hashlib.sha256()
+    digest.update(source_fingerprint(source_path, cache_dir).encode())
+    digest.update(code_fingerprint().encode())
+    return digest.hexdigest()[:20]
+
+
+def cache_path(source_path, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Returns:
+        Path: The Parquet file the processed frame for `source_path` is (or would be) stored in.
+    """
+    return Path(cache_dir) / f"processed-{cache_key(source_path, cache_dir)}.parquet"
+
+
+def text_store_path(parquet_path):
+    """
+    Returns:
+        Path: The text store belonging to a processed-data Parquet file.
+    """
+    parquet_path = Path(parquet_path)
+    return parquet_path.with_name(parquet_path.name.replace("processed-", "texts-").replace(".parquet", ".sqlite"))
+
+
+def search_index_path(parquet_path):
+    """
+    Returns:
+        Path: The keyword search index belonging to a processed-data Parquet file.
+    """
+    parquet_path = Path(parquet_path)
+    return parquet_path.with_name(parquet_path.name.replace("processed-", "search-").replace(".parquet", ".npz"))
+
+
+def signatures_path(parquet_path):
+    """
+    Returns:
+        Path: The MinHash signatures belonging to a processed-data Parquet file.
+    """
+    parquet_path = Path(parquet_path)
+    return parquet_path.with_name(parquet_path.name.replace("processed-", "minhash-").replace(".parquet", ".npz"))
+
+
+def _snapshot_path(parquet_path, segments):
+    """
+    Returns:
+        Path: The Parquet file of the processed data in `parquet_path` with `segments` (manifest entries) merged.
+    """
+    parquet_path = Path(parquet_path)
+    _, key, *merged = parquet_path.stem.split("-")
+    chain = merged[0] if merged else key
+    for segment in segments:
+        chain = hashlib.sha256(f"{chain}/{segment['name']}".encode()).hexdigest()[:20]
+    return parquet_path.with_name(f"processed-{key}-{chain}.parquet") if segments else parquet_path
+
+
+def _dump_path(parquet_path):
+    """
+    Returns:
+        Path: The processed dump a snapshot was merged onto (the snapshot itself if nothing was merged).
+    """
+    parquet_path = Path(parquet_path)
+    return parquet_path.with_name("-".join(parquet_path.stem.split("-")[:2]) + ".parquet")
+
+
+def _write_atomic(path, payload):
+    """
+    Write bytes to `path` through a temporary file so concurrent readers never see a partial file.
+    """
+    tmp_path = Path(f"{path}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def _parquet_safe(data):
+    """
+    Make object columns storable in Parquet.
+    Columns such as 'y_pred' can hold a mix of strings and lists depending on the export; those values are
+    stored as their string representation, which process_data_json reads back the same way.
+
+    Arguments:
+        data (pd.DataFrame): The processed frame.
+
+    Returns:
+        pd.DataFrame: The frame with mixed-type object columns converted to strings.
+    """
+    import pyarrow as pa
+
+    data = data.copy(deep=False)
+    for col in data.columns[data.dtypes == object]:
+        try:
+            pa.array(data[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            data[col] = data[col].map(lambda v: v if v is None or isinstance(v, str) else str(v))
+    return data
+
+
+def _prune_cache(cache_dir, keep, max_files=3):
+    """
+    Remove old processed-data cache files (and their text stores, search indexes and signatures), keeping `keep` and
+    the most recent others up to `max_files` in total. Files still open in another worker stay readable until that
+    worker closes them.
+    """
+    files = sorted(Path(cache_dir).glob("processed-*.parquet"), key=lambda p: p.stat().st_mtime, reverse=True)
+    others = [p for p in files if p != keep]
+    # Merged snapshots read the text store of the dump they were merged onto
+    needed = {text_store_path(_dump_path(p)) for p in [keep] + others[:max_files - 1]}
+    for path in others[max_files - 1:]:
+        for stale in (path, text_store_path(path), search_index_path(path), signatures_path(path)):
+            if stale in needed:
+                continue
+            try:
+                stale.unlink()
+            except OSError:
+                pass
+
+
+def build_cache(source_path, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Process the source JSON dump and write the processed frame, its text store and its search index to the cache.
+
+    Arguments:
+        source_path (str or Path): Path to the column-oriented JSON dump.
+        cache_dir (str or Path): Directory holding the cache files.
+
+    Returns:
+        Dataset: The processed frame (without the TEXT_COLUMNS), its text store and its search index.
+    """
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    target = cache_path(source_path, cache_dir)
+
+    started = time.perf_counter()
+    with open(source_path, "r") as f:
+        data = process_data_json(json.load(f))
+
+    # The text store and search index are written first: a Parquet file without them is never visible
+    write_text_store(data, text_store_path(target))
+    data = data.drop(columns=TEXT_COLUMNS, errors="ignore")
+    search_index = SearchIndex(data)
+    index_tmp_path = Path(f"{search_index_path(target)}.{os.getpid()}.tmp")
+    search_index.save(index_tmp_path)
+    os.replace(index_tmp_path, search_index_path(target))
+    tmp_path = Path(f"{target}.{os.getpid()}.tmp")
+    _parquet_safe(data).to_parquet(tmp_path)
+    os.replace(tmp_path, target)
+    _prune_cache(cache_dir, keep=target)
+    print(f"Wrote processed data cache {target} ({len(data)} posts, {time.perf_counter() - started:.1f}s)")
+    return Dataset(data, TextStore(text_store_path(target)), search_index, version=target.stem)
+
+
+def _signatures(parquet_path, data):
+    """
+    Returns:
+        tuple: minhash_signatures of the texts of `data`, the processed data in `parquet_path`, read from
+            signatures_path if stored and computed (and stored) otherwise.
+    """
+    path = signatures_path(parquet_path)
+    if path.exists():
+        with np.load(path) as arrays:
+            return arrays["signatures"], arrays["has_shingles"]
+    signatures = minhash_signatures(data["attributes.complete_post_text"])
+    tmp_path = Path(f"{path}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(f, signatures=signatures[0], has_shingles=signatures[1])
+    os.replace(tmp_path, path)
+    return signatures
+
+
+def _is_complete(parquet_path):
+    """
+    Returns:
+        bool: Whether all files of the processed data in `parquet_path` exist.
+    """
+    files = [parquet_path, search_index_path(parquet_path), text_store_path(parquet_path)]
+    if parquet_path != _dump_path(parquet_path):
+        files += [signatures_path(parquet_path), text_store_path(_dump_path(parquet_path))]
+    return all(path.exists() for path in files)
+
+
+def merge_segments(dataset, segments, entries, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Merge segments into a loaded dataset (see merge_posts) and store the result as a new snapshot.
+    Only the posts of the segments are processed, shingled and tokenized; the search index of `dataset` is
+    combined with one over the new posts. The filter index and analytics cube are rebuilt from the merged frame,
+    which are vectorized passes over its columns.
+
+    Arguments:
+        dataset (Dataset): Loaded by load_processed_data or merge_segments (its version names its snapshot).
+        segments (SegmentStore): The store of the segments.
+        entries (list): Manifest entries of the segments to merge (not yet in `dataset`), oldest first.
+        cache_dir (str or Path): Directory holding the cache files.
+
+    Returns:
+        Dataset: The merged dataset.
+    """
+    cache_dir = Path(cache_dir)
+    started = time.perf_counter()
+    source = cache_dir / f"{dataset.version}.parquet"
+    frames = [segments.read(entry) for entry in entries]
+
+    target = _snapshot_path(source, entries)
+
+    # The explanations of the merged segments' posts go to a text store of the snapshot (the newest segment of a
+    # post wins), which is read before that of the dump. It starts as a copy of the store of the snapshot merged
+    # onto, so a store is never written to once visible, while older datasets may still read it
+    text_path = text_store_path(target)
+    posts = pd.concat(frames, ignore_index=True)
+    versions = np.repeat([int(entry["name"].split("-")[0]) for entry in entries], [len(frame) for frame in frames])
+    tmp_path = Path(f"{text_path}.{os.getpid()}.tmp")
+    tmp_path.unlink(missing_ok=True)
+    if source != _dump_path(source):
+        if text_store_path(source).exists():
+            copy_text_store(text_store_path(source), tmp_path)
+        else:
+            # Pruned by another process: add the texts of the segments merged before again
+            manifest = segments.segments()
+            for entry in manifest[:manifest.index(entries[0])]:
+                upsert_texts(segments.read(entry), tmp_path, int(entry["name"].split("-")[0]))
+    upsert_texts(posts, tmp_path, versions)
+    os.replace(tmp_path, text_path)
+    posts = posts.drop(columns=TEXT_COLUMNS, errors="ignore")
+
+    data, signatures, positions = merge_posts(dataset.data, posts, _signatures(source, dataset.data))
+    added = np.setdiff1d(np.arange(len(data)), positions[positions >= 0])
+    search_index = SearchIndex.merged(data, [(dataset.search_index, positions), (SearchIndex(data.iloc[added]), added)])
+
+    # Text store, signatures and search index are written first: a snapshot without them is never visible
+    tmp_path = Path(f"{signatures_path(target)}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(f, signatures=signatures[0], has_shingles=signatures[1])
+    os.replace(tmp_path, signatures_path(target))
+    tmp_path = Path(f"{search_index_path(target)}.{os.getpid()}.tmp")
+    search_index.save(tmp_path)
+    os.replace(tmp_path, search_index_path(target))
+    tmp_path = Path(f"{target}.{os.getpid()}.tmp")
+    _parquet_safe(data).to_parquet(tmp_path)
+    os.replace(tmp_path, target)
+    _prune_cache(cache_dir, keep=target)
+    print(f"Merged {len(entries)} segments ({len(posts)} posts) into {target} ({len(data)} posts, "
+          f"{time.perf_counter() - started:.1f}s)")
+    text_store = TextStore(text_path, text_store_path(_dump_path(target)))
+    return Dataset(data, text_store, search_index, version=target.stem)
+
+
+def _read_snapshot(parquet_path):
+    """
+    Read stored processed data (a processed dump or a snapshot of it with segments merged).
+
+    Arguments:
+        parquet_path (Path): The Parquet file of the processed data.
+
+    Returns:
+        Dataset: The processed data, its text store and its search index.
+    """
+    data = pd.read_parquet(parquet_path)
+    search_index = SearchIndex.load(search_index_path(parquet_path), data)
+    text_store = TextStore(text_store_path(parquet_path))
+    if parquet_path != _dump_path(parquet_path):
+        text_store = TextStore(text_store_path(parquet_path), text_store_path(_dump_path(parquet_path)))
+    return Dataset(data, text_store, search_index, version=parquet_path.stem)
+
+
+def load_processed_data(source_path, cache_dir=DEFAULT_CACHE_DIR, segments=None, current=None):
+    """
+    Load the processed dataset, reading the cache when it is valid and rebuilding it otherwise.
+    With `segments`, the newest stored snapshot of the dump merged with the segments is read, and the segments
+    added since are merged onto it (see merge_segments).
+    With `current` (a dataset loaded before, e.g. by the dataset watcher of util/dataset_holder.py), nothing is read
+    when it is still the newest data, and the segments added since are merged onto it unless another process
+    already stored a newer snapshot.
+    One process at a time builds or merges (holding the flock of the cache directory's write.lock), so the workers
+    of a server do not all process the same segments and race on the same files. Without `current` (at start-up)
+    the others wait for it and then read what it stored; with `current` they do not wait, but serve the newest
+    snapshot stored so far (or `current`) and read the rest on a later call.
+
+    Arguments:
+        source_path (str or Path): Path to the column-oriented JSON dump.
+        cache_dir (str or Path): Directory holding the cache files.
+        segments (SegmentStore): Store of the posts ingested after the dump, or None.
+        current (Dataset): The dataset loaded before, or None.
+
+    Returns:
+        Dataset: The processed frame as returned by process_data_json (without the TEXT_COLUMNS, which are fetched
+            per post from the text store when rendering) and its search index.
+    """
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    entries = segments.segments() if segments is not None else []
+    snapshots = [cache_path(source_path, cache_dir)]
+    for entry in entries:
+        snapshots.append(_snapshot_path(snapshots[-1], [entry]))
+
+    versions = [snapshot.stem for snapshot in snapshots]
+    if current is not None and current.version == versions[-1]:
+        return current
+
+    def newest_stored():
+        return next((k for k in reversed(range(len(snapshots))) if _is_complete(snapshots[k])), None)
+
+    merged = newest_stored()
+    if merged == len(entries):
+        return _read_snapshot(snapshots[merged])
+    served = versions.index(current.version) if current is not None and current.version in versions else -1
+
+    with open(Path(cache_dir) / "write.lock", "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | (fcntl.LOCK_NB if current is not None else 0))
+        except BlockingIOError:
+            # Another process is building or merging
+            return _read_snapshot(snapshots[merged]) if merged is not None and merged > served else current
+        # It may have stored the newest data while this one waited for the lock
+        merged = newest_stored()
+        if served >= (merged if merged is not None else 0):
+            dataset, merged = current, served
+        elif merged is None:
+            dataset, merged = build_cache(source_path, cache_dir), 0
+        else:
+            dataset = _read_snapshot(snapshots[merged])
+        if merged < len(entries):
+            dataset = merge_segments(dataset, segments, entries[merged:], cache_dir)
+    return dataset
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the processed data cache for the dashboard.")
+    parser.add_argument("source_path", help="Path to the column-oriented JSON dump")
+    parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR), help="Directory holding the cache files")
+    parser.add_argument("--segments", help="Directory of ingested segments to merge (see util/segments.py)")
+    args = parser.parse_args()
+    Path(args.cache_dir).mkdir(parents=True, exist_ok=True)
+    # Waits for a dashboard process building or merging (see load_processed_data)
+    with open(Path(args.cache_dir) / "write.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        dataset = build_cache(args.source_path, args.cache_dir)
+        if args.segments:
+            store = SegmentStore(args.segments)
+            if store.segments():
+                merge_segments(dataset, store, store.segments(), args.cache_dir)
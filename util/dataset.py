@@ -0,0 +1,43 @@
+"""
+The loaded dataset: the processed post table together with the structures built from it once per load.
+"""
+from util.cube import AnalyticsCube
+from util.filter_index import FilterIndex
+from util.search_index import SearchIndex
+
+
+class Dataset:
+    """
+    Bundle of the processed posts and everything derived from them that the callbacks query.
+
+    Attributes:
+        data (pd.DataFrame): The processed posts, sorted by 'attributes.published_at' descending.
+        text_store (TextStore): Store of the explanation columns split off `data` (None if they are kept in `data`).
+        index (FilterIndex): Index over the filter dimensions of `data`.
+        search_index (SearchIndex): Inverted index for the keyword search over `data`.
+        cube (AnalyticsCube): Pre-aggregated post counts for the Analytics tab.
+        version (str): Identifies the loaded data (the processed-data cache key), or None if unknown.
+    """
+
+    def __init__(self, data, text_store=None, search_index=None, version=None):
+        self.data = data
+        self.version = version
+        self.text_store = text_store
+        self.index = FilterIndex(data)
+        self.search_index = search_index if search_index is not None else SearchIndex(data)
+        self.cube = AnalyticsCube(data, self.index)
+
+    def rows(self, positions):
+        """
+        Materialize a few posts (e.g. the current feed page), including their explanation texts.
+
+        Arguments:
+            positions (np.ndarray): Row positions into `data`.
+
+        Returns:
+            pd.DataFrame: The selected posts.
+        """
+        rows = self.data.iloc[positions]
+        if self.text_store is None:
+            return rows
+        return self.text_store.attach(rows)
@@ -0,0 +1,176 @@
+"""
+Holder of the dataset the callbacks serve, swapped atomically when new data is published.
+The dataset used to be loaded once at import time and closed over by the callbacks, so publishing posts
+(add_data.py, see util/segments.py) meant restarting every worker. Instead, the callbacks read the current
+generation from a DatasetHolder once per request: the dataset together with everything built for it (caches,
+layout), published by a single assignment. A background watcher polls for new processed data, loads or merges it,
+prepares the new generation off the request path (indexes, caches, warmed figures) and then swaps it in. Requests
+already running keep the generation they started with, and its caches are dropped with it once they finish.
+Threads do not survive a fork, so the watcher is started by the first read of the dataset in each process rather
+than at import: the workers of a pre-forking server (gunicorn --preload) each start their own, and processes that
+never serve a request (the preloading master, the parent of Flask's debug reloader) start none. The watchers of the
+workers do not each merge new segments: util.data_cache.load_processed_data lets one process at a time write the
+merged snapshot, and the others keep their generation until a later poll finds the snapshot stored and reads it.
+
+Set DATASET_RELOAD_INTERVAL (seconds, default 60; 0 disables the watcher) to control how often it polls.
+"""
+import os
+import threading
+import time
+
+# Seconds between two polls of the watcher for new processed data
+RELOAD_INTERVAL = float(os.environ.get("DATASET_RELOAD_INTERVAL", 60))
+
+
+class Generation:
+    """
+    A dataset and the per-dataset state built for it by the holder's preparers, published together.
+
+    Attributes:
+        dataset (Dataset): The loaded dataset.
+        state (dict): What each preparer built for `dataset`, by preparer name.
+        loaded_at (float): Time the generation was published.
+    """
+
+    def __init__(self, dataset, state):
+        self.dataset = dataset
+        self.state = state
+        self.loaded_at = time.time()
+
+    def __getitem__(self, name):
+        return self.state[name]
+
+
+class DatasetHolder:
+    """
+    Serves the current Generation and replaces it when `load` returns a new dataset (see the module docstring).
+    """
+
+    def __init__(self, dataset, load=None):
+        """
+        Arguments:
+            dataset (Dataset): The initially loaded dataset.
+            load (callable): Takes the current dataset and returns the dataset to serve, which is the current one
+                when nothing changed (e.g. a partial of util.data_cache.load_processed_data). None disables reloads.
+        """
+        self.load = load
+        self._preparers = {}
+        self._generation = Generation(dataset, {})
+        # Serializes swaps and preparer registration; readers never take it
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._watcher_pid = None
+        self._watcher_lock = threading.Lock()
+        self.interval = None
+        self.swaps = 0
+        self.failures = 0
+
+    @property
+    def current(self):
+        """
+        Returns:
+            Generation: The generation to serve a request from. Read it once per request.
+        """
+        self._ensure_watcher()
+        return self._generation
+
+    @property
+    def dataset(self):
+        """
+        Returns:
+            Dataset: The dataset of the current generation.
+        """
+        self._ensure_watcher()
+        return self._generation.dataset
+
+    def register(self, name, prepare):
+        """
+        Build per-dataset state with `prepare` for the current dataset and for every dataset swapped in later,
+        before it is served. Preparers run in the order they were registered.
+
+        Arguments:
+            name (str): Key of the state in Generation.state.
+            prepare (callable): Takes a Dataset and returns its state (e.g. caches keyed by its filters).
+        """
+        with self._lock:
+            self._preparers[name] = prepare
+            generation = self._generation
+            state = dict(generation.state, **{name: prepare(generation.dataset)})
+            self._generation = Generation(generation.dataset, state)
+
+    def swap(self, dataset):
+        """
+        Prepare the state of `dataset` and then serve it, replacing the current generation in one assignment.
+
+        Arguments:
+            dataset (Dataset): The dataset to serve.
+        """
+        with self._lock:
+            started = time.perf_counter()
+            state = {name: prepare(dataset) for name, prepare in self._preparers.items()}
+            previous = self._generation.dataset.version
+            self._generation = Generation(dataset, state)
+            self.swaps += 1
+        print(f"Swapped dataset {previous} for {dataset.version} ({len(dataset.data)} posts, "
+              f"prepared in {time.perf_counter() - started:.1f}s)")
+
+    def refresh(self):
+        """
+        Load the newest data and swap it in if it differs from the current dataset.
+
+        Returns:
+            bool: Whether a new dataset was swapped in.
+        """
+        current = self.dataset
+        dataset = self.load(current)
+        if dataset is current or dataset.version == current.version:
+            return False
+        self.swap(dataset)
+        return True
+
+    def watch(self, interval=RELOAD_INTERVAL):
+        """
+        Call refresh every `interval` seconds from a daemon thread of each process reading the dataset, started on
+        its first read (no-op if `interval` is 0 or there is no `load`).
+        """
+        if interval and self.load is not None:
+            self.interval = interval
+
+    def _ensure_watcher(self):
+        # Checked without the lock on every read; only the first read in a process takes it
+        if self.interval is None or self._watcher_pid == os.getpid():
+            return
+        with self._watcher_lock:
+            if self._watcher_pid == os.getpid():
+                return
+            interval = self.interval
+
+            def poll():
+                while True:
+                    time.sleep(interval)
+                    try:
+                        self.refresh()
+                    except Exception as e:
+                        # Keep serving the current dataset; the next poll tries again
+                        self.failures += 1
+                        print(f"Could not reload the dataset: {e!r}")
+
+            self._watcher = threading.Thread(target=poll, name="dataset-watcher", daemon=True)
+            self._watcher.start()
+            self._watcher_pid = os.getpid()
+
+    def stats(self):
+        """
+        Returns:
+            dict: The served dataset version and size and the swap/failure counters (for /cache_stats).
+        """
+        generation = self._generation
+        return {
+            "version": generation.dataset.version,
+            "posts": len(generation.dataset.data),
+            "loaded_at": generation.loaded_at,
+            "swaps": self.swaps,
+            "failures": self.failures,
+            "interval": self.interval,
+            "watching": self._watcher_pid == os.getpid(),
+        }
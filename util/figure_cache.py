@@ -0,0 +1,131 @@
+"""
+Cache of serialized Plotly figures for the Analytics tab.
+Building a figure through plotly.express / make_subplots costs far more than the roll-up it plots, so each figure
+is stored as its JSON payload, keyed by the figure name and the normalized filter state. A hit is returned as the
+parsed payload without creating any graph objects. Payloads are kept in an in-memory LRU and, optionally, in a
+directory shared by all workers on the host, so a figure built by one worker is reused by the others.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import plotly.io as pio
+
+from util.cache import LRUCache
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Files whose contents determine the figures besides the data: a change to any of them starts a new namespace on disk
+FIGURE_SOURCES = [
+    "util/cube.py",
+    "util/plot_overview.py",
+    "util/plot_greenwashing_score.py",
+    "util/plot_green_share.py",
+    "data/codebook.json",
+    "data/low_carbon_ratios.csv",
+]
+
+
+def figure_namespace(dataset_version):
+    """
+    Name of the on-disk namespace for the figures of a dataset version and the current plotting code.
+
+    Arguments:
+        dataset_version (str): Identifies the loaded data (e.g. the processed-data cache key).
+
+    Returns:
+        str: A short hex digest.
+    """
+    digest = hashlib.sha256(str(dataset_version).encode())
+    for name in FIGURE_SOURCES:
+        path = REPO_ROOT / name
+        digest.update(name.encode())
+        digest.update(path.read_bytes() if path.exists() else b"")
+    return digest.hexdigest()[:20]
+
+
+class FigureCache(LRUCache):
+    """
+    LRU cache of figure JSON payloads with an optional shared directory behind it.
+    The memory bound covers the payload strings; the directory is not bounded, but only ever holds one file per
+    distinct filter combination and figure, in a namespace per dataset version and plotting code.
+    """
+
+    def __init__(self, name, max_bytes, directory=None, dataset_version=None):
+        """
+        Arguments:
+            name (str): Name of the cache in cache_stats.
+            max_bytes (int): Memory bound of the payloads.
+            directory (str or Path): Directory shared by the workers, or None to only cache in memory.
+            dataset_version (str): Identifies the loaded data; required for the directory to be used.
+        """
+        super().__init__(name, max_bytes)
+        self.directory = None
+        if directory and dataset_version is not None:
+            self.directory = Path(directory) / figure_namespace(dataset_version)
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self.disk_hits = 0
+        self.disk_writes = 0
+
+    def _path(self, key):
+        return self.directory / f"{hashlib.sha256(repr(key).encode()).hexdigest()}.json"
+
+    def _read(self, key):
+        try:
+            payload = self._path(key).read_text()
+        except OSError:
+            return None
+        self.disk_hits += 1
+        return payload
+
+    def _write(self, key, payload):
+        path = self._path(key)
+        tmp_path = Path(f"{path}.{os.getpid()}.tmp")
+        try:
+            tmp_path.write_text(payload)
+            os.replace(tmp_path, path)
+            self.disk_writes += 1
+        except OSError as e:
+            print(f"Could not write figure cache file {path}: {e}")
+
+    def payload(self, key, build):
+        """
+        Get the JSON payload of a figure, building and storing it on a miss.
+
+        Arguments:
+            key (tuple): Hashable key with a stable repr (figure name and normalized filter state).
+            build (callable): Returns the plotly Figure on a miss.
+
+        Returns:
+            str: The figure JSON.
+        """
+        payload = self.get(key)
+        if payload is not None:
+            return payload
+        payload = self._read(key) if self.directory else None
+        if payload is None:
+            payload = pio.to_json(build(), validate=False)
+            if self.directory:
+                self._write(key, payload)
+        self.put(key, payload)
+        return payload
+
+    def figure(self, key, build):
+        """
+        Get a figure as the dict Dash sends to the browser, building it only on a miss.
+
+        Arguments:
+            key (tuple): Hashable key with a stable repr (figure name and normalized filter state).
+            build (callable): Returns the plotly Figure on a miss.
+
+        Returns:
+            dict: The figure's 'data' and 'layout'.
+        """
+        return json.loads(self.payload(key, build))
+
+    def stats(self):
+        stats = super().stats()
+        stats.update(disk_hits=self.disk_hits, disk_writes=self.disk_writes,
+                     directory=str(self.directory) if self.directory else None)
+        return stats
@@ -0,0 +1,183 @@
+"""
+Precomputed index over the filter dimensions of the post table.
+The Post Feed and Analytics filters (date range, company, channel, platform, classification and the subcategory
+flags) are resolved against arrays built once per dataset load, so a filter combination costs a few vectorized
+passes over small integer/bool arrays and never copies or rescans the DataFrame.
+"""
+import numpy as np
+import pandas as pd
+
+DATE_COLUMN = "attributes.published_at"
+
+# Filter dimension -> column of the processed frame
+DIMENSIONS = {
+    "company": "company",
+    "channel": "attributes.search_data_fields.channel_data.channel_name",
+    "platform": "attributes.search_data_fields.platform_name",
+    "green_brown": "green_brown",
+}
+
+
+class FilterIndex:
+    """
+    Per-dimension category codes plus one boolean bitmap per classification flag.
+
+    A set of selected values is turned into a bitmap with a single lookup-table gather over the dimension's codes.
+    This is equivalent to OR-ing one bitmap per selected value, but costs the same whether one or all of several
+    hundred channels are selected and needs one or two bytes per post per dimension instead of one per value.
+
+    The posts are sorted by publication date (newest first, as process_data_json leaves them), so a date range is
+    a contiguous block of rows found by binary search over the sorted timestamps; the other filters then only
+    look at that block.
+    """
+
+    def __init__(self, data):
+        self.size = len(data)
+        self._dates_ascending, self._n_dated = _sorted_dates(data[DATE_COLUMN])
+        self._codes = {}
+        self._categories = {}
+        for name, col in DIMENSIONS.items():
+            values = data[col]
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype("category")
+            self._codes[name] = values.cat.codes.to_numpy()
+            self._categories[name] = values.cat.categories
+        self._flags = {
+            col: data[col].to_numpy() for col in data.columns if data[col].dtype == bool
+        }
+
+    def codes(self, name):
+        """
+        Returns:
+            np.ndarray: The category code of every post for dimension `name` (-1 for missing values).
+        """
+        return self._codes[name]
+
+    def categories(self, name):
+        """
+        Returns:
+            pd.Index: The values of dimension `name`, in code order.
+        """
+        return self._categories[name]
+
+    def date_window(self, start_date, end_date):
+        """
+        Find the posts published between `start_date` and `end_date` (both inclusive, compared as timestamps, so a
+        'YYYY-MM-DD' end date means midnight at the start of that day).
+
+        Arguments:
+            start_date (str or pd.Timestamp): Start of the range.
+            end_date (str or pd.Timestamp): End of the range.
+
+        Returns:
+            slice: The block of row positions holding those posts.
+        """
+        start = np.searchsorted(self._dates_ascending, pd.Timestamp(start_date).value, side="left")
+        end = np.searchsorted(self._dates_ascending, pd.Timestamp(end_date).value, side="right")
+        # Row positions run newest first, the ascending search array oldest first
+        return slice(self._n_dated - max(end, start), self._n_dated - start)
+
+    def value_mask(self, name, values, rows=None):
+        """
+        Bitmap of the posts whose value for dimension `name` is one of `values` (like Series.isin).
+
+        Arguments:
+            name (str): A key of DIMENSIONS.
+            values (list): The selected values.
+            rows (np.ndarray or slice): Optional row positions to restrict the result to.
+
+        Returns:
+            np.ndarray: A bool array over all posts, or over `rows` if given.
+        """
+        codes = self._codes[name] if rows is None else self._codes[name][rows]
+        return self.value_lookup(name, values)[codes]
+
+    def value_lookup(self, name, values):
+        """
+        Lookup table from the category codes of dimension `name` to whether the value is one of `values`.
+
+        Returns:
+            np.ndarray: A bool array indexed by code; the extra last slot is what missing values (code -1) look up,
+                and it is never selected.
+        """
+        categories = self._categories[name]
+        lookup = np.zeros(len(categories) + 1, dtype=bool)
+        positions = categories.get_indexer(list(values))
+        lookup[positions[positions >= 0]] = True
+        return lookup
+
+    @property
+    def flag_columns(self):
+        """
+        Returns:
+            list: The boolean classification columns that can be used as flags.
+        """
+        return list(self._flags)
+
+    def flag(self, column, rows=None):
+        """
+        Returns:
+            np.ndarray: The bitmap of a boolean classification column, over all posts or over `rows` if given.
+        """
+        bitmap = self._flags[column]
+        return bitmap if rows is None else bitmap[rows]
+
+    def select(self, companies=None, channels=None, platforms=None, classifications=None, flags=(),
+               start_date=None, end_date=None, rows=None):
+        """
+        Resolve a combination of filters into row positions.
+        Empty or None selections do not filter, matching the `if companies:` checks of the callbacks; the date range
+        only applies when both ends are given.
+
+        Arguments:
+            companies (list): Selected companies.
+            channels (list): Selected channels.
+            platforms (list): Selected platforms.
+            classifications (list): Selected 'green_brown' labels.
+            flags (iterable): Classification columns that must be set.
+            start_date (str): Start of the publication date range.
+            end_date (str): End of the publication date range.
+            rows (np.ndarray): Optional ascending row positions to restrict the selection to.
+
+        Returns:
+            np.ndarray: Ascending row positions of the matching posts (i.e. in the frame's order).
+        """
+        window = self.date_window(start_date, end_date) if start_date and end_date else slice(0, self.size)
+        if rows is None:
+            subset = window
+            mask = np.ones(window.stop - window.start, dtype=bool)
+        else:
+            subset = rows[np.searchsorted(rows, window.start):np.searchsorted(rows, window.stop)]
+            mask = np.ones(len(subset), dtype=bool)
+
+        for name, values in (
+            ("company", companies),
+            ("channel", channels),
+            ("platform", platforms),
+            ("green_brown", classifications),
+        ):
+            if values:
+                mask &= self.value_mask(name, values, subset)
+        for column in flags:
+            mask &= self.flag(column, subset)
+        return window.start + np.flatnonzero(mask) if rows is None else subset[mask]
+
+
+def _sorted_dates(published_at):
+    """
+    Prepare the publication dates for binary search.
+
+    Arguments:
+        published_at (pd.Series): Publication dates of the posts, newest first with missing dates last.
+
+    Returns:
+        dates_ascending (np.ndarray): int64 nanosecond timestamps of the dated posts, oldest first.
+        n_dated (int): Number of posts with a date (they occupy the first n_dated rows).
+    """
+    dates = published_at.to_numpy(dtype="datetime64[ns]")
+    dated = ~np.isnat(dates)
+    n_dated = int(dated.sum())
+    dates_ascending = dates[:n_dated][::-1].view("int64")
+    if not dated[:n_dated].all() or np.any(np.diff(dates_ascending) < 0):
+        raise ValueError(f"FilterIndex expects the posts sorted by '{DATE_COLUMN}' descending")
+    return np.ascontiguousarray(dates_ascending), n_dated
@@ -1,3 +1,78 @@
+import numpy as np
+import pandas as pd
+
+# Final post labels, in the order used for the categorical "green_brown" column
+GREEN_BROWN_LABELS = ["green", "brown", "green_brown", "misc"]
+
+
+def label_green_brown(green, fossil_fuel):
+    """
+    Compute the final label of each post from its "green" and "fossil_fuel" classification flags.
+        "green" for green posts
+        "brown" for fossil fuel posts
+        "green_brown" for posts that are both green and fossil fuel
+        "misc" for posts that are neither green nor fossil fuel
+
+    Arguments:
+        green (array-like): The "green" flag of each post.
+        fossil_fuel (array-like): The "fossil_fuel" flag of each post.
+
+    Returns:
+        pd.Categorical: The label of each post, with categories GREEN_BROWN_LABELS.
+    """
+    green = np.asarray(green).astype(bool)
+    fossil_fuel = np.asarray(fossil_fuel).astype(bool)
+    codes = np.select(
+        [green & fossil_fuel, green, fossil_fuel],
+        [GREEN_BROWN_LABELS.index("green_brown"), GREEN_BROWN_LABELS.index("green"), GREEN_BROWN_LABELS.index("brown")],
+        default=GREEN_BROWN_LABELS.index("misc")
+    )
+    return pd.Categorical.from_codes(codes, categories=GREEN_BROWN_LABELS)
+
+
+# URLs are replaced by this placeholder before texts are compared for duplicates
+URL_PATTERN = r'http\S+|www\S+'
+
+
+def text_hashes(texts):
+    """
+    Returns:
+        np.ndarray: The 64-bit hash of each text once URLs are replaced with [URL] (see duplicate_groups).
+    """
+    normalized = texts.str.replace(URL_PATTERN, '[URL]', regex=True)
+    return pd.util.hash_pandas_object(normalized, index=False).to_numpy()
+
+
+def duplicate_groups(texts, text_hash=None):
+    """
+    Group posts whose text is identical once URLs are replaced with [URL] (the same comparison as url_deduplicate).
+    The first post of each group, in the order of `texts`, is its representative; keeping only the representatives
+    gives the same posts as url_deduplicate(df, content_column).
+
+    Arguments:
+        texts (pd.Series): The post texts, in the final order of the processed frame.
+        text_hash (np.ndarray): text_hashes(texts) if already known (e.g. kept from an earlier run).
+
+    Returns:
+        pd.DataFrame: With the same index as `texts` and the columns
+            - 'text_hash': 64-bit hash of the URL-normalized text
+            - 'dup_group_id': id of the duplicate group (numbered in order of first appearance)
+            - 'dup_group_size': number of posts in the group
+            - 'is_unique_representative': True for the first post of each group
+    """
+    if text_hash is None:
+        text_hash = text_hashes(texts)
+    group_id, _ = pd.factorize(text_hash)
+    representative = np.zeros(len(group_id), dtype=bool)
+    representative[np.unique(group_id, return_index=True)[1]] = True
+    return pd.DataFrame({
+        'text_hash': text_hash,
+        'dup_group_id': group_id.astype(np.int32),
+        'dup_group_size': np.bincount(group_id)[group_id].astype(np.int32),
+        'is_unique_representative': representative,
+    }, index=texts.index)
+
+
 def url_deduplicate(df, content_column):
     """
     Replace URLs in the content column with [URL] and remove duplicate entries based on the cleaned text.
@@ -10,5 +85,5 @@ def url_deduplicate(df, content_column):
         pd.DataFrame: A DataFrame with a new 'content_wo_url' column and duplicates removed based on it.
     """
     df = df.copy()
-    df['content_wo_url'] = df[content_column].str.replace(r'http\S+|www\S+', '[URL]', regex=True)
+    df['content_wo_url'] = df[content_column].str.replace(URL_PATTERN, '[URL]', regex=True)
     return df.drop_duplicates(subset='content_wo_url', keep='first')
\ No newline at end of file
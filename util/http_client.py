@@ -0,0 +1,122 @@
+"""
+Shared HTTP client for upstream requests (the Junkipedia proxy in app.py and the resource proxy in app_2.py).
+All requests of a process go through one requests.Session, so connections to the upstream are kept alive and reused
+from a bounded pool instead of paying a TCP and TLS handshake per request. Every request has connect and read
+timeouts, 429 and 5xx responses and connection errors are retried with exponential backoff (honouring Retry-After),
+and a process-wide semaphore caps the number of upstream requests in flight, so a burst of iframe loads cannot tie
+up every worker thread waiting on the upstream.
+
+The client is configured with environment variables (see http_client_from_env):
+    UPSTREAM_POOL_SIZE         kept-alive connections per host (default 20)
+    UPSTREAM_CONNECT_TIMEOUT   seconds to establish a connection (default 3.05)
+    UPSTREAM_READ_TIMEOUT      seconds to wait for response data (default 10)
+    UPSTREAM_RETRIES           retries of a failed request (default 2)
+    UPSTREAM_BACKOFF           backoff factor of the retries in seconds (default 0.5)
+    UPSTREAM_MAX_CONCURRENCY   upstream requests in flight per process (default 16)
+    UPSTREAM_QUEUE_TIMEOUT     seconds a request waits for a free slot before failing (default 5)
+"""
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class UpstreamBusy(RuntimeError):
+    """
+    Raised when no upstream request slot becomes free within the queue timeout.
+    """
+
+
+class HTTPClient:
+    """
+    Pooled, retrying, concurrency-limited HTTP client. Safe to share between threads; a forked process opens its own
+    session on first use.
+    """
+
+    def __init__(self, pool_size=20, connect_timeout=3.05, read_timeout=10, retries=2, backoff=0.5,
+                 max_concurrency=16, queue_timeout=5):
+        """
+        Arguments:
+            pool_size (int): Kept-alive connections per host.
+            connect_timeout (float): Seconds to establish a connection.
+            read_timeout (float): Seconds to wait for response data.
+            retries (int): Retries of a request failing to connect or answered with one of RETRY_STATUSES.
+            backoff (float): Backoff factor of the retries (waits backoff, 2 * backoff, ... seconds).
+            max_concurrency (int): Upstream requests in flight at once.
+            queue_timeout (float): Seconds a request waits for a free slot before raising UpstreamBusy.
+        """
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.retry = Retry(
+            total=retries, connect=retries, read=retries, status=retries, backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES, allowed_methods=frozenset(["GET", "HEAD"]),
+            respect_retry_after_header=True, raise_on_status=False,
+        )
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._session = None
+        self._session_pid = None
+        self._lock = threading.Lock()
+
+    def session(self):
+        """
+        Returns:
+            requests.Session: The pooled session of this process.
+        """
+        with self._lock:
+            if self._session is None or self._session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size,
+                                      max_retries=self.retry)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+                self._session_pid = os.getpid()
+            return self._session
+
+    def get(self, url, **kwargs):
+        """
+        GET `url` once a request slot is free (retrying as configured); keyword arguments go to Session.get.
+
+        Returns:
+            requests.Response: The response (with the body read, so the slot is released afterwards).
+
+        Raises:
+            UpstreamBusy: If no slot became free within `queue_timeout`.
+            requests.RequestException: If the request failed after all retries.
+        """
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise UpstreamBusy(f"More than {self.max_concurrency} upstream requests in flight")
+        try:
+            kwargs.setdefault("timeout", self.timeout)
+            response = self.session().get(url, **kwargs)
+            response.content  # read the body while holding the slot
+            return response
+        finally:
+            self._slots.release()
+
+
+def http_client_from_env():
+    """
+    Returns:
+        HTTPClient: A client configured by the UPSTREAM_* environment variables.
+    """
+    env = os.environ.get
+    return HTTPClient(
+        pool_size=int(env("UPSTREAM_POOL_SIZE", 20)),
+        connect_timeout=float(env("UPSTREAM_CONNECT_TIMEOUT", 3.05)),
+        read_timeout=float(env("UPSTREAM_READ_TIMEOUT", 10)),
+        retries=int(env("UPSTREAM_RETRIES", 2)),
+        backoff=float(env("UPSTREAM_BACKOFF", 0.5)),
+        max_concurrency=int(env("UPSTREAM_MAX_CONCURRENCY", 16)),
+        queue_timeout=float(env("UPSTREAM_QUEUE_TIMEOUT", 5)),
+    )
+
+
+# Client shared by all upstream requests of the process
+client = http_client_from_env()
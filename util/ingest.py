@@ -0,0 +1,432 @@
+"""
+Concurrent, resumable ingestion of posts from the Junkipedia API (used by add_data.py).
+Posts are fetched by a thread pool over one pooled HTTP client (util/http_client.py). A token bucket keeps the
+request rate under the API's limit, 429/5xx responses and connection errors are retried with exponential backoff
+(honouring Retry-After), and every fetched post is appended to a JSON-lines checkpoint file as soon as it arrives,
+so an interrupted run picks up where it stopped instead of fetching everything again.
+Request overhead rather than payload bounds the throughput, so uids can be looked up several per query (falling
+back to one per query when the API does not support it); connections are kept alive between requests either way.
+Each batch of uids is reported with its posts per second, request error rate and p95 request latency.
+tests/test_ingest.py tests the retries, the rate limit and the resumption against a local stand-in API.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import requests
+
+from process_data import FLAG_FIELDS
+from util.channel_mapping import parse_channel
+from util.http_client import RETRY_STATUSES, HTTPClient
+
+API_BASE = os.environ.get("JUNKIPEDIA_API_BASE", "https://www.junkipedia.org/api/v1")
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, at most `capacity` saved up for bursts.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take a token, waiting until one is available.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def parse_post(uid, post):
+    """
+    Flatten a post of the API's response into the columns added to the labels.
+
+    Arguments:
+        uid (str): The post uid.
+        post (dict): An element of the response's "data", or None if the post was not found.
+
+    Returns:
+        dict: The record ({"uid": uid} only if the post was not found).
+    """
+    if not post:
+        return {"uid": uid}
+    attributes = post.get("attributes", {})
+    search_data = attributes.get("search_data_fields", {})
+    channel = attributes.get("channel", {})
+
+    # Extract format: if post_type is a list, grab the first element
+    post_type = search_data.get("post_type")
+    if isinstance(post_type, list):
+        post_format = post_type[0] if post_type else None
+    else:
+        post_format = post_type
+
+    return {
+        "uid": uid,
+        "url": search_data.get("url"),
+        "junkipedia_url": search_data.get("post_link"),  # renamed field
+        "format": post_format,
+        "platform": search_data.get("platform_name"),
+        "title": search_data.get("post_title"),
+        "content": search_data.get("description"),
+        "media": attributes.get("thumbnail_url") or attributes.get("ad_screenshot"),
+        "published_at": search_data.get("published_at"),
+        "created_at": attributes.get("created_at"),
+        "engagement": search_data.get("engagement"),
+        "likes_count": attributes.get("engagement_fields", {}).get("likes_count"),
+        "comments_count": attributes.get("engagement_fields", {}).get("comments_count"),
+        "channel_name": search_data.get("channel_name") or channel.get("channel_name"),
+        "handle": attributes.get("handle") or channel.get("handle"),
+        "channel_url": channel.get("link"),
+        "profile_image": search_data.get("channel_data", {}).get("channel_profile_image"),
+        "bio": channel.get("bio"),
+        "transcript_text": search_data.get("transcript_text"),
+        "channel_uid": channel.get("channel_uid")
+    }
+
+
+# Columns of the labels CSV (see add_data.py) and the y_pred flag (process_data.FLAG_FIELDS) each one sets. The
+# flags are the subcategory ids of data/codebook.json, except infrastructure_production (codebook id
+# infrastructure_and_production). Several columns setting one flag are or-ed.
+LABEL_FLAGS = {
+    # Fossil Fuel (Primary Label)
+    "brown": "fossil_fuel",
+    # Fossil Fuel (Sub-Label) 1 - Primary Product
+    "primary_product": "primary_product",
+    # Fossil Fuel (Sub-Label) 2 - Petrochemical Product
+    "petrochemical_product": "petrochemical_product",
+    # Fossil Fuel (Sub-Label) 3 - Infrastructure & Production
+    "ff_infrastructure_OR_production": "infrastructure_production",
+    # Green (Primary Label), labeled both as the green message and as the final green/brown label
+    "green_message": "green",
+    "green": "green",
+    # Green (Sub-Label) 1 - Decreasing Emissions ("reduce the carbon footprint", net-zero, lower carbon intensity)
+    "emissions_reduction": "decreasing_emissions",
+    # Green (Sub-Label) 2 - Viable Solutions (renewable energy and other low-carbon technology)
+    "renewable_energy": "viable_solutions",
+    # Green (Sub-Label) 3 - False Solutions
+    "false_solutions": "false_solutions",
+    # Green (Sub-Label) 4 - Recycling & Waste Management
+    "recycling": "recycling_waste_management",
+    # Green (Sub-Label) 5 and 6 have no column in the labels CSV of add_data.py; labels that have them name the
+    # columns after the flag, and otherwise the flags stay 0 (labeled_posts reports it)
+    "nature_animal_references": "nature_animal_references",
+    "generic_environmental_references": "generic_environmental_references",
+}
+FOSSIL_SUBCATEGORIES = ["primary_product", "petrochemical_product", "infrastructure_production"]
+GREEN_SUBCATEGORIES = ["decreasing_emissions", "viable_solutions", "false_solutions", "recycling_waste_management",
+                       "nature_animal_references", "generic_environmental_references"]
+
+
+def _uid_string(uid):
+    """
+    Returns:
+        str: A uid as stored in the channel mapping, None if missing. The merge with the fetched records leaves
+            the uids of a column with missing values as floats, which are written without the ".0".
+    """
+    if pd.isna(uid):
+        return None
+    if isinstance(uid, float) and uid.is_integer():
+        return str(int(uid))
+    return str(uid).strip()
+
+
+def labeled_posts(labeled, channel_mapping):
+    """
+    Convert labeled, fetched posts to the source columns of the dashboard (process_data.SOURCE_COLUMNS), as stored
+    in util.segments.
+
+    Arguments:
+        labeled (pd.DataFrame): The labels CSV merged with the records of Ingestor.run.
+        channel_mapping (ChannelMapping): The channel -> entity mapping (util/channel_mapping.py).
+
+    Returns:
+        pd.DataFrame: The posts that could be fetched.
+    """
+    # Posts that could not be fetched only have their uid (and labels)
+    fetched_columns = ["url", "published_at", "content", "channel_name", "platform", "likes_count", "comments_count",
+                       "channel_uid"]
+    labeled = labeled.reindex(columns=list(dict.fromkeys([*labeled.columns, *fetched_columns])))
+    labeled = labeled[labeled[fetched_columns].notna().any(axis=1)].reset_index(drop=True)
+    flags = pd.DataFrame(0, index=labeled.index, columns=FLAG_FIELDS)
+    for label, flag in LABEL_FLAGS.items():
+        if label in labeled.columns:
+            flags[flag] |= (pd.to_numeric(labeled[label], errors="coerce").fillna(0) != 0).astype(int)
+    labeled_flags = {flag for label, flag in LABEL_FLAGS.items() if label in labeled.columns}
+    unlabeled = [flag for flag in dict.fromkeys(LABEL_FLAGS.values()) if flag not in labeled_flags]
+    if unlabeled:
+        print(f"The labels have no column for {', '.join(unlabeled)}; these flags are 0 for the ingested posts")
+    # As in process_data_csv, a label without any of its subcategories counts as "other" (Sub-Label - Other)
+    flags["fossil_fuel_other"] = (flags["fossil_fuel"] & (flags[FOSSIL_SUBCATEGORIES].sum(axis=1) == 0)).astype(int)
+    flags["green_other"] = (flags["green"] & (flags[GREEN_SUBCATEGORIES].sum(axis=1) == 0)).astype(int)
+
+    parent_entity = channel_mapping.entities_by_uid(labeled["channel_uid"].map(_uid_string))
+    if parent_entity.isna().any():
+        print(f"{parent_entity.isna().sum()} ingested posts have no channel in the channel mapping")
+
+    published = pd.to_datetime(labeled["published_at"], errors="coerce", utc=True)
+    text = labeled["post_body_text"] if "post_body_text" in labeled.columns else labeled["content"]
+    return pd.DataFrame({
+        "id": labeled["uid"].astype(str),
+        "y_pred": [str(row) for row in flags.to_numpy().tolist()],
+        "attributes.published_at": (published.astype("int64") // 10 ** 6).where(published.notna()),
+        "attributes.complete_post_text": text.fillna(labeled["content"]),
+        "attributes.search_data_fields.channel_data.channel_name": labeled["channel_name"],
+        "attributes.search_data_fields.platform_name": labeled["platform"],
+        "attributes.engagement_fields.likes_count": labeled["likes_count"],
+        "attributes.engagement_fields.comments_count": labeled["comments_count"],
+        "attributes.search_data_fields.published_at": labeled["published_at"],
+        # The embed size the post component falls back to
+        "computed_width": 600,
+        "computed_height": 800,
+        "parent_entity": parent_entity,
+    })
+
+
+def _post_uid(post):
+    """
+    Returns:
+        str: The uid of a post of the API's response.
+    """
+    attributes = post.get("attributes", {})
+    uid = attributes.get("post_uid") or attributes.get("search_data_fields", {}).get("post_uid") or post.get("id")
+    return str(uid)
+
+
+class RequestMetrics:
+    """
+    Thread-safe latency and error counters of the API requests of a batch.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latencies = []
+            self.errors = 0
+            self.started = time.monotonic()
+
+    def record(self, latency, ok):
+        with self._lock:
+            self.latencies.append(latency)
+            self.errors += not ok
+
+    def summary(self, count, noun="posts"):
+        """
+        Returns:
+            str: Items per second, request error rate (retried attempts included) and p95 request latency since the
+                last reset, for `count` fetched items (`noun`).
+        """
+        with self._lock:
+            elapsed = time.monotonic() - self.started
+            requests_made = len(self.latencies)
+            p95 = np.percentile(self.latencies, 95) if self.latencies else float("nan")
+            error_rate = self.errors / requests_made if requests_made else 0.0
+        return (f"{count} {noun} in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.1f} {noun}/s), "
+                f"{requests_made} requests, error rate {error_rate:.1%}, p95 latency {p95 * 1000:.0f} ms")
+
+
+class Ingestor:
+    """
+    Fetches posts by uid from the Junkipedia API (see the module docstring).
+    """
+
+    def __init__(self, api_key, api_base=API_BASE, workers=8, rate=10, retries=4, backoff=1.0, timeout=30,
+                 batch_size=1, report_every=500):
+        """
+        Arguments:
+            api_key (str): Junkipedia API key.
+            api_base (str): Base URL of the API (e.g. a local stand-in server for testing).
+            workers (int): Concurrent requests.
+            rate (float): Maximum requests per second (including retries).
+            retries (int): Retries of a request failing with 429/5xx or a connection error.
+            backoff (float): Seconds before the first retry; doubled for every further one.
+            timeout (float): Read timeout of a request in seconds.
+            batch_size (int): Uids per multi-id query (1 for one query per uid; see get_posts).
+            report_every (int): Uids per batch of metrics (see run).
+        """
+        self.api_base = api_base.rstrip("/")
+        self.headers = {"Authorization": f"Bearer {api_key}"}
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.batch_size = batch_size
+        self.report_every = report_every
+        self._batching_lock = threading.Lock()
+        self.metrics = RequestMetrics()
+        # The uids the last run could not fetch
+        self.failed = []
+        self.bucket = TokenBucket(rate, capacity=workers)
+        # Retries are made here rather than in the client, so that each one waits for a token
+        self.client = HTTPClient(pool_size=workers, read_timeout=timeout, retries=0, max_concurrency=workers,
+                                 queue_timeout=None)
+
+    def _get(self, path, params):
+        """
+        GET an API endpoint, retrying throttled, failed and unreachable requests.
+
+        Returns:
+            dict: The decoded JSON response.
+        """
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            delay = self.backoff * 2 ** attempt
+            started = time.monotonic()
+            try:
+                response = self.client.get(f"{self.api_base}{path}", headers=self.headers, params=params)
+            except requests.RequestException:
+                self.metrics.record(time.monotonic() - started, False)
+                if attempt == self.retries:
+                    raise
+            else:
+                self.metrics.record(time.monotonic() - started, response.status_code == 200)
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    response.raise_for_status()
+                    return response.json()
+                retry_after = response.headers.get("Retry-After", "")
+                delay = float(retry_after) if retry_after.replace(".", "", 1).isdigit() else delay
+            time.sleep(delay)
+
+    def get_post(self, uid):
+        """
+        Returns:
+            dict: The record of the post with `uid` (see parse_post).
+        """
+        data = self._get("/posts", {"post_uid": uid})
+        posts = data.get("data") or []
+        return parse_post(uid, posts[0] if posts else None)
+
+    def get_posts(self, uids):
+        """
+        Look up several uids with one multi-id query (comma-separated post_uid), matching the returned posts to the
+        uids by their uid. Uids the response does not account for are looked up one by one, and if a query matches
+        none of its uids, the API is taken not to support multi-id queries and batching is switched off.
+
+        Arguments:
+            uids (list): Post uids (strings).
+
+        Returns:
+            list: The record of each uid (see parse_post).
+
+        Raises:
+            requests.RequestException: If a lookup failed after all retries.
+        """
+        if len(uids) == 1 or self.batch_size == 1:
+            return [self.get_post(uid) for uid in uids]
+        data = self._get("/posts", {"post_uid": ",".join(uids), "per_page": len(uids)})
+        found = {_post_uid(post): post for post in data.get("data") or []}
+        if not found.keys() & set(uids):
+            with self._batching_lock:
+                if self.batch_size > 1:
+                    print("Multi-uid queries are not supported by the API; looking up uids one by one")
+                    self.batch_size = 1
+        return [parse_post(uid, found[uid]) if uid in found else self.get_post(uid) for uid in uids]
+
+    def get_channel(self, channel_id):
+        """
+        Returns:
+            dict: The metadata of the channel with `channel_id` (see parse_channel).
+        """
+        return parse_channel(channel_id, self._get(f"/channels/{channel_id}", {}).get("data") or {})
+
+    def get_channels(self, channel_ids):
+        """
+        Fetch the metadata of channels concurrently. Failed channels are reported and left out.
+
+        Arguments:
+            channel_ids (iterable): Junkipedia channel ids.
+
+        Returns:
+            dict: The metadata of each channel that could be fetched (see parse_channel), by channel id.
+        """
+        def fetch(channel_id):
+            try:
+                return channel_id, self.get_channel(channel_id)
+            except Exception as e:
+                print(f"Error fetching channel {channel_id}: {e}")
+                return channel_id, None
+
+        self.metrics.reset()
+        with ThreadPoolExecutor(self.workers) as pool:
+            channels = {channel_id: record for channel_id, record in pool.map(fetch, channel_ids) if record}
+        print(self.metrics.summary(len(channels), "channels"))
+        return channels
+
+    def run(self, uids, checkpoint_path):
+        """
+        Fetch the posts of `uids`, skipping those already in the checkpoint file and appending the others to it as
+        they arrive. Failed uids are reported and not checkpointed, so the next run tries them again.
+        The uids are processed in batches of `report_every`, each followed by a line of metrics.
+
+        Arguments:
+            uids (iterable): Post uids.
+            checkpoint_path (str or Path): JSON-lines file of the fetched records.
+
+        Returns:
+            list: The record of every uid in input order ({"uid": uid} only for posts that could not be fetched, which
+                are also listed in `failed`).
+        """
+        checkpoint_path = Path(checkpoint_path)
+        done = {}
+        if checkpoint_path.exists():
+            with open(checkpoint_path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut off by a crash
+                    done[str(record["uid"])] = record
+        uids = list(uids)
+        todo = list(dict.fromkeys(str(uid) for uid in uids if str(uid) not in done))
+        print(f"{len(done)} posts already fetched (in {checkpoint_path}), fetching {len(todo)}")
+
+        lock = threading.Lock()
+        self.failed = failed = []
+
+        def fetch(group):
+            try:
+                records = self.get_posts(group)
+            except Exception as e:
+                print(f"Error fetching data for UIDs {', '.join(group)}: {e}")
+                with lock:
+                    failed.extend(group)
+                return
+            with lock:
+                for record in records:
+                    checkpoint.write(json.dumps(record, default=str) + "\n")
+                    done[str(record["uid"])] = record
+                checkpoint.flush()
+
+        with open(checkpoint_path, "a") as checkpoint, ThreadPoolExecutor(self.workers) as pool:
+            for batch, start in enumerate(range(0, len(todo), self.report_every), 1):
+                chunk = todo[start:start + self.report_every]
+                self.metrics.reset()
+                failed_before = len(failed)
+                groups = [chunk[i:i + self.batch_size] for i in range(0, len(chunk), self.batch_size)]
+                list(pool.map(fetch, groups))
+                print(f"batch {batch}: {self.metrics.summary(len(chunk) - (len(failed) - failed_before))}")
+
+        if failed:
+            print(f"{len(failed)} posts could not be fetched; rerun to retry them")
+        # Keep the uids as given (e.g. ints read from a CSV), so the records merge back onto the input
+        return [{"uid": uid, **{k: v for k, v in done.get(str(uid), {}).items() if k != "uid"}} for uid in uids]
@@ -0,0 +1,364 @@
+"""
+Proxy for Junkipedia post embeddings.
+/junkipedia_proxy/<post_id> (see app.py) serves a minimal page with just that post, built from the post's
+Junkipedia page, and /junkipedia_embeds combines those pages for the posts of a feed page into the one document
+the page's frame shows (see batch_post_html). The built pages are kept in a proxy cache
+(util/proxy_cache.py) shared by the workers, so each post is only fetched from Junkipedia once per TTL, by one
+worker at a time.
+"""
+import html as html_entities
+import os
+import re
+
+from urllib.parse import urljoin
+
+import requests
+
+from util.http_client import client
+from util.proxy_cache import CachedFetcher
+
+# Overridable to point the proxy at a local stand-in server
+JUNKIPEDIA_ORIGIN = os.environ.get("JUNKIPEDIA_ORIGIN", "https://www.junkipedia.org")
+# Placeholder for our own origin in the URLs of cached assets: the built pages are shared by all workers and hosts
+# and set a <base> to Junkipedia, so the origin is filled in per request (see JunkipediaProxy.post_html)
+ASSET_ORIGIN = "{{asset_origin}}"
+
+_BODY_STYLE = "margin:0;padding:0;display:flex;justify-content:center;"
+
+# A comment, or a start/end tag with its attribute text (quoted values may contain '>')
+_TAG = re.compile(r"""<(?:!--.*?-->|(/?)([a-zA-Z][^\s/>]*)((?:[^>"']+|"[^"]*"|'[^']*')*)>)""", re.S)
+_ATTRIBUTE = re.compile(r"""([^\s=/>"']+)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s>"']*))?""")
+# Elements whose content is text, not markup
+_RAW_TEXT = {"script", "style", "textarea", "title"}
+_RAW_TEXT_END = {name: re.compile(rf"</{name}\s*>", re.I) for name in _RAW_TEXT}
+
+
+def _tags(page, pos=0):
+    """
+    Scan the tags of an HTML page, skipping comments and the content of script/style elements.
+
+    Yields:
+        tuple: (start, end, closing, name, attribute text) of each tag, with `name` lowercased.
+    """
+    while True:
+        match = _TAG.search(page, pos)
+        if match is None:
+            return
+        pos = match.end()
+        if match.group(2) is None:
+            continue
+        name = match.group(2).lower()
+        closing = match.group(1) == "/"
+        yield match.start(), match.end(), closing, name, match.group(3)
+        if not closing and name in _RAW_TEXT:
+            end = _RAW_TEXT_END[name].search(page, pos)
+            pos = end.start() if end else len(page)
+
+
+def _attributes(text):
+    """
+    Returns:
+        dict: The (unescaped) attribute values of a tag's attribute text, by lowercased name.
+    """
+    attributes = {}
+    for match in _ATTRIBUTE.finditer(text):
+        value = match.group(2) or ""
+        if value[:1] in ("'", '"'):
+            value = value[1:-1]
+        attributes.setdefault(match.group(1).lower(), html_entities.unescape(value))
+    return attributes
+
+
+def _absolute_urls(tag):
+    """
+    Prefix the root-relative href/src of a link or script tag with the Junkipedia origin.
+    """
+    def absolute(match):
+        quote = match.group(3)
+        if not match.group(4).startswith("/"):
+            return match.group(0)
+        return f"{match.group(1)}{quote}{JUNKIPEDIA_ORIGIN}{match.group(4)}{quote}"
+    return re.sub(r"""(\s(?:href|src)\s*=\s*)(("|'|)([^"'\s>]*)\3)""", absolute, tag, flags=re.I)
+
+
+def _local_asset(tag, name, attributes, assets):
+    """
+    Point a stylesheet link or classic script tag at the asset cache's copy of its resource.
+
+    Returns:
+        str: The rewritten tag, or None if the tag does not load a cacheable asset (module scripts resolve their
+            imports against their own URL, and subresource integrity would break for rewritten stylesheets).
+    """
+    if "integrity" in attributes:
+        return None
+    attributes = _attributes(attributes)
+    if name == "link" and "stylesheet" in attributes.get("rel", "").lower().split():
+        attribute = "href"
+    elif name == "script" and attributes.get("type", "text/javascript").lower() in ("text/javascript", ""):
+        attribute = "src"
+    else:
+        return None
+    url = attributes.get(attribute)
+    if not url or url.startswith("data:"):
+        return None
+    local_url = assets.local_url(urljoin(f"{JUNKIPEDIA_ORIGIN}/", url), ASSET_ORIGIN)
+    if local_url is None:
+        return None
+    return re.sub(rf"""(\s{attribute}\s*=\s*)("[^"]*"|'[^']*'|[^\s>"']+)""",
+                  lambda match: f'{match.group(1)}"{local_url}"', tag, count=1, flags=re.I)
+
+
+def rewrite_post_html(page, post_id, assets=None):
+    """
+    Build the minimal embedding page of a post from its Junkipedia page: the original <head> (with a <base> to the
+    Junkipedia origin and root-relative link/script URLs made absolute) and the posts wrapper
+    (div[data-controller=posts]) without the div.post-item blocks that do not link to the post.
+    The page is scanned once with a tag tokenizer and the output is cut from the original markup, instead of
+    building and serializing a full BeautifulSoup tree (see benchmarks/proxy_rewrite.py).
+    With an asset cache, stylesheets and scripts are pointed at its local copies, prefixed with ASSET_ORIGIN.
+
+    Arguments:
+        page (str): The Junkipedia page of the post.
+        post_id (str): The "post_id" of the post.
+        assets (AssetCache): Optional cache of the head's stylesheets and scripts.
+
+    Returns:
+        str: The HTML page of the post.
+
+    Raises:
+        ValueError: If the page has no posts wrapper.
+    """
+    base = f'<base href="{JUNKIPEDIA_ORIGIN}/"/>'
+
+    # — 1) Copy the <head>, with a <base> and absolute link/script URLs —
+    head_html, body_start = f"<head>{base}</head>", 0
+    tags = _tags(page)
+    for start, end, closing, name, _ in tags:
+        if name == "head" and not closing:
+            parts, pos = [page[start:end], base], end
+            for tag_start, tag_end, tag_closing, tag_name, tag_attributes in tags:
+                if tag_name == "head" or (tag_name == "body" and not tag_closing):
+                    break
+                if tag_name in ("link", "script") and not tag_closing:
+                    tag = page[tag_start:tag_end]
+                    local = _local_asset(tag, tag_name, tag_attributes, assets) if assets is not None else None
+                    parts += [page[pos:tag_start], local or _absolute_urls(tag)]
+                    pos = tag_end
+            else:
+                tag_start = len(page)
+            head_html, body_start = "".join(parts) + page[pos:tag_start] + "</head>", tag_start
+            break
+        if name == "body":
+            break
+
+    # — 2) Cut out the posts wrapper, without the post items that do not link to this post —
+    link_suffix = f"/posts/{post_id}"
+    wrapper_start = wrapper_end = None
+    items, links = [], []  # [start, end] of every div.post-item, start of every link to the post
+    divs = []  # for each open div of the wrapper: index into `items`, or None
+    for start, end, closing, name, attributes in _tags(page, body_start):
+        if name == "div":
+            if wrapper_start is None:
+                if not closing and "data-controller" in attributes and \
+                        _attributes(attributes).get("data-controller") == "posts":
+                    wrapper_start = start
+                    divs.append(None)
+            elif closing:
+                item = divs.pop()
+                if item is not None:
+                    items[item][1] = end
+                if not divs:
+                    wrapper_end = end
+                    break
+            elif not attributes.rstrip().endswith("/"):
+                is_item = "post-item" in attributes and "post-item" in _attributes(attributes).get("class", "").split()
+                if is_item:
+                    items.append([start, None])
+                divs.append(len(items) - 1 if is_item else None)
+        elif name == "a" and not closing and wrapper_start is not None and str(post_id) in attributes:
+            if _attributes(attributes).get("href", "").endswith(link_suffix):
+                links.append(start)
+    if wrapper_start is None:
+        raise ValueError(f"No posts wrapper in the page of post {post_id}")
+    wrapper_end = len(page) if wrapper_end is None else wrapper_end
+
+    parts, pos = [], wrapper_start
+    for item_start, item_end in items:
+        item_end = wrapper_end if item_end is None else item_end
+        if item_start < pos or any(item_start < link < item_end for link in links):
+            continue
+        parts.append(page[pos:item_start])
+        pos = item_end
+    body_html = "".join(parts) + page[pos:wrapper_end]
+
+    # — 3) Rebuild a minimal page —
+    return _embedding_page(head_html, body_html)
+
+
+def _embedding_page(head_html, body_html, body_style=_BODY_STYLE):
+    return f"""
+    <!DOCTYPE html>
+    <html>
+      {head_html}
+      <body style="{body_style}">
+        {body_html}
+      </body>
+    </html>
+    """
+
+
+def split_post_html(page):
+    """
+    Returns:
+        head_html (str): The <head> of a page built by rewrite_post_html.
+        body_html (str): The content of its <body> (the posts wrapper).
+    """
+    body_open = page.index(f'<body style="{_BODY_STYLE}">')
+    body_close = page.rindex("</body>")
+    head_html = page[page.index("<html>") + len("<html>"):body_open].strip()
+    return head_html, page[body_open + len(f'<body style="{_BODY_STYLE}">'):body_close].strip()
+
+
+# Script of the batch document resizing its frame to the height of the posts (the frame is same-origin); the
+# posts' grid is measured rather than the document, which is at least as tall as the frame
+_FIT_FRAME = (
+    "<script>(function(){var f=window.frameElement,b=document.querySelector('.post-blocks');if(!f||!b)return;"
+    "function fit(){f.style.height=Math.ceil(b.getBoundingClientRect().bottom+window.scrollY)+'px';}"
+    "addEventListener('load',fit);if(window.ResizeObserver)new ResizeObserver(fit).observe(b);fit();"
+    "})();</script>"
+)
+
+
+def batch_post_html(pages, columns=1, footers=None, sizes=None, style=""):
+    """
+    Combine the embedding pages of several posts into one document, to show the posts of a feed page in a single
+    frame: the head of the first page (the proxied pages all share Junkipedia's head, so it is parsed and its
+    scripts run once) and one <section id="post-<post_id>"> per post, laid out in a grid of `columns` columns.
+    Each post is cut to its box as its own iframe would cut it, and the document resizes its frame to its height.
+
+    Arguments:
+        pages (list): (post_id, page) pairs, with page None for posts that could not be fetched.
+        columns (int): Number of grid columns.
+        footers (dict): HTML shown under a post, by post id (e.g. its classification badges).
+        sizes (dict): (width, height) in pixels of a post's box, by post id.
+        style (str): CSS rules for the footers.
+
+    Returns:
+        str: The combined document.
+    """
+    footers, sizes = footers or {}, sizes or {}
+    head_html, blocks = None, []
+    for post_id, page in pages:
+        body_html = "…"
+        if page is not None:
+            page_head, body_html = split_post_html(page)
+            head_html = head_html or page_head
+        block_id = html_entities.escape(f"post-{post_id}")
+        width, height = sizes.get(post_id, (None, None))
+        box = (f"width:{width}px;" if width else "") + (f"height:{height}px;" if height else "")
+        blocks.append(f'<section class="post-block" id="{block_id}"><div class="post-embed" style="{box}">'
+                      f'{body_html}</div>{footers.get(post_id, "")}</section>')
+    style = (
+        f"<style>.post-blocks{{display:grid;grid-template-columns:repeat({int(columns)},minmax(0,1fr));gap:16px;"
+        f"align-items:start;}}.post-block{{display:flex;flex-direction:column;align-items:center;}}"
+        f".post-embed{{max-width:100%;overflow:hidden;}}{style}</style>"
+    )
+    body_html = f'{style}<div class="post-blocks">{"".join(blocks)}</div>{_FIT_FRAME}'
+    return _embedding_page(head_html or "<head></head>", body_html, "margin:0;padding:0;")
+
+
+def fetch_junkipedia_post_html(post_id, assets=None):
+    """
+    Fetches the post from Junkipedia and returns a minimal HTML embedding with the post content. This is used to
+      display the post in an iframe.
+
+    Arguments:
+        post_id (str): The "post_id" of the post to fetch from Junkipedia.
+        assets (AssetCache): Optional cache of the head's stylesheets and scripts.
+
+    Returns:
+        html (str): The HTML page of the post, or None if Junkipedia did not return it.
+        status (int): The HTTP status of Junkipedia's response.
+    """
+    resp = client.get(f"{JUNKIPEDIA_ORIGIN}/posts/{post_id}")
+    if resp.status_code != 200:
+        return None, resp.status_code
+    return rewrite_post_html(resp.text, post_id, assets), 200
+
+
+def fetch_junkipedia_post(post_id, assets=None):
+    """
+    Upstream fetch of the proxy cache: fetch_junkipedia_post_html with the page encoded, and network errors
+    (after the client's retries) and pages without a posts wrapper reported as 502 so they are cached as failures.
+    UpstreamBusy is raised through, as a full request queue says nothing about the post.
+
+    Returns:
+        status (int): The HTTP status of the response.
+        body (bytes): The HTML page of the post (empty if it could not be fetched).
+    """
+    try:
+        html, status = fetch_junkipedia_post_html(post_id, assets)
+    except (requests.RequestException, ValueError) as e:
+        print(f"Could not fetch Junkipedia post {post_id}: {e!r}")
+        return 502, b""
+    return status, html.encode() if html is not None else b""
+
+
+class JunkipediaProxy:
+    """
+    Serves post embeddings through the proxy cache (see CachedFetcher for the TTLs, stale-while-revalidate and
+    request coalescing).
+    """
+
+    def __init__(self, cache, assets=None, **policy):
+        """
+        Arguments:
+            cache (ProxyCache): Backend storing the built pages.
+            assets (AssetCache): Optional cache of the head's stylesheets and scripts.
+            **policy: TTL arguments of CachedFetcher (e.g. from proxy_policy_from_env).
+        """
+        self.posts = CachedFetcher("junkipedia_proxy", cache, lambda post_id: fetch_junkipedia_post(post_id, assets),
+                                   **policy)
+
+    def prefetch(self, post_ids):
+        """
+        Warm the cache for posts about to be shown (see CachedFetcher.prefetch).
+
+        Arguments:
+            post_ids (iterable): The "post_id"s of the posts.
+        """
+        self.posts.prefetch(str(post_id) for post_id in post_ids)
+
+    def batch_html(self, post_ids, origin="", **layout):
+        """
+        Build one document with the embeddings of several posts (see batch_post_html), fetching the uncached ones
+        concurrently.
+
+        Arguments:
+            post_ids (list): The "post_id"s of the posts.
+            origin (str): Our origin, for the URLs of cached assets.
+            **layout: Layout arguments of batch_post_html (columns, footers, sizes, style).
+
+        Returns:
+            str: The HTML document.
+        """
+        post_ids = [str(post_id) for post_id in post_ids]
+        entries = self.posts.get_many(post_ids)
+        pages = [(post_id, entry.body.decode() if entry is not None and entry.status == 200 else None)
+                 for post_id, entry in zip(post_ids, entries)]
+        return batch_post_html(pages, **layout).replace(ASSET_ORIGIN, origin)
+
+    def post_html(self, post_id, origin=""):
+        """
+        Arguments:
+            post_id (str): The "post_id" of the post.
+            origin (str): Our origin (e.g. "https://dashboard.example.org"), for the URLs of cached assets.
+
+        Returns:
+            html (str): The HTML page of the post, or None if Junkipedia did not return it.
+            status (int): The HTTP status of Junkipedia's response.
+        """
+        entry = self.posts.get(post_id)
+        if entry.status != 200:
+            return None, entry.status
+        return entry.body.decode().replace(ASSET_ORIGIN, origin), entry.status
@@ -0,0 +1,182 @@
+"""
+Near-duplicate clustering of posts with MinHash and locality-sensitive hashing (LSH).
+The same campaign copy is often posted across channels with different hashtags, mentions, emojis or tracking
+parameters, so exact text comparison (util.functions.duplicate_groups) keeps every variant. Here each post is
+reduced to a MinHash signature over its word 3-grams (after dropping URLs, hashtags, mentions and non-word
+characters), posts sharing a band of their signature become candidates, candidates whose signatures agree closely
+enough are linked, and the connected components are the campaign clusters.
+Every step is a vectorized pass over all posts (or all bucket members), so the cost grows linearly with the number
+of posts instead of with the number of pairs.
+"""
+import numpy as np
+import pandas as pd
+
+from util.functions import URL_PATTERN
+
+# Dropped before shingling: URLs (incl. tracking parameters), hashtags and mentions
+STRIP_PATTERN = URL_PATTERN + r'|[#@]\w+'
+TOKEN_PATTERN = r'\w+'
+
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+BANDS = 16  # NUM_PERM / BANDS = 4 rows per band
+# Minimum fraction of agreeing signature slots (the estimated Jaccard similarity) for two posts to be linked
+THRESHOLD = 0.7
+
+_SEED = 20240501
+# Shingles hashed per chunk: the NUM_PERM x _CHUNK_SHINGLES uint64 matrix takes 32 MB
+_CHUNK_SHINGLES = 1 << 16
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _shingles(texts):
+    """
+    Hash the word 3-grams of every post (a post with fewer words gets one shingle for all of them).
+
+    Arguments:
+        texts (pd.Series): The post texts.
+
+    Returns:
+        shingles (np.ndarray): uint64 shingle hashes, grouped by post.
+        starts (np.ndarray): Start of each post's shingles in `shingles`, plus the total length.
+    """
+    cleaned = texts.fillna("").astype(str).str.lower().str.replace(STRIP_PATTERN, " ", regex=True)
+    tokens = cleaned.str.findall(TOKEN_PATTERN)
+    lengths = tokens.str.len().to_numpy(dtype=np.int64)
+    flat = tokens.explode().dropna()
+    token_hashes = pd.util.hash_array(flat.to_numpy(dtype=object))
+    token_starts = np.concatenate([[0], np.cumsum(lengths)])
+
+    # n-gram i of a post combines tokens i .. i + SHINGLE_SIZE - 1 (wrapping uint64 arithmetic)
+    n_shingles = np.where(lengths > 0, np.maximum(lengths - SHINGLE_SIZE + 1, 1), 0)
+    starts = np.concatenate([[0], np.cumsum(n_shingles)])
+    first = np.repeat(token_starts[:-1], n_shingles) + (np.arange(starts[-1]) - np.repeat(starts[:-1], n_shingles))
+    last = np.repeat(token_starts[1:], n_shingles)
+    shingles = np.zeros(starts[-1], dtype=np.uint64)
+    for offset in range(SHINGLE_SIZE):
+        position = first + offset
+        valid = position < last
+        shingles[valid] = shingles[valid] * _MIX + token_hashes[position[valid]]
+    return shingles, starts
+
+
+def minhash_signatures(texts, num_perm=NUM_PERM):
+    """
+    Compute the MinHash signature of every post.
+    Each permutation is a multiply-shift hash of the 64-bit shingle hashes. The posts are processed in chunks of
+    about _CHUNK_SHINGLES shingles, and the hashes are computed in place, so the (permutations x shingles) matrix
+    stays at a few tens of MB however many posts there are.
+
+    Arguments:
+        texts (pd.Series): The post texts.
+        num_perm (int): Signature length.
+
+    Returns:
+        signatures (np.ndarray): uint32 array of shape (len(texts), num_perm).
+        has_shingles (np.ndarray): False for posts without any words (their signature is meaningless).
+    """
+    shingles, starts = _shingles(texts)
+    n = len(starts) - 1
+    rng = np.random.default_rng(_SEED)
+    a = rng.integers(1, 2 ** 63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    b = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+
+    has_shingles = starts[1:] > starts[:-1]
+    signatures = np.full((n, num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+    post = 0
+    while post < n:
+        end = min(int(np.searchsorted(starts, starts[post] + _CHUNK_SHINGLES, side="right")) - 1, n)
+        end = max(end, post + 1)
+        rows = np.arange(post, end)[has_shingles[post:end]]
+        if len(rows):
+            chunk = shingles[starts[post]:starts[end]]
+            # One row per permutation keeps each post's shingles contiguous for reduceat
+            hashed = np.multiply(a[:, None], chunk)
+            hashed += b[:, None]
+            hashed >>= np.uint64(32)
+            hashed = hashed.astype(np.uint32)
+            signatures[rows] = np.minimum.reduceat(hashed, starts[rows] - starts[post], axis=1).T
+        post = end
+    return signatures, has_shingles
+
+
+def _connected_components(n, u, v):
+    """
+    Label the connected components of the graph with edges (u[i], v[i]) by the smallest node of each component.
+    Roots are hooked under the smaller root of every edge, then all pointers are jumped to their roots, until no
+    edge joins two different roots.
+    """
+    parent = np.arange(n)
+    while len(u):
+        pu, pv = parent[u], parent[v]
+        keep = pu != pv
+        if not keep.any():
+            break
+        u, v, pu, pv = u[keep], v[keep], pu[keep], pv[keep]
+        np.minimum.at(parent, np.maximum(pu, pv), np.minimum(pu, pv))
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+    return parent
+
+
+def near_duplicate_clusters(texts, group_ids=None, bands=BANDS, threshold=THRESHOLD, signatures=None):
+    """
+    Cluster near-duplicate posts.
+    Within every band, each post is compared only with the first post of its bucket (the posts sharing that band
+    of the signature), and linked to it when their full signatures agree on at least `threshold` of the slots.
+    Posts of the same exact duplicate group are always linked, so each cluster is a union of those groups.
+
+    Arguments:
+        texts (pd.Series): The post texts, in the final order of the processed frame.
+        group_ids (np.ndarray): Optional exact duplicate group of each post (e.g. 'dup_group_id').
+        bands (int): Number of LSH bands; NUM_PERM must be divisible by it.
+        threshold (float): Minimum estimated Jaccard similarity of linked posts.
+        signatures (tuple): minhash_signatures(texts) if already known (e.g. kept from an earlier run).
+
+    Returns:
+        pd.DataFrame: With the same index as `texts` and the columns
+            - 'near_dup_cluster_id': id of the cluster (numbered in order of first appearance)
+            - 'near_dup_cluster_size': number of posts in the cluster
+            - 'is_cluster_representative': True for the first post of each cluster
+    """
+    signatures, has_shingles = minhash_signatures(texts) if signatures is None else signatures
+    n, num_perm = signatures.shape
+    rows_per_band = num_perm // bands
+    candidates = np.flatnonzero(has_shingles)
+
+    edges_u, edges_v = [], []
+    for band in range(bands):
+        # The band's slots are mixed into one 64-bit bucket key; a rare collision only costs a rejected comparison
+        bucket = np.zeros(len(candidates), dtype=np.uint64)
+        for slot in range(band * rows_per_band, (band + 1) * rows_per_band):
+            bucket = bucket * _MIX + signatures[candidates, slot]
+        order = np.argsort(bucket, kind="stable")
+        sorted_bucket = bucket[order]
+        is_first = np.ones(len(order), dtype=bool)
+        is_first[1:] = sorted_bucket[1:] != sorted_bucket[:-1]
+        leader = order[np.maximum.accumulate(np.where(is_first, np.arange(len(order)), 0))]
+        members, leaders = candidates[order[~is_first]], candidates[leader[~is_first]]
+        agreement = (signatures[members] == signatures[leaders]).mean(axis=1)
+        linked = agreement >= threshold
+        edges_u.append(members[linked])
+        edges_v.append(leaders[linked])
+
+    if group_ids is not None:
+        group_ids = np.asarray(group_ids)
+        _, first = np.unique(group_ids, return_index=True)
+        group_leader = np.empty(group_ids.max() + 1 if len(group_ids) else 0, dtype=np.int64)
+        group_leader[group_ids[first]] = first
+        edges_u.append(np.arange(n))
+        edges_v.append(group_leader[group_ids])
+
+    root = _connected_components(n, np.concatenate(edges_u or [[]]).astype(np.int64),
+                                 np.concatenate(edges_v or [[]]).astype(np.int64))
+    cluster_id, _ = pd.factorize(root)
+    return pd.DataFrame({
+        'near_dup_cluster_id': cluster_id.astype(np.int32),
+        'near_dup_cluster_size': np.bincount(cluster_id)[cluster_id].astype(np.int32),
+        'is_cluster_representative': root == np.arange(n),
+    }, index=texts.index)
@@ -2,6 +2,8 @@ import pandas as pd
 
 import plotly.express as px
 
+from util.cube import company_year_counts
+
 def plot_green_share(labeled_data):
     """
     Plot the share of green posts out of posts labelled green or fossil fuel over time for each company.
@@ -17,16 +19,7 @@ def plot_green_share(labeled_data):
     df = labeled_data.copy()
 
     # 2) Count total vs green posts per company/year
-    summary = (
-        df[df['green_brown'] != 'misc']
-        .groupby(['company', 'year'])
-        .agg(
-            total_posts=('id', 'count'),
-            green_posts=('green', 'sum'),
-            brown_posts=('fossil_fuel', 'sum')
-        )
-        .reset_index()
-    )
+    summary = company_year_counts(df)
     summary = summary[(summary['green_posts'] >= 25) & (summary['brown_posts'] >= 25)]
     summary['pct_green'] = (summary['green_posts'] / summary['total_posts'])*100
 
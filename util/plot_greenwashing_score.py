@@ -2,6 +2,8 @@ import pandas as pd
 import plotly.graph_objects as go
 import numpy as np
 
+from util.cube import company_year_counts
+
 def plot_combined_greenwashing_scores(
     labeled_data,
     ratios_csv_path='data/low_carbon_ratios.csv'
@@ -26,16 +28,7 @@ def plot_combined_greenwashing_scores(
     df = labeled_data.copy()
 
     # Count total vs green/brown posts per company/year
-    summary = (
-        df[df['green_brown'] != 'misc']
-        .groupby(['company', 'year'])
-        .agg(
-            total_posts=('id', 'count'),
-            green_posts=('green', 'sum'),
-            brown_posts=('fossil_fuel', 'sum')
-        )
-        .reset_index()
-    )
+    summary = company_year_counts(df)
     # Filter for at least 25 green and 25 brown posts
     summary = summary[(summary['green_posts'] >= 25) & (summary['brown_posts'] >= 25)]
     summary['pct_green'] = summary['green_posts'] / summary['total_posts']
@@ -4,6 +4,8 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import numpy as np
 
+from util.cube import post_weights
+
 def _shorten_and_wrap(raw_label: str, max_line_len: int = 14) -> str:
     """
     Take something like 'Green (Sub-Label) - Decreasing Emissions'
@@ -74,14 +76,12 @@ def prepare_proportions(df, codebook):
     available = [c for c in labels_df["label"].tolist() if c in df.columns]
     labels_df = labels_df[labels_df["label"].isin(available)]
 
-    df_long = df[['id'] + available].melt(
-        id_vars='id', value_vars=available, var_name='label', value_name='value'
-    )
-    agg = (
-        df_long.groupby('label')
-        .agg(n=('value', 'sum'), total=('value', 'count'))
-        .reset_index()
-    )
+    weights = post_weights(df)
+    agg = pd.DataFrame({
+        'label': available,
+        'n': [int((df[label].astype(int) * weights).sum()) for label in available],
+        'total': int(weights.sum()),
+    }).sort_values('label').reset_index(drop=True)
     agg['not_that'] = agg['total'] - agg['n']
     agg = agg.merge(labels_df, on='label')
 
@@ -138,7 +138,12 @@ def plot_green_brown(df, color_scheme):
     import plotly.express as px
 
     # Prepare the data
-    green_brown_counts = df['green_brown'].value_counts().reset_index()
+    green_brown_counts = (
+        post_weights(df).groupby(df['green_brown'], observed=False).sum()
+        .sort_values(ascending=False, kind='stable')
+    )
+    # 'green_brown' is categorical, so value_counts also lists labels without any posts
+    green_brown_counts = green_brown_counts[green_brown_counts > 0].reset_index()
     green_brown_counts.columns = ['green_brown', 'n']
     green_brown_counts['share'] = green_brown_counts['n'] / green_brown_counts['n'].sum()
     # Map categories to nice labels
@@ -148,7 +153,7 @@ def plot_green_brown(df, color_scheme):
         'misc': 'Miscellaneous',
         'green_brown': 'Green+Fossil'
     }
-    green_brown_counts['green_brown'] = green_brown_counts['green_brown'].map(category_labels)
+    green_brown_counts['green_brown'] = green_brown_counts['green_brown'].astype(str).map(category_labels)
     green_brown_counts['label'] = green_brown_counts['green_brown'] + ' (' + (green_brown_counts['share'] * 100).round().astype(int).astype(str) + '%)'
 
     # Set the same x value for all rows (to get one bar)
@@ -195,9 +200,8 @@ def plot_green_brown(df, color_scheme):
 
 def plot_overview(labeled_data, codebook, color_scheme):
     total_posts = len(labeled_data)-1
-    
-    labeled_data['green_brown'] = labeled_data.apply(lambda row: 'green_brown' if row['green'] and row['fossil_fuel'] else 'green' if row['green'] else 'brown' if row['fossil_fuel'] else 'misc', axis=1)
-    
+
+    # 'green_brown' is computed once during processing (util.functions.label_green_brown)
     label_proportions = prepare_proportions(labeled_data, codebook)
     
     green_proportions = label_proportions[label_proportions['super_category'] == 'Green']
@@ -18,7 +18,7 @@ def plot_time_trends(labeled_data, codebook, color_scheme):
 
     # Time trends plot
     time_green_brown = (
-        df.groupby(['year', 'green_brown'])['green_brown'].count()
+        df.groupby(['year', 'green_brown'], observed=True)['green_brown'].count()
         .unstack(fill_value=0)
         .reset_index()
         .melt(id_vars='year', value_vars=['green', 'brown', 'misc'], var_name='green_brown', value_name='n')
@@ -48,7 +48,7 @@ def plot_time_trends(labeled_data, codebook, color_scheme):
 
     # Data for ratio plot and calculation of ratio
     ratio_data = (
-        df.groupby(['year', 'green_brown'])['green_brown'].count()
+        df.groupby(['year', 'green_brown'], observed=True)['green_brown'].count()
         .unstack(fill_value=0)
         .fillna(0)
         .assign(green=lambda x: (x['green'] - x['brown']) / (x['green'] + x['brown']))
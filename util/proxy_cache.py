@@ -0,0 +1,499 @@
+"""
+Cache for the Junkipedia proxy.
+A feed page embeds 10-20 posts, and every gunicorn worker used to fetch and rewrite the same posts from Junkipedia
+on its own. The SQLite backend stores the proxied pages in one file shared by all workers on the host (and kept
+across restarts); the memory backend keeps them per process. Both bound the total size of the stored pages,
+evicting the least recently used ones, and drop entries older than their maximum age.
+
+CachedFetcher puts the caching policy on top of a backend:
+    - successful responses are fresh for `ttl`, failures (negative caching) only for `failure_ttl`;
+    - a success that is no longer fresh is still served for `stale_ttl` while a background thread refreshes it
+      (stale-while-revalidate), and kept when the refresh fails with a server error or is rate limited
+      (stale-if-error);
+    - concurrent requests for the same key share one upstream fetch: threads of a worker wait for the same future,
+      and workers on the host take a lease in the shared backend and wait for the holder's result.
+
+The cache is configured with environment variables (see proxy_cache_from_env and proxy_policy_from_env):
+    JUNKIPEDIA_CACHE_BACKEND       "sqlite" (default) or "memory"
+    JUNKIPEDIA_CACHE_PATH          SQLite file (default data/cache/junkipedia_proxy.sqlite)
+    JUNKIPEDIA_CACHE_MAX_MB        size limit of the stored pages (default 256)
+    JUNKIPEDIA_CACHE_TTL           seconds a page is fresh (default 86400)
+    JUNKIPEDIA_CACHE_FAILURE_TTL   seconds a failed fetch is served from the cache (default 60)
+    JUNKIPEDIA_CACHE_STALE_TTL     seconds a page is served stale while it is refreshed (default 604800)
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+from util.cache import register_cache
+from util.http_client import RETRY_STATUSES
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_PATH = REPO_ROOT / "data" / "cache" / "junkipedia_proxy.sqlite"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_FAILURE_TTL = 60
+DEFAULT_STALE_TTL = 7 * 24 * 60 * 60
+
+# A cached upstream response: HTTP status, body (bytes) and the time it was stored
+CacheEntry = namedtuple("CacheEntry", ["status", "body", "stored_at"])
+
+
+class ProxyCache:
+    """
+    Interface of the proxy cache backends. Keys are strings, values CacheEntry tuples.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_TTL):
+        """
+        Arguments:
+            max_bytes (int): Size limit of the stored bodies.
+            max_age (float): Seconds after which an entry is dropped.
+        """
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Returns:
+            CacheEntry: The entry stored under `key` (marking it as most recently used), or None if there is none
+                or it is older than `max_age`.
+        """
+        raise NotImplementedError
+
+    def set(self, key, status, body, stored_at=None):
+        """
+        Store an upstream response under `key` (as stored at `stored_at`, by default now), evicting least recently
+        used entries beyond `max_bytes`.
+        """
+        raise NotImplementedError
+
+    def acquire(self, key, seconds):
+        """
+        Take the lease on fetching `key` for `seconds`, unless another process holds it.
+
+        Returns:
+            bool: Whether the lease was taken.
+        """
+        return True
+
+    def release(self, key):
+        """
+        Give up the lease on fetching `key`.
+        """
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+        raise NotImplementedError
+
+    def _expired(self, entry):
+        return time.time() - entry.stored_at > self.max_age
+
+    def stats(self):
+        """
+        Returns:
+            dict: Backend name, bounds and eviction counter (of this process).
+        """
+        return {
+            "backend": type(self).__name__,
+            "max_bytes": self.max_bytes,
+            "max_age": self.max_age,
+            "evictions": self.evictions,
+        }
+
+
+class MemoryProxyCache(ProxyCache):
+    """
+    Per-process LRU backend (what the proxy used before, with a size bound and maximum age instead of 128 entries).
+    Only threads of the same process share its entries, so it needs no leases.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_TTL):
+        super().__init__(max_bytes, max_age)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, status, body, stored_at=None):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = CacheEntry(status, body, time.time() if stored_at is None else stored_at)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry.body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        stats = super().stats()
+        stats.update(entries=len(self._entries), bytes=self._bytes)
+        return stats
+
+
+class SQLiteProxyCache(ProxyCache):
+    """
+    Backend storing the entries in a SQLite file shared by all worker processes.
+    The database runs in WAL mode, so readers do not block each other or the writer. Every read updates the
+    entry's access time, which drives the LRU eviction once the stored bodies exceed `max_bytes`. Fetch leases are
+    rows of a second table that expire on their own, so a crashed worker cannot block a key.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_TTL):
+        super().__init__(max_bytes, max_age)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, status INTEGER, body BLOB, size INTEGER, stored_at REAL, accessed_at REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+        conn.execute("CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, expires_at REAL)")
+        conn.commit()
+
+    def _connection(self):
+        # SQLite connections cannot be shared between threads or forked processes (gunicorn --preload creates the
+        # cache in the master), so each thread of each process opens its own
+        conn, pid = getattr(self._local, "conn", (None, None))
+        if conn is None or pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = (conn, os.getpid())
+        return conn
+
+    def get(self, key):
+        conn = self._connection()
+        row = conn.execute("SELECT status, body, stored_at FROM entries WHERE key = ?", (key,)).fetchone()
+        entry = CacheEntry(row[0], bytes(row[1]), row[2]) if row else None
+        if entry is not None and self._expired(entry):
+            with conn:
+                conn.execute("DELETE FROM entries WHERE key = ? AND stored_at = ?", (key, entry.stored_at))
+            entry = None
+        if entry is not None:
+            with conn:
+                conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return entry
+
+    def set(self, key, status, body, stored_at=None):
+        if len(body) > self.max_bytes:
+            return
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (key, status, sqlite3.Binary(body), len(body), now if stored_at is None else stored_at, now),
+            )
+            # Evict the least recently used entries beyond the size limit
+            evicted = conn.execute(
+                "DELETE FROM entries WHERE key IN ("
+                " SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC, key) AS total FROM entries)"
+                " WHERE total > ?)",
+                (self.max_bytes,),
+            ).rowcount
+        self.evictions += max(evicted, 0)
+
+    def acquire(self, key, seconds):
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM leases WHERE key = ? AND expires_at < ?", (key, now))
+            return conn.execute("INSERT OR IGNORE INTO leases VALUES (?, ?)", (key, now + seconds)).rowcount == 1
+
+    def release(self, key):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM leases WHERE key = ?", (key,))
+
+    def clear(self):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM entries")
+            conn.execute("DELETE FROM leases")
+
+    def stats(self):
+        stats = super().stats()
+        entries, size = self._connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        stats.update(entries=entries, bytes=size, path=str(self.path))
+        return stats
+
+
+class CachedFetcher:
+    """
+    Serves the responses of an upstream fetch function through a ProxyCache (see the module docstring for the
+    policy). The counters in `stats()` are those of this process.
+    """
+
+    def __init__(self, name, cache, fetch, ttl=DEFAULT_TTL, failure_ttl=DEFAULT_FAILURE_TTL,
+                 stale_ttl=DEFAULT_STALE_TTL, lease_seconds=30, refresh_threads=2, prefetch_threads=4,
+                 max_prefetch_queue=100):
+        """
+        Arguments:
+            name (str): Name of the cache in cache_stats.
+            cache (ProxyCache): Backend storing the responses. Its `max_age` should cover `ttl + stale_ttl`.
+            fetch (callable): Takes a key and returns the upstream (status, body) with the body as bytes.
+            ttl (float): Seconds a successful (status 200) response is fresh.
+            failure_ttl (float): Seconds any other response is served from the cache.
+            stale_ttl (float): Seconds after `ttl` a successful response is served while it is refreshed.
+            lease_seconds (float): How long a worker waits for another worker's fetch of the same key.
+            refresh_threads (int): Background refresh threads per process.
+            prefetch_threads (int): Prefetch threads per process (see `prefetch`).
+            max_prefetch_queue (int): Prefetches queued per process beyond which new ones are dropped.
+        """
+        self.cache = cache
+        self.fetch = fetch
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.stale_ttl = stale_ttl
+        self.lease_seconds = lease_seconds
+        self.refresh_threads = refresh_threads
+        self.prefetch_threads = prefetch_threads
+        self.max_prefetch_queue = max_prefetch_queue
+        self._inflight = {}
+        self._prefetching = set()
+        self._lock = threading.Lock()
+        self._pools = {}
+        self._pools_pid = None
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.fetches = 0
+        self.refreshes = 0
+        self.stale_errors = 0
+        self.prefetches = 0
+        self.prefetches_dropped = 0
+        register_cache(name, self)
+
+    def _age_limit(self, entry):
+        return self.ttl if entry.status == 200 else self.failure_ttl
+
+    def get(self, key):
+        """
+        Returns:
+            CacheEntry: The response for `key`, from the cache when it is fresh (or stale but still servable, in
+                which case a background refresh is started), otherwise fetched.
+        """
+        entry = self.cache.get(key)
+        if entry is not None:
+            age = time.time() - entry.stored_at
+            if age <= self._age_limit(entry):
+                self.hits += 1
+                return entry
+            if entry.status == 200 and age <= self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                future, owner = self._claim(key)
+                if owner:
+                    self.refreshes += 1
+                    self._pool("refresh", self.refresh_threads).submit(self._run, key, entry, future, False)
+                return entry
+        self.misses += 1
+        future, owner = self._claim(key)
+        if owner:
+            self._run(key, entry, future, True)
+        else:
+            self.coalesced += 1
+        return future.result()
+
+    def _claim(self, key):
+        """
+        Returns:
+            future (Future): The future of the fetch of `key` in this process.
+            owner (bool): Whether the caller started that fetch and has to run it.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = self._inflight[key] = Future()
+            return future, True
+
+    def _pool(self, name, threads):
+        # Threads do not survive a fork, so every process starts its own pools
+        with self._lock:
+            if self._pools_pid != os.getpid():
+                self._pools, self._pools_pid = {}, os.getpid()
+            if name not in self._pools:
+                self._pools[name] = ThreadPoolExecutor(threads, thread_name_prefix=f"proxy-{name}")
+            return self._pools[name]
+
+    def get_many(self, keys, threads=8):
+        """
+        Get the responses for several keys, fetching the missing ones concurrently.
+
+        Arguments:
+            keys (list): The keys.
+            threads (int): Threads of the per-process pool fetching the keys.
+
+        Returns:
+            list: The CacheEntry of each key, or None where the fetch raised (e.g. UpstreamBusy).
+        """
+        def get(key):
+            try:
+                return self.get(key)
+            except Exception as e:
+                print(f"Could not get proxy cache entry '{key}': {e!r}")
+                return None
+        if len(keys) <= 1:
+            return [get(key) for key in keys]
+        return list(self._pool("batch", threads).map(get, keys))
+
+    def prefetch(self, keys):
+        """
+        Warm the cache for `keys` in the background (e.g. the embeds of the next feed page), so the requests for
+        them find fresh entries. Keys that are fresh, already being fetched or already queued are skipped, and
+        keys beyond `max_prefetch_queue` queued prefetches are dropped.
+
+        Arguments:
+            keys (iterable): Keys to warm.
+        """
+        pool = self._pool("prefetch", self.prefetch_threads)
+        for key in keys:
+            with self._lock:
+                if key in self._prefetching or key in self._inflight:
+                    continue
+                if len(self._prefetching) >= self.max_prefetch_queue:
+                    self.prefetches_dropped += 1
+                    continue
+                self._prefetching.add(key)
+            pool.submit(self._warm, key)
+
+    def _warm(self, key):
+        try:
+            entry = self.cache.get(key)
+            if entry is None or time.time() - entry.stored_at > self._age_limit(entry):
+                self.prefetches += 1
+                self.get(key)
+        except Exception as e:
+            print(f"Could not prefetch proxy cache entry '{key}': {e!r}")
+        finally:
+            with self._lock:
+                self._prefetching.discard(key)
+
+    def _run(self, key, stale, future, wait):
+        """
+        Fetch `key` into `future`. With `wait`, a fetch already leased by another worker is waited for; without it
+        (background refreshes), `stale` is kept instead.
+        """
+        try:
+            future.set_result(self._fetch_shared(key, stale, wait))
+        except Exception as e:
+            future.set_exception(e)
+            if not wait:
+                print(f"Could not refresh proxy cache entry '{key}': {e!r}")
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _fetch_shared(self, key, stale, wait):
+        leased = self.cache.acquire(key, self.lease_seconds)
+        if not leased:
+            if not wait:
+                return stale
+            deadline = time.time() + self.lease_seconds
+            while time.time() < deadline:
+                time.sleep(0.1)
+                entry = self.cache.get(key)
+                if entry is not None and (stale is None or entry.stored_at > stale.stored_at):
+                    self.coalesced += 1
+                    return entry
+            # The lease holder is too slow (or gone): fetch anyway, taking over its lease once it has expired so
+            # other workers wait for this fetch instead of starting their own
+            leased = self.cache.acquire(key, self.lease_seconds)
+        try:
+            return self._fetch(key, stale)
+        finally:
+            # Never drop a lease held by another worker
+            if leased:
+                self.cache.release(key)
+
+    def _fetch(self, key, stale):
+        self.fetches += 1
+        status, body = self.fetch(key)
+        if (status >= 500 or status in RETRY_STATUSES) and stale is not None and stale.status == 200:
+            # Keep serving the last good response; it is due for another refresh after `failure_ttl`
+            self.stale_errors += 1
+            stored_at = time.time() - self.ttl + self.failure_ttl
+            self.cache.set(key, stale.status, stale.body, stored_at)
+            return CacheEntry(stale.status, stale.body, stored_at)
+        entry = CacheEntry(status, body, time.time())
+        self.cache.set(key, *entry)
+        return entry
+
+    def stats(self):
+        """
+        Returns:
+            dict: The backend's stats with the policy and the request counters of this process.
+        """
+        lookups = self.hits + self.stale_hits + self.misses
+        stats = self.cache.stats()
+        stats.update(
+            ttl=self.ttl, failure_ttl=self.failure_ttl, stale_ttl=self.stale_ttl,
+            hits=self.hits, stale_hits=self.stale_hits, misses=self.misses, coalesced=self.coalesced,
+            fetches=self.fetches, refreshes=self.refreshes, stale_errors=self.stale_errors,
+            prefetches=self.prefetches, prefetches_dropped=self.prefetches_dropped,
+            hit_rate=round((self.hits + self.stale_hits) / lookups, 4) if lookups else None,
+        )
+        return stats
+
+
+def proxy_policy_from_env():
+    """
+    Returns:
+        dict: The `ttl`, `failure_ttl` and `stale_ttl` arguments of CachedFetcher set by the JUNKIPEDIA_CACHE_*
+            environment variables.
+    """
+    return {
+        "ttl": float(os.environ.get("JUNKIPEDIA_CACHE_TTL", DEFAULT_TTL)),
+        "failure_ttl": float(os.environ.get("JUNKIPEDIA_CACHE_FAILURE_TTL", DEFAULT_FAILURE_TTL)),
+        "stale_ttl": float(os.environ.get("JUNKIPEDIA_CACHE_STALE_TTL", DEFAULT_STALE_TTL)),
+    }
+
+
+def proxy_cache_from_env():
+    """
+    Create the proxy cache backend configured by the JUNKIPEDIA_CACHE_* environment variables, keeping entries as
+    long as the policy of proxy_policy_from_env can serve them.
+
+    Returns:
+        ProxyCache: The backend.
+    """
+    max_bytes = int(float(os.environ.get("JUNKIPEDIA_CACHE_MAX_MB", DEFAULT_MAX_BYTES / 2 ** 20)) * 2 ** 20)
+    policy = proxy_policy_from_env()
+    max_age = max(policy["ttl"], policy["failure_ttl"]) + policy["stale_ttl"]
+    backend = os.environ.get("JUNKIPEDIA_CACHE_BACKEND", "sqlite").lower()
+    if backend == "memory":
+        return MemoryProxyCache(max_bytes, max_age)
+    if backend == "sqlite":
+        return SQLiteProxyCache(os.environ.get("JUNKIPEDIA_CACHE_PATH", DEFAULT_PATH), max_bytes, max_age)
+    raise ValueError(f"Unknown JUNKIPEDIA_CACHE_BACKEND '{backend}' (expected 'sqlite' or 'memory')")
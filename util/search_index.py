@@ -0,0 +1,248 @@
+"""
+Inverted index for the Post Feed keyword search.
+Every post is tokenized once when the dataset is built; keyword queries are answered from posting lists (the
+sorted row positions of the posts containing a token) instead of scanning the text of every post on each
+keystroke. A search still matches the posts whose text contains the query as a substring, as the scan did: a word
+of the query can only occur inside a token of the post, so the candidates are the posts with a token containing each
+word (found by scanning the vocabulary, which is much smaller than the text), and only those are checked for the
+query itself. The index is stored next to the processed data cache, so workers load it instead of rebuilding it.
+"""
+import re
+import numpy as np
+import pandas as pd
+
+# Text columns searched by the keyword filter (only those present in the frame are indexed)
+SEARCH_COLUMNS = [
+    "attributes.search_data_fields.post_title",
+    "attributes.complete_post_text",
+]
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Maps every ASCII byte that is not a word character (\w) to a space; non-ASCII bytes are kept and dealt with
+# per vocabulary entry. NUL separates posts.
+_ASCII_WORD = set(b"0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_\x00")
+_SPLIT_TABLE = bytes(b if b in _ASCII_WORD or b >= 128 else ord(" ") for b in range(256))
+
+
+def _token_pairs(texts):
+    """
+    Tokenize the posts into distinct (token, row) pairs.
+
+    Tokens are the lowercase \\w+ words of the text, as re.findall would return them. Instead of running the regex
+    over every post, all posts are joined into one byte string, ASCII separators are mapped to spaces with
+    bytes.translate and the result is split once; only the (few) distinct tokens containing non-ASCII characters
+    are re-split with the regex afterwards.
+
+    Arguments:
+        texts (list): The text of each post.
+
+    Returns:
+        vocabulary (list): The distinct tokens.
+        token_codes (np.ndarray): Index into `vocabulary` of each pair.
+        rows (np.ndarray): Row position of each pair.
+    """
+    joined = " \x00 ".join(t.replace("\x00", " ") for t in texts).lower()
+    # pandas hashes str objects much faster than bytes, so decode again before splitting
+    raw_tokens = joined.encode("utf-8").translate(_SPLIT_TABLE).decode("utf-8").split()
+    raw_codes, raw_vocabulary = pd.factorize(pd.Series(raw_tokens, dtype=object))
+    separator = np.flatnonzero(raw_vocabulary == "\x00")
+    is_separator = raw_codes == (separator[0] if len(separator) else -2)
+    rows = np.cumsum(is_separator)[~is_separator]
+    raw_codes = raw_codes[~is_separator]
+
+    # Map every raw token to the regex tokens it consists of (usually exactly itself)
+    vocabulary, lookup = [], {}
+    mapped_lengths = np.zeros(len(raw_vocabulary), dtype=np.int64)
+    mapped_ids = []
+    for i, raw in enumerate(raw_vocabulary):
+        words = [raw] if raw.isascii() else TOKEN_PATTERN.findall(raw)
+        if raw == "\x00":
+            words = []
+        mapped_lengths[i] = len(words)
+        for word in words:
+            if word not in lookup:
+                lookup[word] = len(vocabulary)
+                vocabulary.append(word)
+            mapped_ids.append(lookup[word])
+    mapped_ids = np.asarray(mapped_ids, dtype=np.int64)
+    mapped_starts = np.cumsum(mapped_lengths) - mapped_lengths
+
+    # Expand occurrences of raw tokens into their regex tokens
+    repeats = mapped_lengths[raw_codes]
+    within = np.arange(repeats.sum()) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+    token_codes = mapped_ids[np.repeat(mapped_starts[raw_codes], repeats) + within]
+    rows = np.repeat(rows, repeats)
+    return vocabulary, token_codes, rows
+
+
+class SearchIndex:
+    """
+    Token -> posting list index over the SEARCH_COLUMNS of the post table.
+
+    The vocabulary is kept sorted and the postings are stored token after token in a single array, so the
+    postings of a token are one contiguous block. The tokens containing a query word are found with one substring
+    scan over the vocabulary joined into a single string.
+    """
+
+    def __init__(self, data, vocabulary=None, postings=None, offsets=None):
+        """
+        Build the index from the post table, or wrap arrays previously written by `save`.
+
+        Arguments:
+            data (pd.DataFrame): The processed post table.
+            vocabulary (list): Sorted distinct tokens (only when loading a saved index).
+            postings (np.ndarray): Row positions, grouped by token (only when loading a saved index).
+            offsets (np.ndarray): Start of each token's postings, plus the total length (only when loading).
+        """
+        self.columns = [c for c in SEARCH_COLUMNS if c in data.columns]
+        self.size = len(data)
+        self._data = data
+        if vocabulary is None:
+            vocabulary, postings, offsets = self._build(data)
+        self._vocabulary = vocabulary
+        self._postings = postings
+        self._offsets = offsets
+        # The vocabulary joined by newlines and the start of each token in it, built on the first search
+        self._joined = None
+        self._starts = None
+
+    def _build(self, data):
+        text = pd.Series("", index=data.index, dtype=object)
+        for col in self.columns:
+            text = text + " " + data[col].fillna("").astype(str)
+        vocabulary, token_codes, rows = _token_pairs(text.tolist())
+
+        # Renumber the tokens in sorted order, then keep distinct (token, row) pairs sorted by token and row
+        order = np.argsort(np.asarray(vocabulary, dtype=object))
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        width = max(self.size, 1)
+        pairs = np.unique(rank[token_codes] * width + rows)
+        postings = (pairs % width).astype(np.int32)
+        offsets = np.searchsorted(pairs // width, np.arange(len(vocabulary) + 1))
+        return [vocabulary[i] for i in order], postings, offsets
+
+    def save(self, path):
+        """
+        Write the index arrays to an .npz file.
+        """
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                vocabulary=np.frombuffer("\n".join(self._vocabulary).encode("utf-8"), dtype=np.uint8),
+                postings=self._postings,
+                offsets=self._offsets,
+            )
+
+    @classmethod
+    def load(cls, path, data):
+        """
+        Load an index written by `save` for the same post table.
+
+        Arguments:
+            path (str or Path): The .npz file.
+            data (pd.DataFrame): The post table the index was built from.
+
+        Returns:
+            SearchIndex: The loaded index.
+        """
+        with np.load(path) as arrays:
+            text = arrays["vocabulary"].tobytes().decode("utf-8")
+            vocabulary = text.split("\n") if text else []
+            return cls(data, vocabulary, arrays["postings"], arrays["offsets"])
+
+    @classmethod
+    def merged(cls, data, parts):
+        """
+        Combine indexes over parts of a post table into an index over the whole table (e.g. the index of the loaded
+        posts and one built over newly added posts only), without tokenizing any post again.
+
+        Arguments:
+            data (pd.DataFrame): The combined post table.
+            parts (list): (SearchIndex, positions) pairs, where positions[i] is the row of `data` holding row i of
+                that index's table, or -1 if the row was dropped.
+
+        Returns:
+            SearchIndex: The index over `data`.
+        """
+        vocabulary = sorted(set().union(*(index._vocabulary for index, _ in parts)))
+        rank = {token: i for i, token in enumerate(vocabulary)}
+        width = max(len(data), 1)
+        pairs = []
+        for index, positions in parts:
+            tokens = np.array([rank[token] for token in index._vocabulary], dtype=np.int64)
+            rows = np.asarray(positions, dtype=np.int64)[index._postings]
+            tokens = np.repeat(tokens, np.diff(index._offsets))
+            keep = rows >= 0
+            pairs.append(tokens[keep] * width + rows[keep])
+        pairs = np.unique(np.concatenate(pairs or [np.zeros(0, dtype=np.int64)]))
+        postings = (pairs % width).astype(np.int32)
+        offsets = np.searchsorted(pairs // width, np.arange(len(vocabulary) + 1))
+        return cls(data, vocabulary, postings, offsets)
+
+    def _postings_for(self, word):
+        """
+        Returns:
+            np.ndarray: Ascending row positions of the posts with a token containing `word`.
+        """
+        if self._joined is None:
+            lengths = np.fromiter((len(token) + 1 for token in self._vocabulary), dtype=np.int64,
+                                  count=len(self._vocabulary))
+            self._starts = np.cumsum(lengths) - lengths
+            self._joined = "\n".join(self._vocabulary)
+        # Tokens hold no newline, so every token containing `word` yields a match
+        hits = np.fromiter((m.start() for m in re.finditer(re.escape(word), self._joined)), dtype=np.int64)
+        tokens = np.unique(np.searchsorted(self._starts, hits, side="right") - 1)
+        if len(tokens) == 1:
+            return self._postings[self._offsets[tokens[0]]:self._offsets[tokens[0] + 1]]
+        # Gather the postings blocks of all matched tokens
+        starts, ends = self._offsets[tokens], self._offsets[tokens + 1]
+        lengths = ends - starts
+        positions = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+        return np.unique(self._postings[positions])
+
+    def _contains(self, keyword_lower, rows):
+        """
+        Substring check of the searched columns, for the given rows only.
+
+        Returns:
+            np.ndarray: Bool array over `rows`.
+        """
+        matches = np.zeros(len(rows), dtype=bool)
+        for col in self.columns:
+            values = self._data[col].iloc[rows]
+            matches |= values.str.lower().str.contains(keyword_lower, na=False, regex=False).to_numpy()
+        return matches
+
+    def search(self, keyword, rows=None):
+        """
+        Find the posts whose title or text contains the query (case-insensitive substring match).
+        The posting lists narrow the posts down to those with a token containing each word of the query; the
+        query itself is only checked on those candidates, unless it is a single word. Queries without any word
+        characters fall back to a substring scan.
+
+        Arguments:
+            keyword (str): The query as typed by the user.
+            rows (np.ndarray): Optional ascending row positions to restrict the search to.
+
+        Returns:
+            np.ndarray: Ascending row positions of the matching posts.
+        """
+        keyword_lower = keyword.lower()
+        terms = TOKEN_PATTERN.findall(keyword_lower)
+        if not terms:
+            candidates = np.arange(self.size) if rows is None else rows
+            return candidates[self._contains(keyword_lower, candidates)]
+
+        # Rarest-first intersection keeps the intermediate results small
+        postings = sorted((self._postings_for(t) for t in dict.fromkeys(terms)), key=len)
+        candidates = postings[0] if rows is None else np.intersect1d(postings[0], rows, assume_unique=True)
+        for posting in postings[1:]:
+            if len(candidates) == 0:
+                break
+            candidates = np.intersect1d(candidates, posting, assume_unique=True)
+
+        if keyword_lower != terms[0] and len(candidates):
+            candidates = candidates[self._contains(keyword_lower, candidates)]
+        return candidates.astype(np.int64)
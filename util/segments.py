@@ -0,0 +1,101 @@
+"""
+Store of newly ingested posts as immutable, partitioned Parquet segments (written by add_data.py).
+Adding a run's posts must not rewrite or re-read the posts stored before, so every run writes new segment files,
+one per publication month of its posts, and lists them in a manifest:
+    manifest.json                                  the segments, in the order they were written
+    year=YYYY/month=MM/<seq>-<digest>.parquet      the posts of one run published in that month
+Segments hold the SOURCE_COLUMNS of process_data.py (the columns the dashboard reads from the JSON dump) and are
+never modified. A post id stored more than once (in the JSON dump or in several segments) takes its values from
+the newest segment, so ingesting a post again upserts it. The dashboard merges the segments it has not seen yet
+into its processed data (util.data_cache.load_processed_data).
+
+The directory is SEGMENTS_DIR (default data/segments).
+"""
+import fcntl
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from process_data import SOURCE_COLUMNS
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_DIRECTORY = Path(os.environ.get("SEGMENTS_DIR", REPO_ROOT / "data" / "segments"))
+
+
+class SegmentStore:
+    """
+    Appends posts as segments and reads them back (see the module docstring).
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY):
+        """
+        Arguments:
+            directory (str or Path): Directory of the manifest and the segment files.
+        """
+        self.directory = Path(directory)
+        self.manifest_path = self.directory / "manifest.json"
+
+    def segments(self):
+        """
+        Returns:
+            list: The manifest entries of the segments, oldest first. Each is a dict with the segment's 'name'
+                (unique), 'path' (relative to the directory), 'partition' ('YYYY-MM'), 'rows' and 'written_at'.
+        """
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)["segments"]
+        except FileNotFoundError:
+            return []
+
+    def read(self, segment):
+        """
+        Returns:
+            pd.DataFrame: The posts of a segment (a manifest entry).
+        """
+        return pd.read_parquet(self.directory / segment["path"])
+
+    def _write_atomic(self, path, payload):
+        tmp_path = Path(f"{path}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+    def append(self, posts):
+        """
+        Write posts as new segments, one per publication month, and add them to the manifest.
+
+        Arguments:
+            posts (pd.DataFrame): Posts with the SOURCE_COLUMNS ('attributes.published_at' in epoch milliseconds,
+                as in the JSON dump); missing columns are stored empty.
+
+        Returns:
+            list: The manifest entries of the new segments.
+        """
+        posts = posts.reindex(columns=SOURCE_COLUMNS)
+        # y_pred is stored as its string representation, which process_data reads back the same way
+        posts["y_pred"] = posts["y_pred"].map(lambda v: v if v is None or isinstance(v, str) else str(v))
+        published = pd.to_datetime(posts["attributes.published_at"], unit="ms", errors="coerce")
+        partitions = published.dt.strftime("%Y-%m").fillna("undated")
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # One writer at a time, so sequence numbers are unique and no manifest update is lost
+        with open(self.directory / "manifest.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            segments = self.segments()
+            added = []
+            for partition, part in posts.groupby(partitions, sort=True):
+                payload = part.reset_index(drop=True).to_parquet()
+                name = f"{len(segments) + len(added) + 1:06d}-{hashlib.sha256(payload).hexdigest()[:12]}"
+                year, _, month = partition.partition("-")
+                directory = Path(f"year={year}") / f"month={month or 'undated'}"
+                (self.directory / directory).mkdir(parents=True, exist_ok=True)
+                self._write_atomic(self.directory / directory / f"{name}.parquet", payload)
+                added.append({"name": name, "path": str(directory / f"{name}.parquet"), "partition": partition,
+                              "rows": len(part), "written_at": time.time()})
+            # The manifest is replaced last: readers see either none or all of the new segments
+            self._write_atomic(self.manifest_path, json.dumps({"segments": segments + added}, indent=1).encode())
+        return added
@@ -0,0 +1,167 @@
+"""
+Lazily loaded store for the long per-post text columns.
+The explanation columns are only shown as badge tooltips for the posts on the current feed page, so instead of
+keeping them resident in every worker they are written to a read-only SQLite file next to the processed data
+cache and fetched by post id when a page is rendered.
+"""
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Columns moved out of the in-memory post table
+TEXT_COLUMNS = [
+    "green_label_explanation",
+    "green_categories_explanation",
+    "ff_label_explanation",
+    "ff_categories_explanation",
+]
+
+
+def write_text_store(data, path):
+    """
+    Write the text columns of the processed frame to a SQLite file keyed by post id.
+
+    Arguments:
+        data (pd.DataFrame): The processed frame, containing 'id' and the TEXT_COLUMNS.
+        path (str or Path): The SQLite file to create (replaced atomically if it exists).
+
+    Returns:
+        None
+    """
+    columns = [c for c in TEXT_COLUMNS if c in data.columns]
+    tmp_path = Path(f"{path}.{os.getpid()}.tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        column_sql = ", ".join(f'"{c}" TEXT' for c in columns)
+        conn.execute(f"CREATE TABLE texts (id TEXT PRIMARY KEY, {column_sql})")
+        rows = data[["id"] + columns].astype(object).where(data[["id"] + columns].notna(), None)
+        rows["id"] = data["id"].astype(str)
+        placeholders = ", ".join("?" * (len(columns) + 1))
+        conn.executemany(f"INSERT OR REPLACE INTO texts VALUES ({placeholders})", rows.itertuples(index=False, name=None))
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+
+
+def upsert_texts(data, path, version):
+    """
+    Add the text columns of posts to a SQLite file shared by several writers (e.g. the segments' text store), where
+    a post's texts are only replaced by those of a newer version, whichever order the writers run in.
+
+    Arguments:
+        data (pd.DataFrame): Posts with 'id' and the TEXT_COLUMNS.
+        path (str or Path): The SQLite file (created if it does not exist).
+        version (int or array-like): Version of the posts' texts (e.g. the sequence number of their segment), or of
+            each post's texts.
+
+    Returns:
+        None
+    """
+    conn = sqlite3.connect(path, timeout=60)
+    try:
+        column_sql = ", ".join(f'"{c}" TEXT' for c in TEXT_COLUMNS)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS texts (id TEXT PRIMARY KEY, {column_sql}, version INTEGER)")
+        data = data.reindex(columns=["id"] + TEXT_COLUMNS)
+        rows = data.astype(object).where(data.notna(), None)
+        rows["id"] = data["id"].astype(str)
+        rows["version"] = np.broadcast_to(np.asarray(version, dtype=np.int64), len(rows))
+        updates = ", ".join(f'"{c}" = excluded."{c}"' for c in TEXT_COLUMNS + ["version"])
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(
+            f"INSERT INTO texts VALUES ({', '.join('?' * (len(TEXT_COLUMNS) + 2))}) "
+            f"ON CONFLICT(id) DO UPDATE SET {updates} WHERE excluded.version >= texts.version",
+            rows.itertuples(index=False, name=None)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def copy_text_store(source, path):
+    """
+    Copy a text store (e.g. to add texts to the copy while readers of `source` keep reading it unchanged).
+
+    Arguments:
+        source (str or Path): The SQLite file to copy.
+        path (str or Path): The SQLite file to create (replaced if it exists).
+
+    Returns:
+        None
+    """
+    Path(path).unlink(missing_ok=True)
+    src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    dst = sqlite3.connect(path)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+class TextStore:
+    """
+    Read-only access to one or more text stores written by write_text_store, read as one (e.g. that of the JSON
+    dump and those of the segments merged onto it); a post is taken from the first store holding it.
+    SQLite connections cannot be shared between threads, so each thread opens its own.
+    """
+
+    def __init__(self, path, *more_paths):
+        self.paths = [Path(p) for p in (path, *more_paths)]
+        self.path = self.paths[0]
+        self._local = threading.local()
+
+    def _connections(self):
+        conns = getattr(self._local, "conns", None)
+        if conns is None:
+            conns = [sqlite3.connect(f"file:{p}?mode=ro", uri=True) for p in self.paths]
+            self._local.conns = conns
+        return conns
+
+    def fetch(self, ids):
+        """
+        Fetch the text columns for the given posts.
+
+        Arguments:
+            ids (iterable): Post ids.
+
+        Returns:
+            pd.DataFrame: The text columns, indexed by post id (as str). Unknown ids are left out.
+        """
+        ids = [str(i) for i in ids]
+        if not ids:
+            return pd.DataFrame(columns=TEXT_COLUMNS)
+        frames = []
+        for conn in self._connections():
+            cursor = conn.execute(f"SELECT * FROM texts WHERE id IN ({', '.join('?' * len(ids))})", ids)
+            columns = [d[0] for d in cursor.description]
+            frames.append(pd.DataFrame(cursor.fetchall(), columns=columns).set_index("id")
+                          .drop(columns=["version"], errors="ignore"))
+            ids = [i for i in ids if i not in frames[-1].index]
+            if not ids:
+                break
+        return pd.concat(frames) if len(frames) > 1 else frames[0]
+
+    def attach(self, rows):
+        """
+        Add the text columns to a (small) slice of the post table, e.g. the posts on the current page.
+
+        Arguments:
+            rows (pd.DataFrame): Posts with an 'id' column.
+
+        Returns:
+            pd.DataFrame: A copy of `rows` with the TEXT_COLUMNS added.
+        """
+        texts = self.fetch(rows["id"])
+        rows = rows.copy()
+        keys = rows["id"].astype(str)
+        for col in texts.columns:
+            rows[col] = keys.map(texts[col]).to_numpy()
+        return rows